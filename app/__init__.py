@@ -11,9 +11,19 @@ def create_app(config_name='development'):
     # Cargar configuración
     app.config.from_object(config[config_name])
     
+    # Opciones del pool a partir de DB_* (ver app/pool.py) y réplicas de lectura (DATABASE_READ_URL)
+    from app.pool import build_engine_options, init_pool
+    from app.replicas import init_replicas, replica_binds
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = build_engine_options(app.config)
+    app.config['SQLALCHEMY_BINDS'] = replica_binds(app.config)
+    
     # Inicializar extensiones
     db.init_app(app)
     
+    # JSON rápido (orjson) y compresión gzip/br para todos los blueprints (ver app/responses.py)
+    from app.responses import init_responses
+    init_responses(app)
+    
     # Registrar blueprints
     with app.app_context():
         from app.routes import main_bp
@@ -24,8 +34,43 @@ def create_app(config_name='development'):
         app.register_blueprint(api_bp)
         app.register_blueprint(dashboard_bp)
     
-    # Crear tablas
+    # Instrumentación SQL por petición (METRICS_ENABLED) y sentencias lentas (SLOW_QUERY_MS)
+    from app.instrumentation import init_instrumentation
+    from app.slow_queries import init_slow_query_log
     with app.app_context():
-        db.create_all()
+        engines = list(db.engines.values())
+    init_instrumentation(app, engines)
+    init_slow_query_log(app, engines)
+    init_pool(app, db)
+    init_replicas(app, db)
+    
+    # ETag/If-None-Match por versión de datos (después de elegir réplica: la versión se lee del mismo origen)
+    from app.conditional import init_conditional_get
+    init_conditional_get(app)
+    
+    # Feed en vivo del dashboard (SSE): un hilo por proceso vigila la versión de datos (ver app/live.py)
+    from app.dashboard_api import compute_live_event
+    from app.live import init_live_feed
+    init_live_feed(app, compute_live_event)
+    
+    # Registrar comandos CLI
+    from app.cli import register_commands
+    register_commands(app)
+    
+    # Comprobar la versión del esquema (sin create_all por worker; ver app/migrations.py)
+    from app.migrations import init_schema
+    with app.app_context():
+        init_schema(app, db.engine)
     
     return app
+
+
+def dispose_engines(app):
+    """Descartar las conexiones heredadas tras un fork (gunicorn --preload).
+
+    close=False: no cierra los sockets del proceso padre, solo deja de usarlos;
+    cada worker abre sus propias conexiones.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
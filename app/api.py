@@ -1,8 +1,21 @@
-from flask import Blueprint, request, jsonify
-from datetime import datetime, timedelta
-from app.models import db, StockActual, Movimiento
+from flask import Blueprint, Response, current_app, request, jsonify, session, stream_with_context
+from datetime import date, datetime, timedelta
+from app.models import db, StockActual, StockLatest, Movimiento, TIPO_ALIASES, TIPOS_MOVIMIENTO, movimiento_row_to_dict
+from app.batch import BatchError, parse_batch, run_batch
+from app.counts import COUNT_MODES, make_count_key, resolve_total
+from app.export import EXPORT_FORMATS, iter_export_chunks
+from app.fieldsets import (
+    MOVIMIENTO_FIELDS, MOVIMIENTO_KEY_COLUMNS, MOVIMIENTO_SOURCE_COLUMNS, STOCK_FIELDS, STOCK_KEY_COLUMNS,
+    STOCK_SOURCE_COLUMNS, FieldsetError, build_data, parse_fieldset, source_columns
+)
+from app.ingest import INGEST_FORMATS, IngestError, detect_format, ingest_movimientos
+from app.slow_queries import get_slow_query_log
+import base64
+import hmac
+import io
+import json
 import logging
-from sqlalchemy import func
+from sqlalchemy import select, text, tuple_
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -38,7 +51,7 @@ def safe_datetime(value):
         return None
 
 
-def format_response(data, total=None, limit=None, offset=None):
+def format_response(data, total=None, limit=None, offset=None, extra=None):
     """Formatear respuesta JSON estándar"""
     response = {
         'success': True,
@@ -46,17 +59,217 @@ def format_response(data, total=None, limit=None, offset=None):
         'timestamp': datetime.utcnow().isoformat()
     }
     
-    if total is not None:
+    if total is not None or extra:
         response['pagination'] = {
             'total': total,
             'limit': limit,
             'offset': offset,
             'returned': len(data) if isinstance(data, list) else 1
         }
+        if extra:
+            response['pagination'].update(extra)
     
     return response
 
 
+def encode_cursor(values, direction='next'):
+    """Codificar un cursor opaco (base64 url-safe) a partir de los valores de la clave de orden"""
+    payload = {
+        'v': [v.isoformat() if hasattr(v, 'isoformat') else v for v in values],
+        'd': direction
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decodificar un cursor opaco. Retorna (valores, direccion) o None si es inválido"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        values = payload['v']
+        direction = payload.get('d', 'next')
+        if not isinstance(values, list) or direction not in ('next', 'prev'):
+            return None
+        return values, direction
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _movimientos_keyset_page(query, limit, cursor_values=None, direction='next'):
+    """
+    Obtener una página de movimientos por keyset sobre (fecha_movimiento, id).
+
+    El orden es fecha_movimiento DESC, id DESC con las filas sin fecha al final.
+    Se consulta primero el segmento con fecha y luego el segmento sin fecha, de
+    modo que cada parte es un rango del índice ix_movimientos_fecha_id y la
+    página N cuesta lo mismo que la primera.
+
+    Retorna (filas, hay_mas_en_la_direccion_pedida).
+    """
+    fecha_col = Movimiento.fecha_movimiento
+    id_col = Movimiento.id
+    with_fecha = query.filter(fecha_col.isnot(None))
+    without_fecha = query.filter(fecha_col.is_(None))
+    fetch = limit + 1
+
+    cursor_fecha = cursor_id = None
+    if cursor_values is not None:
+        cursor_fecha, cursor_id = cursor_values
+
+    if direction == 'next':
+        if cursor_values is not None and cursor_fecha is None:
+            rows = without_fecha.filter(id_col < cursor_id).order_by(id_col.desc()).limit(fetch).all()
+        else:
+            if cursor_values is not None:
+                with_fecha = with_fecha.filter(tuple_(fecha_col, id_col) < tuple_(cursor_fecha, cursor_id))
+            rows = with_fecha.order_by(fecha_col.desc(), id_col.desc()).limit(fetch).all()
+            if len(rows) < fetch:
+                rows += without_fecha.order_by(id_col.desc()).limit(fetch - len(rows)).all()
+        return rows[:limit], len(rows) > limit
+
+    # direction == 'prev': recorrer hacia filas más recientes y devolverlas en orden DESC
+    if cursor_fecha is None:
+        rows = without_fecha.filter(id_col > cursor_id).order_by(id_col.asc()).limit(fetch).all()
+        if len(rows) < fetch:
+            rows += with_fecha.order_by(fecha_col.asc(), id_col.asc()).limit(fetch - len(rows)).all()
+    else:
+        rows = (
+            with_fecha.filter(tuple_(fecha_col, id_col) > tuple_(cursor_fecha, cursor_id))
+            .order_by(fecha_col.asc(), id_col.asc())
+            .limit(fetch)
+            .all()
+        )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return rows, has_more
+
+
+def _stock_latest_keyset_page(query, limit, cursor_values=None, direction='next'):
+    """
+    Obtener una página de stock_latest por keyset sobre (fecha_producto, nombre),
+    ordenada por fecha_producto DESC, nombre DESC (rango sobre ix_stock_latest_fecha_nombre).
+
+    Retorna (filas, hay_mas_en_la_direccion_pedida).
+    """
+    key = tuple_(StockLatest.fecha_producto, StockLatest.nombre)
+    if direction == 'next':
+        if cursor_values is not None:
+            query = query.filter(key < tuple_(*cursor_values))
+        rows = query.order_by(StockLatest.fecha_producto.desc(), StockLatest.nombre.desc()).limit(limit + 1).all()
+        return rows[:limit], len(rows) > limit
+
+    rows = (
+        query.filter(key > tuple_(*cursor_values))
+        .order_by(StockLatest.fecha_producto.asc(), StockLatest.nombre.asc())
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return rows, has_more
+
+
+def _movimiento_cursor(item, direction):
+    return encode_cursor([item.fecha_movimiento, item.id], direction)
+
+
+def parse_count_mode():
+    """Leer el parámetro count (exact|estimate|none). Retorna None si es inválido"""
+    mode = request.args.get('count', 'exact').strip().lower() or 'exact'
+    return mode if mode in COUNT_MODES else None
+
+
+def parse_movimientos_filters():
+    """
+    Leer y validar los filtros de movimientos del query string
+    (fecha_desde, fecha_hasta, tipo, grupo, producto).
+    
+    Returns:
+        (filters, None) si son válidos, o (None, respuesta de error 400)
+    """
+    fecha_desde = request.args.get('fecha_desde')
+    fecha_hasta = request.args.get('fecha_hasta')
+    tipo_raw = request.args.get('tipo', '').strip().lower()
+    grupo = request.args.get('grupo', '').strip()
+    producto = request.args.get('producto', '').strip()
+    
+    # Validar y convertir fechas
+    fecha_desde_dt = None
+    fecha_hasta_dt = None
+    
+    if fecha_desde:
+        fecha_desde_dt = safe_datetime(fecha_desde)
+        if not fecha_desde_dt:
+            return None, error_response(
+                'Parâmetro fecha_desde inválido. Use o formato YYYY-MM-DD ou YYYY-MM-DD HH:MM:SS',
+                400,
+                {'received': fecha_desde}
+            )
+        # Para data sem horário, manter início do dia.
+        if len(fecha_desde.strip()) == 10:
+            fecha_desde_dt = fecha_desde_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    if fecha_hasta:
+        fecha_hasta_dt = safe_datetime(fecha_hasta)
+        if not fecha_hasta_dt:
+            return None, error_response(
+                'Parâmetro fecha_hasta inválido. Use o formato YYYY-MM-DD ou YYYY-MM-DD HH:MM:SS',
+                400,
+                {'received': fecha_hasta}
+            )
+        # Para data sem horário, incluir todo o dia (23:59:59.999999).
+        if len(fecha_hasta.strip()) == 10:
+            fecha_hasta_dt = fecha_hasta_dt + timedelta(days=1) - timedelta(microseconds=1)
+    
+    # Validar que fecha_desde <= fecha_hasta
+    if fecha_desde_dt and fecha_hasta_dt and fecha_desde_dt > fecha_hasta_dt:
+        return None, error_response(
+            'fecha_desde não pode ser posterior a fecha_hasta',
+            400
+        )
+    
+    # Normalizar/validar tipo si se proporciona
+    tipo = TIPO_ALIASES.get(tipo_raw, '')
+    if tipo_raw and not tipo:
+        return None, error_response(
+            f'Parâmetro tipo inválido. Valores válidos: {", ".join(TIPOS_MOVIMIENTO)}',
+            400
+        )
+    
+    return {
+        'fecha_desde': fecha_desde_dt,
+        'fecha_hasta': fecha_hasta_dt,
+        'tipo': tipo,
+        'grupo': grupo,
+        'producto': producto
+    }, None
+
+
+def apply_movimientos_filters(query, filters):
+    """Aplicar los filtros de parse_movimientos_filters() a una Query o un select()"""
+    # Aplicar filtros de fecha
+    if filters['fecha_desde']:
+        query = query.filter(Movimiento.fecha_movimiento >= filters['fecha_desde'])
+    
+    if filters['fecha_hasta']:
+        query = query.filter(Movimiento.fecha_movimiento <= filters['fecha_hasta'])
+    
+    # Aplicar filtros de texto
+    if filters['tipo']:
+        query = query.filter(Movimiento.tipo_norm == filters['tipo'])
+    
+    if filters['grupo']:
+        query = query.filter(Movimiento.grupo.ilike(f'%{filters["grupo"]}%'))
+    
+    if filters['producto']:
+        query = query.filter(Movimiento.nombre.ilike(f'%{filters["producto"]}%'))
+    
+    return query
+
+
 def error_response(message, status_code=400, details=None):
     """Formatear respuesta de error"""
     response = {
@@ -82,6 +295,12 @@ def get_stock():
     - contenedor: filtrar por contenedor
     - limit: cantidad de registros (default: 10, max: 1000)
     - offset: desplazamiento (default: 0)
+    - raw: true (default) devuelve las filas de stock_actual; false devuelve la
+      última fila por producto desde stock_latest
+    - cursor: (solo raw=false, con raw=true responde 400) token de pagination.next_cursor / prev_cursor
+    - count: exact (default, cacheado) | estimate (planner) | none (sin total, usar has_more)
+    - fields: campos a devolver separados por comas (p. ej. grupo,producto,cantidad)
+    - format: objects (default) | columnar ({columns, rows} en lugar de una lista de objetos)
     
     Retorna: JSON con stock actual ordenado por fecha_producto ascendente
     """
@@ -104,9 +323,42 @@ def get_stock():
         if offset < 0:
             return error_response('O parâmetro offset não pode ser negativo', 400)
         
+        count_mode = parse_count_mode()
+        if count_mode is None:
+            return error_response(f'Parâmetro count inválido. Valores válidos: {", ".join(COUNT_MODES)}', 400)
+        
+        # Soporte para modo raw: devolver filas tal cual en stock_actual
+        # Por compatibilidad con la petición del usuario, por defecto mostramos los datos crudos
+        raw_flag = request.args.get('raw', 'true').lower() in ('1', 'true', 'yes')
+        
+        # Validar cursor (paginación keyset, solo con raw=false)
+        cursor_token = request.args.get('cursor', '').strip()
+        cursor_values = None
+        direction = 'next'
+        if cursor_token and raw_flag:
+            # raw=true pagina con offset: ignorar el cursor repetiría siempre la primera página
+            return error_response('Parâmetro cursor só é suportado com raw=false', 400)
+        if cursor_token:
+            decoded = decode_cursor(cursor_token)
+            if decoded is None or len(decoded[0]) != 2:
+                return error_response('Parâmetro cursor inválido', 400)
+            (cursor_fecha_raw, cursor_nombre), direction = decoded
+            try:
+                cursor_values = (date.fromisoformat(cursor_fecha_raw), str(cursor_nombre))
+            except (TypeError, ValueError):
+                return error_response('Parâmetro cursor inválido', 400)
+        
+        # Campos parciales / formato columnar
+        try:
+            fields, response_format = parse_fieldset(
+                request.args.get('fields'), request.args.get('format'), STOCK_FIELDS
+            )
+        except FieldsetError as e:
+            return error_response(str(e), 400)
+        columns = source_columns(fields, STOCK_FIELDS, STOCK_SOURCE_COLUMNS, STOCK_KEY_COLUMNS)
+        
         # Construir consulta SQL directa contra la tabla/view stock_actual
         # Usar columnas explícitas para evitar dependencias en el modelo
-        from sqlalchemy import text
 
         # Filtros SQL simples
         where_clauses = []
@@ -126,39 +378,87 @@ def get_stock():
         if where_clauses:
             where_sql = 'WHERE ' + ' AND '.join(where_clauses)
 
-        # Soporte para modo raw: devolver filas tal cual en stock_actual
-        # Por compatibilidad con la petición del usuario, por defecto mostramos los datos crudos
-        raw_flag = request.args.get('raw', 'true').lower() in ('1', 'true', 'yes')
+        count_key = make_count_key('stock', {
+            'raw': raw_flag,
+            'grupo': grupo.lower(),
+            'producto': producto.lower(),
+            'contenedor': contenedor.lower()
+        })
 
         if raw_flag:
-            # Total de filas que coinciden
+            # Total de filas que coinciden (cacheado / estimado según count=)
             count_sql = text(f"SELECT COUNT(*) FROM stock_actual {where_sql}")
-            total = db.session.execute(count_sql, params).scalar() or 0
+            total, total_estimated = resolve_total(
+                count_mode,
+                count_key,
+                'stock',
+                lambda: db.session.execute(count_sql, params).scalar() or 0,
+                session=db.session,
+                statement=text(f"SELECT nombre FROM stock_actual {where_sql}").bindparams(**params)
+            )
 
             # Seleccionar filas raw ordenadas por fecha desc (más reciente primero)
             select_sql = text(
-                f"SELECT nombre, unidade, grupo, fecha_producto, contenedor, cantidad FROM stock_actual {where_sql} ORDER BY fecha_producto DESC LIMIT :limit OFFSET :offset"
-            )
-            params.update({'limit': limit, 'offset': offset})
-            rows = db.session.execute(select_sql, params).fetchall()
+                f"SELECT {', '.join(columns)} FROM stock_actual {where_sql} ORDER BY fecha_producto DESC LIMIT :limit OFFSET :offset"
+            ).columns(fecha_producto=db.Date)  # tipado: SQLite devuelve la fecha como texto
+            rows = db.session.execute(select_sql, {**params, 'limit': limit + 1, 'offset': offset}).fetchall()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            pagination_extra = {'has_more': has_more}
 
         else:
-            # Obtener total de productos únicos (última fila por nombre)
-            count_sql = text(f"SELECT COUNT(DISTINCT nombre) FROM stock_actual {where_sql}")
-            total = db.session.execute(count_sql, params).scalar() or 0
+            # Última fila por producto desde stock_latest (mantenida por triggers):
+            # una fila por nombre, sin DISTINCT ON y portable a SQLite
+            latest_query = db.session.query(*(getattr(StockLatest, column) for column in columns))
+            if grupo:
+                latest_query = latest_query.filter(StockLatest.grupo.ilike(f'%{grupo}%'))
+            if producto:
+                latest_query = latest_query.filter(StockLatest.nombre.ilike(f'%{producto}%'))
+            if contenedor:
+                latest_query = latest_query.filter(StockLatest.contenedor.ilike(f'%{contenedor}%'))
 
-            # Seleccionar la última fila por producto (Postgres: DISTINCT ON)
-            distinct_sql = text(
-                f"SELECT DISTINCT ON (nombre) nombre, unidade, grupo, fecha_producto, contenedor, cantidad FROM stock_actual {where_sql} ORDER BY nombre, fecha_producto DESC"
-            )
-            # Luego envolvemos y aplicamos orden final por fecha desc y paginación
-            final_sql = text(
-                f"SELECT nombre, unidade, grupo, fecha_producto, contenedor, cantidad FROM ({distinct_sql.text}) s ORDER BY fecha_producto DESC LIMIT :limit OFFSET :offset"
+            total, total_estimated = resolve_total(
+                count_mode,
+                count_key,
+                'stock',
+                latest_query.count,
+                session=db.session,
+                statement=latest_query.statement
             )
 
-            params.update({'limit': limit, 'offset': offset})
-            rows = db.session.execute(final_sql, params).fetchall()
+            if cursor_values is not None or offset == 0:
+                rows, has_more = _stock_latest_keyset_page(latest_query, limit, cursor_values, direction)
+                if direction == 'next':
+                    has_next, has_prev = has_more, cursor_values is not None
+                else:
+                    has_next, has_prev = True, has_more
+                offset = None if cursor_values is not None else offset
+            else:
+                rows = (
+                    latest_query.order_by(StockLatest.fecha_producto.desc(), StockLatest.nombre.desc())
+                    .limit(limit + 1)
+                    .offset(offset)
+                    .all()
+                )
+                has_next, has_prev = len(rows) > limit, True
+                rows = rows[:limit]
+
+            pagination_extra = {
+                'has_more': has_next,
+                'next_cursor': encode_cursor([rows[-1].fecha_producto, rows[-1].nombre], 'next') if rows and has_next else None,
+                'prev_cursor': encode_cursor([rows[0].fecha_producto, rows[0].nombre], 'prev') if rows and has_prev else None
+            }
 
+        if fields is not None or response_format != 'objects':
+            data = build_data(rows, fields, response_format, STOCK_FIELDS, columns)
+            return jsonify(format_response(
+                data,
+                total=total,
+                limit=limit,
+                offset=offset,
+                extra={**pagination_extra, 'total_estimated': total_estimated, 'returned': len(rows)}
+            ))
+        
         # Convertir filas a diccionarios con la misma forma que StockActual.to_dict()
         data = []
         for r in rows:
@@ -169,7 +469,7 @@ def get_stock():
                 'producto': nombre,
                 'unidade': unidade,
                 'grupo': grupo_col,
-                'fecha_producto': fecha_producto.isoformat() if fecha_producto else None,
+                'fecha_producto': fecha_producto,  # el proveedor JSON serializa la fecha (ver app/responses.py)
                 'contenedor': contenedor_col,
                 'cantidad': cantidad
             })
@@ -178,7 +478,8 @@ def get_stock():
             data,
             total=total,
             limit=limit,
-            offset=offset
+            offset=offset,
+            extra={**pagination_extra, 'total_estimated': total_estimated}
         ))
     
     except Exception as e:
@@ -199,17 +500,15 @@ def get_movimientos():
     - producto: filtrar por nombre de producto
     - limit: cantidad de registros (default: 10, max: 1000)
     - offset: desplazamiento (default: 0)
+    - cursor: token opaco devuelto en pagination.next_cursor / prev_cursor.
+      Si se envía, offset se ignora y la página se obtiene por keyset.
+    - count: exact (default, cacheado) | estimate (planner) | none (sin total, usar has_more)
+    - fields: campos a devolver separados por comas (p. ej. fecha,tipo,producto,cantidad)
+    - format: objects (default) | columnar ({columns, rows} en lugar de una lista de objetos)
     
     Retorna: JSON con movimientos ordenados por fecha descendente
     """
     try:
-        # Obtener parámetros de filtro
-        fecha_desde = request.args.get('fecha_desde')
-        fecha_hasta = request.args.get('fecha_hasta')
-        tipo_raw = request.args.get('tipo', '').strip().lower()
-        grupo = request.args.get('grupo', '').strip()
-        producto = request.args.get('producto', '').strip()
-        
         # Validar paginación
         limit = request.args.get('limit', 10, type=int)
         offset = request.args.get('offset', 0, type=int)
@@ -221,92 +520,105 @@ def get_movimientos():
         if offset < 0:
             return error_response('O parâmetro offset não pode ser negativo', 400)
         
-        # Validar y convertir fechas
-        fecha_desde_dt = None
-        fecha_hasta_dt = None
-        
-        if fecha_desde:
-            fecha_desde_dt = safe_datetime(fecha_desde)
-            if not fecha_desde_dt:
-                return error_response(
-                    'Parâmetro fecha_desde inválido. Use o formato YYYY-MM-DD ou YYYY-MM-DD HH:MM:SS',
-                    400,
-                    {'received': fecha_desde}
-                )
-            # Para data sem horário, manter início do dia.
-            if len(fecha_desde.strip()) == 10:
-                fecha_desde_dt = fecha_desde_dt.replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        if fecha_hasta:
-            fecha_hasta_dt = safe_datetime(fecha_hasta)
-            if not fecha_hasta_dt:
-                return error_response(
-                    'Parâmetro fecha_hasta inválido. Use o formato YYYY-MM-DD ou YYYY-MM-DD HH:MM:SS',
-                    400,
-                    {'received': fecha_hasta}
-                )
-            # Para data sem horário, incluir todo o dia (23:59:59.999999).
-            if len(fecha_hasta.strip()) == 10:
-                fecha_hasta_dt = fecha_hasta_dt + timedelta(days=1) - timedelta(microseconds=1)
+        count_mode = parse_count_mode()
+        if count_mode is None:
+            return error_response(f'Parâmetro count inválido. Valores válidos: {", ".join(COUNT_MODES)}', 400)
         
-        # Validar que fecha_desde <= fecha_hasta
-        if fecha_desde_dt and fecha_hasta_dt and fecha_desde_dt > fecha_hasta_dt:
-            return error_response(
-                'fecha_desde não pode ser posterior a fecha_hasta',
-                400
-            )
+        # Validar cursor (paginación keyset)
+        cursor_token = request.args.get('cursor', '').strip()
+        cursor_values = None
+        direction = 'next'
+        if cursor_token:
+            decoded = decode_cursor(cursor_token)
+            if decoded is None or len(decoded[0]) != 2:
+                return error_response('Parâmetro cursor inválido', 400)
+            (cursor_fecha_raw, cursor_id), direction = decoded
+            try:
+                cursor_fecha = datetime.fromisoformat(cursor_fecha_raw) if cursor_fecha_raw else None
+            except (TypeError, ValueError):
+                return error_response('Parâmetro cursor inválido', 400)
+            if not isinstance(cursor_id, int):
+                return error_response('Parâmetro cursor inválido', 400)
+            cursor_values = (cursor_fecha, cursor_id)
         
-        # Normalizar/validar tipo si se proporciona
-        tipo_map = {
-            'entrada': 'entrada',
-            'saida': 'saida',
-            'salida': 'saida',
-            'saída': 'saida',
-            'descarte': 'descarte',
-            'ajuste': 'ajuste'
-        }
-        tipo = tipo_map.get(tipo_raw, '')
-        if tipo_raw and not tipo:
-            tipos_validos = ['entrada', 'saida', 'descarte', 'ajuste']
-            return error_response(
-                f'Parâmetro tipo inválido. Valores válidos: {", ".join(tipos_validos)}',
-                400
+        # Campos parciales / formato columnar
+        try:
+            fields, response_format = parse_fieldset(
+                request.args.get('fields'), request.args.get('format'), MOVIMIENTO_FIELDS
             )
+        except FieldsetError as e:
+            return error_response(str(e), 400)
+        columns = source_columns(fields, MOVIMIENTO_FIELDS, MOVIMIENTO_SOURCE_COLUMNS, MOVIMIENTO_KEY_COLUMNS)
         
-        # Construir consulta base
-        query = Movimiento.query
-        
-        # Aplicar filtros de fecha
-        if fecha_desde_dt:
-            query = query.filter(Movimiento.fecha_movimiento >= fecha_desde_dt)
-        
-        if fecha_hasta_dt:
-            query = query.filter(Movimiento.fecha_movimiento <= fecha_hasta_dt)
+        filters, error = parse_movimientos_filters()
+        if error is not None:
+            return error
         
-        # Aplicar filtros de texto
-        if tipo:
-            query = query.filter(func.lower(Movimiento.tipo) == tipo)
+        # Construir consulta base: solo las columnas del listado, como tuplas (sin entidades ORM)
+        query = apply_movimientos_filters(
+            db.session.query(*(getattr(Movimiento, column) for column in columns)),
+            filters
+        )
         
-        if grupo:
-            query = query.filter(Movimiento.grupo.ilike(f'%{grupo}%'))
-        
-        if producto:
-            query = query.filter(Movimiento.producto.ilike(f'%{producto}%'))
+        # Obtener total antes de paginar (cacheado / estimado según count=)
+        total, total_estimated = resolve_total(
+            count_mode,
+            make_count_key('movimientos', {
+                **filters,
+                'grupo': filters['grupo'].lower(),
+                'producto': filters['producto'].lower()
+            }),
+            'movimientos',
+            query.count,
+            session=db.session,
+            statement=query.statement
+        )
         
-        # Obtener total antes de paginar
-        total = query.count()
+        if cursor_values is not None or offset == 0:
+            # Keyset: coste constante sin importar la profundidad de la página
+            results, has_more = _movimientos_keyset_page(query, limit, cursor_values, direction)
+            if direction == 'next':
+                has_next = has_more
+                has_prev = cursor_values is not None
+            else:
+                has_next = True
+                has_prev = has_more
+            offset = None if cursor_values is not None else offset
+        else:
+            # Paginación por offset (compatibilidad): mismo orden que el keyset
+            results = (
+                query.order_by(
+                    Movimiento.fecha_movimiento.desc().nulls_last(),
+                    Movimiento.id.desc()
+                )
+                .limit(limit + 1)
+                .offset(offset)
+                .all()
+            )
+            has_next = len(results) > limit
+            has_prev = True
+            results = results[:limit]
         
-        # Ordenar por fecha_movimiento descendente y aplicar paginación
-        results = query.order_by(Movimiento.fecha_movimiento.desc()).limit(limit).offset(offset).all()
+        pagination_extra = {
+            'has_more': has_next,
+            'total_estimated': total_estimated,
+            'next_cursor': _movimiento_cursor(results[-1], 'next') if results and has_next else None,
+            'prev_cursor': _movimiento_cursor(results[0], 'prev') if results and has_prev else None
+        }
         
-        # Convertir a diccionarios
-        data = [item.to_dict() for item in results]
+        if fields is not None or response_format != 'objects':
+            data = build_data(results, fields, response_format, MOVIMIENTO_FIELDS, columns)
+            pagination_extra['returned'] = len(results)
+        else:
+            # Convertir a diccionarios (misma forma que Movimiento.to_dict())
+            data = [movimiento_row_to_dict(row) for row in results]
         
         return jsonify(format_response(
             data,
             total=total,
             limit=limit,
-            offset=offset
+            offset=offset,
+            extra=pagination_extra
         ))
     
     except Exception as e:
@@ -314,13 +626,220 @@ def get_movimientos():
         return error_response(f'Erro interno do servidor: {str(e)}', 500)
 
 
+MOVIMIENTOS_EXPORT_COLUMNS = (
+    'id', 'fecha_movimiento', 'nombre', 'cantidad', 'unidade', 'tipo',
+    'concepto', 'grupo', 'contenedor', 'fecha_producto'
+)
+
+
+@api_bp.route('/movimientos/export', methods=['GET'])
+def export_movimientos():
+    """
+    GET /api/movimientos/export
+    
+    Exporta todos los movimientos que cumplen los filtros, sin paginar, en
+    streaming: las filas se leen con un cursor del servidor (yield_per) y se
+    envían por bloques, con memoria constante sin importar la cantidad.
+    
+    Parámetros opcionales:
+    - fecha_desde, fecha_hasta, tipo, grupo, producto: igual que /api/movimientos
+    - format: ndjson (default) | csv
+    
+    Con Accept-Encoding: gzip la respuesta se comprime (Content-Encoding: gzip).
+    Orden: fecha_movimiento ascendente (sin fecha al final), id ascendente.
+    """
+    fmt = request.args.get('format', 'ndjson').strip().lower()
+    if fmt not in EXPORT_FORMATS:
+        return error_response(f'Parâmetro format inválido. Valores válidos: {", ".join(EXPORT_FORMATS)}', 400)
+    
+    filters, error = parse_movimientos_filters()
+    if error is not None:
+        return error
+    
+    columns = [getattr(Movimiento, name) for name in MOVIMIENTOS_EXPORT_COLUMNS]
+    statement = (
+        apply_movimientos_filters(select(*columns), filters)
+        .order_by(Movimiento.fecha_movimiento.asc().nulls_last(), Movimiento.id.asc())
+        .execution_options(yield_per=current_app.config.get('EXPORT_BATCH_SIZE', 2000))
+    )
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+    chunk_bytes = current_app.config.get('EXPORT_CHUNK_BYTES', 64 * 1024)
+    
+    def generate():
+        try:
+            result = db.session.execute(statement)
+            yield from iter_export_chunks(
+                fmt,
+                MOVIMIENTOS_EXPORT_COLUMNS,
+                result.partitions(),
+                gzip=use_gzip,
+                chunk_bytes=chunk_bytes
+            )
+        except Exception as e:
+            # Los encabezados ya se enviaron: solo queda registrar y cortar el flujo
+            logger.error(f'Error en GET /api/movimientos/export: {str(e)}')
+            raise
+        finally:
+            db.session.rollback()
+    
+    filename = f'movimientos_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.{fmt}'
+    response = Response(stream_with_context(generate()), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['X-Accel-Buffering'] = 'no'
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+@api_bp.route('/movimientos/ingest', methods=['POST'])
+def ingest_movimientos_endpoint():
+    """
+    POST /api/movimientos/ingest
+    
+    Carga masiva de movimientos desde el cuerpo de la petición (CSV con
+    cabecera o NDJSON) y aplicación de los deltas netos a stock_actual.
+    Requiere Authorization: Bearer <INGEST_API_TOKEN>.
+    
+    Parámetros opcionales:
+    - format: csv | ndjson (default: según Content-Type)
+    - skip_invalid: true para omitir filas inválidas (default: se rechaza la carga)
+    """
+    token = current_app.config.get('INGEST_API_TOKEN')
+    if not token:
+        return error_response('Carga masiva desabilitada (INGEST_API_TOKEN não configurado)', 403)
+    
+    auth_header = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(auth_header, f'Bearer {token}'):
+        return error_response('Token de carga inválido', 401)
+    
+    fmt = request.args.get('format', '').strip().lower() or detect_format(content_type=request.content_type)
+    if fmt not in INGEST_FORMATS:
+        return error_response(f'Parâmetro format inválido. Valores válidos: {", ".join(INGEST_FORMATS)}', 400)
+    
+    skip_invalid = request.args.get('skip_invalid', '').strip().lower() in ('1', 'true', 'yes')
+    
+    try:
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+        result = ingest_movimientos(
+            db.engine,
+            stream,
+            fmt,
+            batch_size=current_app.config.get('INGEST_BATCH_SIZE', 50000),
+            skip_invalid=skip_invalid
+        )
+        return jsonify(format_response(result))
+    
+    except IngestError as e:
+        return error_response(str(e), 400, {'errores': e.errors})
+    
+    except Exception as e:
+        logger.error(f'Error en POST /api/movimientos/ingest: {str(e)}')
+        return error_response(f'Erro interno do servidor: {str(e)}', 500)
+
+
+def require_admin():
+    """Respuesta de error si la sesión no es de un administrador, None si lo es"""
+    user = session.get('user')
+    if not user:
+        return error_response('Autenticação necessária', 401)
+    if user.get('role') != 'admin':
+        return error_response('Acesso restrito a administradores', 403)
+    return None
+
+
+@api_bp.route('/admin/slow-queries', methods=['GET'])
+def get_slow_queries():
+    """
+    GET /api/admin/slow-queries (solo administradores)
+    
+    Últimas sentencias lentas registradas (SLOW_QUERY_MS), con su plan, de la
+    más reciente a la más antigua.
+    
+    Parámetros opcionales:
+    - limit: cantidad de entradas (default: 50, max: 1000)
+    - endpoint: filtrar por endpoint de Flask (p. ej. api.get_stock)
+    """
+    error = require_admin()
+    if error is not None:
+        return error
+    
+    slow_log = get_slow_query_log(current_app)
+    if slow_log is None:
+        return error_response('Registro de consultas lentas desabilitado (configure SLOW_QUERY_MS)', 404)
+    
+    limit = safe_int(request.args.get('limit', 50), default=None)
+    if limit is None:
+        return error_response('O parâmetro limit deve estar entre 1 e 1000', 400)
+    endpoint = request.args.get('endpoint', '').strip()
+    
+    try:
+        entries = slow_log.read(limit if not endpoint else 1000)
+        if endpoint:
+            entries = [e for e in entries if e.get('endpoint') == endpoint][:limit]
+        response = format_response(entries)
+        response['threshold_ms'] = slow_log.threshold * 1000
+        return jsonify(response)
+    
+    except Exception as e:
+        logger.error(f'Error en GET /api/admin/slow-queries: {str(e)}')
+        return error_response(f'Erro interno do servidor: {str(e)}', 500)
+
+
+@api_bp.route('/batch', methods=['POST'])
+def batch():
+    """
+    POST /api/batch
+    
+    Varias peticiones GET de la API en una sola ida y vuelta (ver app/batch.py).
+    
+    Cuerpo JSON:
+    - requests: lista de {name, path, params, etag} (máximo BATCH_MAX_REQUESTS), p. ej.
+      {"name": "stats", "path": "/api/dashboard/stats"}
+      {"name": "ultimos", "path": "/api/movimientos", "params": {"limit": 5}}
+      etag (opcional) se envía como If-None-Match: 304 sin body si no cambió
+    
+    Devuelve results[name] = {status, etag, body} con la respuesta de cada ruta;
+    un error en una subpetición no afecta a las demás.
+    """
+    try:
+        subrequests = parse_batch(
+            request.get_json(silent=True),
+            current_app,
+            current_app.config.get('BATCH_MAX_REQUESTS', 10)
+        )
+    except BatchError as e:
+        return error_response(str(e), 400)
+    
+    try:
+        results = run_batch(current_app._get_current_object(), subrequests, request.headers, request.host_url)
+        return jsonify({
+            'success': True,
+            'results': results,
+            'timestamp': datetime.utcnow().isoformat()
+        })
+    
+    except Exception as e:
+        logger.error(f'Error en POST /api/batch: {str(e)}')
+        return error_response(f'Erro interno do servidor: {str(e)}', 500)
+
+
 @api_bp.errorhandler(404)
 def not_found(error):
     """Manejar rutas no encontradas"""
     return error_response('Endpoint não encontrado', 404)
 
 
-@api_bp.errorhandler(405)
+@api_bp.app_errorhandler(405)
 def method_not_allowed(error):
-    """Manejar métodos no permitidos"""
-    return error_response('Método HTTP não permitido. Apenas solicitações GET são permitidas', 405)
+    """Manejar métodos no permitidos (lista los métodos de la ruta, p. ej. POST en /batch)"""
+    # Un 405 se produce al enrutar, antes de conocer el blueprint: se registra para
+    # toda la aplicación y solo responde JSON bajo /api
+    if not request.path.startswith(f'{api_bp.url_prefix}/'):
+        return error
+    allowed = sorted(error.valid_methods or [])
+    if not allowed:
+        return error_response('Método HTTP não permitido', 405)
+    response, status = error_response(f'Método HTTP não permitido. Métodos permitidos: {", ".join(allowed)}', 405)
+    response.headers['Allow'] = ', '.join(allowed)
+    return response, status
@@ -2,15 +2,26 @@
 Módulo de autenticación
 """
 
+import os
+from functools import lru_cache
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # Usuario admin hardcodeado
 ADMIN_USER = {
-    'username': 'admin',
-    'password': generate_password_hash('admin123')
+    'username': 'admin'
 }
 
 
+@lru_cache(maxsize=1)
+def admin_password_hash():
+    """
+    Hash de la contraseña del admin, calculado en el primer login y no al importar
+    (el KDF es lento a propósito y se pagaría en el arranque de cada worker).
+    ADMIN_PASSWORD_HASH permite configurar un hash ya calculado.
+    """
+    return os.getenv('ADMIN_PASSWORD_HASH') or generate_password_hash('admin123')
+
+
 def verify_credentials(username, password):
     """
     Verificar credenciales del usuario
@@ -23,7 +34,7 @@ def verify_credentials(username, password):
         dict con datos del usuario si es válido, None si no
     """
     if username == ADMIN_USER['username']:
-        if check_password_hash(ADMIN_USER['password'], password):
+        if check_password_hash(admin_password_hash(), password):
             return {
                 'username': ADMIN_USER['username'],
                 'role': 'admin'
@@ -0,0 +1,147 @@
+"""
+Peticiones agrupadas: varias peticiones GET de la API en una sola ida y vuelta
+
+POST /api/batch recibe una lista de subpeticiones ({name, path, params}) hacia
+rutas GET existentes de los blueprints api y dashboard. Cada subpetición se
+despacha dentro del servidor con su propio contexto de aplicación y de
+petición (hooks, réplica de lectura, métricas y manejadores de error
+incluidos, como si llegara por HTTP) y con las cookies del cliente, de modo
+que la sesión es la misma.
+
+Las subpeticiones se ejecutan en paralelo con app/parallel.py, salvo las de
+BATCH_SEQUENTIAL_ENDPOINTS (refrescan el rollup diario antes de leer), que van
+después y en secuencia. Cada subpetición puede llevar el ETag que el cliente
+ya tiene (ver app/conditional.py) y recibir un 304 sin cuerpo.
+"""
+
+from urllib.parse import urlencode, urlsplit
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+
+from app.models import db
+from app.parallel import run_parallel, supports_parallel
+
+BATCH_BLUEPRINTS = ('api', 'dashboard')
+# Respuestas que no son JSON (streaming) o que no tienen sentido dentro de un lote
+BATCH_EXCLUDED_ENDPOINTS = ('api.batch', 'api.export_movimientos', 'dashboard.stream_dashboard')
+# Escriben en movimientos_daily antes de leer: no se ejecutan a la vez
+BATCH_SEQUENTIAL_ENDPOINTS = ('dashboard.get_resumo_diario', 'dashboard.export_consumo_neto_por_servico')
+# Cabeceras del cliente que se propagan a cada subpetición
+FORWARDED_HEADERS = ('Cookie', 'X-Read-Primary', 'Accept-Language')
+
+
+class BatchError(ValueError):
+    """Lote inválido (se responde con 400)"""
+
+
+class SubRequest:
+    __slots__ = ('name', 'path', 'query_string', 'endpoint', 'etag')
+
+    def __init__(self, name, path, query_string, endpoint, etag=None):
+        self.name = name
+        self.path = path
+        self.query_string = query_string
+        self.endpoint = endpoint
+        self.etag = etag
+
+
+def parse_batch(payload, app, max_requests):
+    """
+    Validar el cuerpo de /api/batch.
+
+    Args:
+        payload: {"requests": [{"name": "...", "path": "/api/...", "params": {...}, "etag": "..."}, ...]}
+
+    Returns:
+        lista de SubRequest
+
+    Raises:
+        BatchError: si el lote o alguna subpetición no es válida
+    """
+    items = payload.get('requests') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        raise BatchError('O corpo deve ser um JSON com uma lista "requests" não vazia')
+    if len(items) > max_requests:
+        raise BatchError(f'Máximo de {max_requests} requisições por lote')
+
+    adapter = app.url_map.bind('')
+    subrequests = []
+    names = set()
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise BatchError(f'requests[{i}] deve ser um objeto')
+        name = item.get('name')
+        path = item.get('path')
+        params = item.get('params') or {}
+        if not isinstance(name, str) or not name:
+            raise BatchError(f'requests[{i}].name é obrigatório')
+        if name in names:
+            raise BatchError(f'Nome repetido no lote: {name}')
+        if not isinstance(path, str) or not path.startswith('/'):
+            raise BatchError(f'requests[{i}].path deve ser uma rota da API')
+        if not isinstance(params, dict):
+            raise BatchError(f'requests[{i}].params deve ser um objeto')
+        etag = item.get('etag')
+        if etag is not None and not isinstance(etag, str):
+            raise BatchError(f'requests[{i}].etag deve ser uma string')
+
+        parts = urlsplit(path)
+        try:
+            endpoint, _ = adapter.match(parts.path, method='GET')
+        except HTTPException:
+            raise BatchError(f'Rota GET não encontrada: {parts.path}')
+        if endpoint.split('.', 1)[0] not in BATCH_BLUEPRINTS or endpoint in BATCH_EXCLUDED_ENDPOINTS:
+            raise BatchError(f'Rota não permitida em lote: {parts.path}')
+
+        query_string = '&'.join(q for q in (parts.query, urlencode(params, doseq=True)) if q)
+        names.add(name)
+        subrequests.append(SubRequest(name, parts.path, query_string, endpoint, etag))
+    return subrequests
+
+
+def dispatch_subrequest(app, subrequest, headers, base_url):
+    """
+    Despachar una subpetición GET; devuelve {'status', 'etag', 'body'}.
+    Con etag de la subpetición se envía como If-None-Match: 304 y body None si no cambió.
+    """
+    if subrequest.etag:
+        headers = {**headers, 'If-None-Match': subrequest.etag}
+    environ = EnvironBuilder(
+        path=subrequest.path,
+        base_url=base_url,
+        query_string=subrequest.query_string,
+        method='GET',
+        headers=headers,
+    ).get_environ()
+    # Contexto de aplicación propio: g y la sesión de SQLAlchemy no se comparten entre subpeticiones
+    with app.app_context(), app.request_context(environ):
+        try:
+            response = app.full_dispatch_request()
+        except Exception as e:
+            # Igual que wsgi_app(): 500 con el manejador de errores de la aplicación
+            response = app.handle_exception(e)
+        try:
+            if response.status_code == 304:
+                body = None
+            else:
+                body = response.get_json(silent=True) if response.is_json else response.get_data(as_text=True)
+            return {'status': response.status_code, 'etag': response.headers.get('ETag'), 'body': body}
+        finally:
+            response.close()
+
+
+def run_batch(app, subrequests, headers, base_url, limit=None):
+    """Ejecutar el lote y devolver los resultados por nombre, en el orden recibido"""
+    forwarded = {key: headers[key] for key in FORWARDED_HEADERS if key in headers}
+    with app.app_context():
+        parallel_safe = supports_parallel(db.engine)
+
+    concurrent, sequential = {}, {}
+    for sub in subrequests:
+        target = concurrent if parallel_safe and sub.endpoint not in BATCH_SEQUENTIAL_ENDPOINTS else sequential
+        target[sub.name] = (dispatch_subrequest, (app, sub, forwarded, base_url))
+
+    results = run_parallel(concurrent, limit=limit) if concurrent else {}
+    results.update(run_parallel(sequential, limit=1))
+    return {sub.name: results[sub.name] for sub in subrequests}
@@ -0,0 +1,369 @@
+"""
+Backends de caché para los payloads del dashboard
+
+- memory: dict en proceso (default); cada worker tiene su propia copia
+- sqlite: archivo SQLite en modo WAL compartido por todos los workers del host
+
+Ambos exponen contadores de hits, misses y evictions. get_or_compute() agrega
+single-flight (un solo recálculo por clave, el resto espera su resultado) y
+stale-while-revalidate (se sirve el payload vencido mientras un hilo en segundo
+plano lo recalcula).
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_MAX_ENTRIES = 256
+_STATS_FLUSH_SECONDS = 5
+_COUNTERS = ('hits', 'misses', 'evictions', 'stale_hits', 'coalesced')
+
+
+class MemoryCacheBackend:
+    """Caché en proceso (LRU acotado por max_entries)"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=_DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._leases = {}
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(_COUNTERS, 0)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def get_entry(self, key, record=True):
+        """Retorna (payload, vigente) o (None, False) si no existe o ya pasó la ventana stale"""
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.time()
+            if entry is not None and now >= entry[2]:
+                del self._entries[key]
+                self._stats['evictions'] += 1
+                entry = None
+            if entry is None:
+                if record:
+                    self._stats['misses'] += 1
+                return None, False
+            payload, expires_at, _ = entry
+            self._entries.move_to_end(key)
+            fresh = now < expires_at
+            if record:
+                self._stats['hits' if fresh else 'stale_hits'] += 1
+            return payload, fresh
+
+    def get(self, key):
+        """Retorna el payload vigente o None"""
+        payload, fresh = self.get_entry(key)
+        return payload if fresh else None
+
+    def set(self, key, payload, ttl_seconds, stale_seconds=0):
+        with self._lock:
+            expires_at = time.time() + ttl_seconds
+            self._entries[key] = (payload, expires_at, expires_at + stale_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def acquire_lease(self, key, ttl_seconds):
+        """Tomar el derecho exclusivo a recalcular key. Retorna True si se obtuvo"""
+        with self._lock:
+            now = time.time()
+            if self._leases.get(key, 0) > now:
+                return False
+            self._leases[key] = now + ttl_seconds
+            return True
+
+    def release_lease(self, key):
+        with self._lock:
+            self._leases.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._leases.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+
+class SQLiteCacheBackend:
+    """
+    Caché compartida entre procesos en un archivo SQLite (WAL).
+
+    Los contadores se acumulan en memoria y se vuelcan a la tabla cache_stats
+    cada pocos segundos, para que un hit no implique una escritura.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, max_entries=_DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._pending = dict.fromkeys(_COUNTERS, 0)
+        self._pending_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._init_schema()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            # Una conexión por hilo y por proceso (no reutilizar tras fork)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        conn = self._connection()
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(cache_entries)')}
+        if columns and 'stale_until' not in columns:
+            # Archivo de una versión anterior: la caché es descartable
+            conn.execute('DROP TABLE cache_entries')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache_entries ('
+            ' key TEXT PRIMARY KEY, payload TEXT NOT NULL, expires_at REAL NOT NULL,'
+            ' stale_until REAL NOT NULL, stored_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_leases (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        conn.executemany(
+            'INSERT OR IGNORE INTO cache_stats (name, value) VALUES (?, 0)', [(name,) for name in _COUNTERS]
+        )
+
+    def count(self, name, amount=1):
+        with self._pending_lock:
+            self._pending[name] += amount
+            if time.monotonic() - self._last_flush < _STATS_FLUSH_SECONDS:
+                return
+        self._flush_stats()
+
+    def _flush_stats(self):
+        with self._pending_lock:
+            pending = self._pending
+            self._pending = dict.fromkeys(_COUNTERS, 0)
+            self._last_flush = time.monotonic()
+        updates = [(value, name) for name, value in pending.items() if value]
+        if updates:
+            self._connection().executemany('UPDATE cache_stats SET value = value + ? WHERE name = ?', updates)
+
+    def get_entry(self, key, record=True):
+        """Retorna (payload, vigente) o (None, False) si no existe o ya pasó la ventana stale"""
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT payload, expires_at, stale_until FROM cache_entries WHERE key = ?', (key,)
+        ).fetchone()
+        now = time.time()
+        if row is not None and now >= row[2]:
+            deleted = conn.execute(
+                'DELETE FROM cache_entries WHERE key = ? AND stale_until = ?', (key, row[2])
+            ).rowcount
+            if deleted:
+                self.count('evictions', deleted)
+            row = None
+        if row is None:
+            if record:
+                self.count('misses')
+            return None, False
+        payload, expires_at, _ = row
+        fresh = now < expires_at
+        if record:
+            self.count('hits' if fresh else 'stale_hits')
+        return json.loads(payload), fresh
+
+    def get(self, key):
+        """Retorna el payload vigente o None"""
+        payload, fresh = self.get_entry(key)
+        return payload if fresh else None
+
+    def set(self, key, payload, ttl_seconds, stale_seconds=0):
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            'INSERT INTO cache_entries (key, payload, expires_at, stale_until, stored_at) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET payload = excluded.payload, expires_at = excluded.expires_at, '
+            'stale_until = excluded.stale_until, stored_at = excluded.stored_at',
+            (key, json.dumps(payload), now + ttl_seconds, now + ttl_seconds + stale_seconds, now)
+        )
+        evicted = conn.execute(
+            'DELETE FROM cache_entries WHERE key IN ('
+            ' SELECT key FROM cache_entries ORDER BY stored_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        ).rowcount
+        if evicted:
+            self.count('evictions', evicted)
+
+    def acquire_lease(self, key, ttl_seconds):
+        """Tomar el derecho exclusivo (entre procesos) a recalcular key. Retorna True si se obtuvo"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute('DELETE FROM cache_leases WHERE key = ? AND expires_at <= ?', (key, now))
+        inserted = conn.execute(
+            'INSERT OR IGNORE INTO cache_leases (key, expires_at) VALUES (?, ?)', (key, now + ttl_seconds)
+        ).rowcount
+        return inserted == 1
+
+    def release_lease(self, key):
+        self._connection().execute('DELETE FROM cache_leases WHERE key = ?', (key,))
+
+    def clear(self):
+        conn = self._connection()
+        conn.execute('DELETE FROM cache_entries')
+        conn.execute('DELETE FROM cache_leases')
+
+    def stats(self):
+        self._flush_stats()
+        conn = self._connection()
+        stats = dict(conn.execute('SELECT name, value FROM cache_stats').fetchall())
+        stats['entries'] = conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+        return stats
+
+
+def create_cache_backend(config):
+    """Crear el backend configurado en DASHBOARD_CACHE_BACKEND (memory | sqlite)"""
+    backend_name = (config.get('DASHBOARD_CACHE_BACKEND') or 'memory').strip().lower()
+    max_entries = int(config.get('DASHBOARD_CACHE_MAX_ENTRIES') or _DEFAULT_MAX_ENTRIES)
+    if backend_name == 'memory':
+        return MemoryCacheBackend(max_entries=max_entries)
+    if backend_name == 'sqlite':
+        path = config.get('DASHBOARD_CACHE_PATH') or os.path.join(
+            tempfile.gettempdir(), 'stockv01_dashboard_cache.sqlite3'
+        )
+        return SQLiteCacheBackend(path, max_entries=max_entries)
+    raise ValueError(f'DASHBOARD_CACHE_BACKEND desconocido: {backend_name}')
+
+
+def get_cache_backend():
+    """Backend de caché de la aplicación actual (creado de forma diferida)"""
+    backend = current_app.extensions.get('dashboard_cache')
+    if backend is None:
+        backend = current_app.extensions.setdefault('dashboard_cache', create_cache_backend(current_app.config))
+    return backend
+
+
+class _Flight:
+    """Recálculo en curso dentro del proceso: los demás hilos esperan su resultado"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.payload = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _compute_and_store(backend, key, compute, ttl_seconds, stale_seconds):
+    payload = compute()
+    backend.set(key, payload, ttl_seconds, stale_seconds)
+    return payload
+
+
+def _refresh_in_background(app, backend, key, compute, ttl_seconds, stale_seconds):
+    def run():
+        try:
+            with app.app_context():
+                _compute_and_store(backend, key, compute, ttl_seconds, stale_seconds)
+        except Exception as e:
+            logger.error(f'Error recalculando caché {key} en segundo plano: {e}')
+        finally:
+            backend.release_lease(key)
+
+    threading.Thread(target=run, name=f'cache-refresh-{key}', daemon=True).start()
+
+
+def _wait_for_other_process(backend, key, timeout_seconds):
+    """Esperar a que otro proceso (que tiene el lease) publique el payload"""
+    deadline = time.monotonic() + timeout_seconds
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        payload, fresh = backend.get_entry(key, record=False)
+        if fresh:
+            return payload
+    return None
+
+
+def _single_flight(backend, key, compute, ttl_seconds, stale_seconds, lock_timeout):
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        backend.count('coalesced')
+        flight.done.wait(lock_timeout)
+        if flight.error is not None:
+            raise flight.error
+        if flight.payload is not None:
+            return flight.payload
+        # El líder tardó más que lock_timeout: calcular sin coordinar
+        return _compute_and_store(backend, key, compute, ttl_seconds, stale_seconds)
+
+    try:
+        has_lease = backend.acquire_lease(key, lock_timeout)
+        try:
+            payload = None
+            if not has_lease:
+                backend.count('coalesced')
+                payload = _wait_for_other_process(backend, key, lock_timeout)
+            if payload is None:
+                payload = _compute_and_store(backend, key, compute, ttl_seconds, stale_seconds)
+        finally:
+            if has_lease:
+                backend.release_lease(key)
+        flight.payload = payload
+        return payload
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+
+def get_or_compute(key, compute, ttl_seconds, stale_seconds=None, lock_timeout=None):
+    """
+    Obtener el payload cacheado de key o calcularlo con compute().
+
+    - Vigente: se retorna directamente.
+    - Vencido pero dentro de stale_seconds: se retorna el payload viejo y un
+      único hilo en segundo plano lo recalcula.
+    - Ausente: un solo llamador (por proceso y, con lease, por host) ejecuta
+      compute(); los demás esperan su resultado hasta lock_timeout segundos.
+    """
+    config = current_app.config
+    if stale_seconds is None:
+        stale_seconds = int(config.get('DASHBOARD_CACHE_STALE_SECONDS', 0))
+    if lock_timeout is None:
+        lock_timeout = float(config.get('DASHBOARD_CACHE_LOCK_TIMEOUT', 10))
+
+    backend = get_cache_backend()
+    payload, fresh = backend.get_entry(key)
+    if payload is not None:
+        if not fresh and backend.acquire_lease(key, lock_timeout):
+            _refresh_in_background(
+                current_app._get_current_object(), backend, key, compute, ttl_seconds, stale_seconds
+            )
+        return payload
+
+    return _single_flight(backend, key, compute, ttl_seconds, stale_seconds, lock_timeout)
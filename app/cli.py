@@ -0,0 +1,79 @@
+"""
+Comandos de línea de comandos (flask <comando>)
+"""
+
+import click
+from app.models import db
+from app.ingest import INGEST_FORMATS, IngestError, detect_format, ingest_movimientos
+from app.migrations import SCHEMA_VERSION, current_version, migrate
+from app.movimientos_daily import rebuild_movimientos_daily, refresh_movimientos_daily
+from app.stock_latest import install_stock_latest_triggers, rebuild_stock_latest
+
+
+def register_commands(app):
+    """Registrar los comandos CLI en la aplicación"""
+
+    @app.cli.command('migrate')
+    @click.option('--status', is_flag=True, help='Solo mostrar la versión actual y la esperada')
+    def migrate_command(status):
+        """Aplicar las migraciones pendientes del esquema"""
+        if status:
+            with db.engine.connect() as connection:
+                version = current_version(connection)
+            click.echo(f'Esquema en versión {version} (esperada {SCHEMA_VERSION})')
+            return
+        applied = migrate(db.engine)
+        for number, description in applied:
+            click.echo(f'Migración {number} aplicada: {description}')
+        click.echo(f'Esquema en versión {SCHEMA_VERSION}')
+
+    @app.cli.command('rebuild-stock-latest')
+    def rebuild_stock_latest_command():
+        """Reinstalar triggers y reconstruir stock_latest desde stock_actual"""
+        with db.engine.begin() as connection:
+            install_stock_latest_triggers(connection)
+            total = rebuild_stock_latest(connection)
+        click.echo(f'stock_latest reconstruida: {total} productos')
+
+    @app.cli.command('rebuild-movimientos-daily')
+    def rebuild_movimientos_daily_command():
+        """Reconstruir el rollup movimientos_daily desde movimientos"""
+        with db.engine.begin() as connection:
+            total = rebuild_movimientos_daily(connection)
+        click.echo(f'movimientos_daily reconstruida: {total} filas')
+
+    @app.cli.command('refresh-movimientos-daily')
+    def refresh_movimientos_daily_command():
+        """Agregar al rollup movimientos_daily los movimientos nuevos (para cron)"""
+        last_id = refresh_movimientos_daily(db.engine)
+        click.echo(f'movimientos_daily agregada hasta el movimiento {last_id}')
+
+    @app.cli.command('ingest-movimientos')
+    @click.argument('archivo', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(INGEST_FORMATS), help='Default: según la extensión del archivo')
+    @click.option('--batch-size', type=int, default=None, help='Filas por lote (default: INGEST_BATCH_SIZE)')
+    @click.option('--skip-invalid', is_flag=True, help='Omitir filas inválidas en lugar de cancelar la carga')
+    @click.option('--defer-indexes', is_flag=True, help='Recrear los índices de movimientos al final (cargas grandes)')
+    def ingest_movimientos_command(archivo, fmt, batch_size, skip_invalid, defer_indexes):
+        """Cargar movimientos desde un CSV o NDJSON y actualizar stock_actual"""
+        fmt = fmt or detect_format(filename=archivo)
+        batch_size = batch_size or app.config.get('INGEST_BATCH_SIZE', 50000)
+        with open(archivo, encoding='utf-8-sig', newline='') as stream:
+            try:
+                result = ingest_movimientos(
+                    db.engine, stream, fmt,
+                    batch_size=batch_size,
+                    skip_invalid=skip_invalid,
+                    defer_indexes=defer_indexes
+                )
+            except IngestError as e:
+                for error in e.errors:
+                    click.echo(f'línea {error["linea"]}: {error["error"]}', err=True)
+                raise click.ClickException(str(e))
+        for error in result['errores']:
+            click.echo(f'línea {error["linea"]}: {error["error"]}', err=True)
+        click.echo(
+            f'{result["insertados"]} movimientos cargados en {result["segundos"]}s '
+            f'({result["filas_por_segundo"]} filas/s), {result["rechazados"]} rechazados, '
+            f'{result["productos_actualizados"]} productos de stock actualizados'
+        )
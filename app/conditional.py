@@ -0,0 +1,99 @@
+"""
+ETag y GET condicional a partir de la versión de datos
+
+Para las peticiones GET de los blueprints api y dashboard se calcula, antes de
+ejecutar la vista, un ETag débil a partir de:
+- la versión de datos: max(movimientos.id) y el contador de stock_actual
+  (ver app/data_version.py), leídos en una sola sentencia
+- la ruta y los parámetros normalizados (ordenados, sin valores vacíos)
+- la fecha de hoy (local y de America/Sao_Paulo): los vencimientos y el
+  resumen del día cambian a medianoche aunque no cambien los datos
+
+Si If-None-Match coincide se responde 304 sin ejecutar la vista (ni sus
+consultas). Si no, la respuesta 200 lleva el ETag y Cache-Control: no-cache
+(el cliente guarda el cuerpo y lo revalida en cada uso).
+
+La versión queda en g.data_version para que las cachés de la vista (ver
+dashboard_api) no devuelvan un payload de otra versión con este ETag.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from flask import current_app, g, request
+
+from app.data_version import get_data_versions
+
+logger = logging.getLogger(__name__)
+
+ETAG_BLUEPRINTS = ('api', 'dashboard')
+# Respuestas que no dependen (solo) de los datos versionados
+ETAG_EXCLUDED_ENDPOINTS = ('api.get_slow_queries', 'dashboard.get_cache_stats', 'dashboard.stream_dashboard')
+
+
+def _sao_paulo_tz():
+    try:
+        return ZoneInfo('America/Sao_Paulo')
+    except ZoneInfoNotFoundError:
+        return timezone(timedelta(hours=-3))
+
+
+def normalized_params(args):
+    """Parámetros de la petición ordenados, sin espacios sobrantes ni valores vacíos"""
+    return sorted(
+        (key, value.strip())
+        for key, values in args.lists()
+        for value in values
+        if value.strip()
+    )
+
+
+def compute_etag(version, path, args):
+    """ETag (sin comillas) para una versión de datos, ruta y parámetros"""
+    days = (datetime.now().date().isoformat(), datetime.now(_sao_paulo_tz()).date().isoformat())
+    raw = json.dumps([list(version), path, normalized_params(args), days], separators=(',', ':'))
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def _applies():
+    return (
+        request.method in ('GET', 'HEAD')
+        and request.blueprint in ETAG_BLUEPRINTS
+        and request.endpoint not in ETAG_EXCLUDED_ENDPOINTS
+    )
+
+
+def init_conditional_get(app):
+    """Registrar los hooks de ETag/If-None-Match si ETAG_ENABLED está activo"""
+    if not app.config.get('ETAG_ENABLED', True):
+        return
+
+    @app.before_request
+    def _conditional_get():
+        if not _applies():
+            return None
+        try:
+            version = get_data_versions()
+        except Exception as e:
+            # Sin versión (p. ej. esquema sin migrar) la petición sigue sin ETag
+            logger.warning(f'No se pudo leer la versión de datos para el ETag: {e}')
+            return None
+        g.data_version = version
+        g.etag = compute_etag(version, request.path, request.args)
+        if request.if_none_match.contains_weak(g.etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(g.etag, weak=True)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return None
+
+    @app.after_request
+    def _add_etag(response):
+        etag = g.get('etag')
+        if etag and response.status_code == 200:
+            response.set_etag(etag, weak=True)
+            response.headers.setdefault('Cache-Control', 'no-cache')
+        return response
@@ -0,0 +1,136 @@
+"""
+Totales para respuestas paginadas: caché de COUNT exacto y estimaciones del planner
+
+Modos (parámetro count=):
+- exact: COUNT(*) exacto, cacheado por conjunto de filtros normalizado y
+  versión de datos (ver app/data_version.py)
+- estimate: estimación del planner en Postgres (reltuples o EXPLAIN);
+  en otros motores se usa el conteo exacto cacheado
+- none: no se cuenta; la respuesta usa has_more
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import Select, text
+
+from app.data_version import get_data_version
+
+logger = logging.getLogger(__name__)
+
+COUNT_MODES = ('exact', 'estimate', 'none')
+
+_DEFAULT_TTL_SECONDS = 300
+_DEFAULT_MAX_ENTRIES = 1024
+
+
+class CountCache:
+    """Caché LRU en proceso de totales, válida mientras no cambie la versión de datos"""
+
+    def __init__(self, max_entries=_DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version, ttl_seconds):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            cached_version, stored_at, value = entry
+            if cached_version != version or time.monotonic() - stored_at > ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+count_cache = CountCache()
+
+
+def make_count_key(resource, filters):
+    """Clave estable a partir del recurso y los filtros normalizados (sin valores vacíos)"""
+    normalized = {k: v for k, v in filters.items() if v not in (None, '')}
+    return resource + ':' + json.dumps(normalized, sort_keys=True, default=str)
+
+
+def estimate_count(session, statement):
+    """
+    Estimar filas de un SELECT con el planner de Postgres.
+
+    Sin WHERE se usa pg_class.reltuples; con filtros, las filas estimadas del
+    plan (EXPLAIN FORMAT JSON). Retorna None si el motor no ofrece estimaciones.
+    """
+    bind = session.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return None
+
+    froms = statement.get_final_froms() if isinstance(statement, Select) else []
+    if len(froms) == 1 and statement.whereclause is None and hasattr(froms[0], 'name'):
+        reltuples = session.execute(
+            text('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:name)'),
+            {'name': froms[0].name}
+        ).scalar()
+        # reltuples = -1 cuando la tabla nunca fue analizada
+        if reltuples is not None and reltuples >= 0:
+            return int(reltuples)
+
+    compiled = statement.compile(dialect=bind.dialect)
+    plan = session.connection().exec_driver_sql(
+        f'EXPLAIN (FORMAT JSON) {compiled}', compiled.params
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def resolve_total(mode, key, version_name, exact_count, session=None, statement=None):
+    """
+    Obtener el total según el modo de conteo.
+
+    Args:
+        mode: 'exact' | 'estimate' | 'none'
+        key: clave de make_count_key()
+        version_name: conjunto de datos para invalidar ('movimientos' o 'stock')
+        exact_count: callable que ejecuta el COUNT exacto
+        session/statement: SELECT filtrado (sin paginar) para la estimación
+
+    Returns:
+        (total, estimado) — total es None en modo 'none'
+    """
+    if mode == 'none':
+        return None, False
+
+    if mode == 'estimate' and statement is not None:
+        try:
+            # Savepoint: un EXPLAIN fallido no debe abortar la transacción en curso
+            with session.begin_nested():
+                estimated = estimate_count(session, statement)
+        except Exception as e:
+            logger.warning(f'No se pudo estimar el total ({key}): {e}')
+            estimated = None
+        if estimated is not None:
+            return estimated, True
+
+    ttl_seconds = current_app.config.get('COUNT_CACHE_TTL_SECONDS', _DEFAULT_TTL_SECONDS)
+    version = get_data_version(version_name)
+    total = count_cache.get(key, version, ttl_seconds)
+    if total is None:
+        total = exact_count()
+        count_cache.set(key, version, total)
+    return total, False
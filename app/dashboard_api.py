@@ -2,9 +2,13 @@
 Blueprint para endpoints del Dashboard
 """
 
-from flask import Blueprint, jsonify, request
-from datetime import datetime, timedelta, time, timezone
-from app.models import db, StockActual, Movimiento
+from flask import Blueprint, Response, current_app, g, jsonify, request
+from datetime import datetime, timedelta, timezone
+from app.models import db, Movimiento, MovimientoDiario, MOVIMIENTO_ROW_COLUMNS, movimiento_row_to_dict
+from app.cache import get_cache_backend, get_or_compute
+from app.dashboard_stats import compute_stats
+from app.live import get_live_feed
+from app.parallel import run_queries
 import logging
 from sqlalchemy import func, case
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
@@ -14,10 +18,6 @@ logger = logging.getLogger(__name__)
 dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/api/dashboard')
 
 _CACHE_TTL_SECONDS = 10
-_dashboard_cache = {
-    'stats': {'expires_at': None, 'payload': None},
-    'movimientos_recientes': {'expires_at': None, 'payload': None},
-}
 
 
 def _sao_paulo_tz():
@@ -95,40 +95,120 @@ def _build_whatsapp_export_text(fecha_obj, grouped_data):
     return '\n'.join(lines)
 
 
-def _get_cached_payload(cache_key):
-    entry = _dashboard_cache.get(cache_key)
-    if not entry or not entry['payload'] or not entry['expires_at']:
-        return None
-    if datetime.utcnow() >= entry['expires_at']:
-        return None
-    return entry['payload']
+RESUMO_MAX_DIAS = 366
+RESUMO_AGRUPACIONES = ('dia', 'semana')
 
 
-def _set_cached_payload(cache_key, payload, ttl_seconds=_CACHE_TTL_SECONDS):
-    _dashboard_cache[cache_key] = {
-        'payload': payload,
-        'expires_at': datetime.utcnow() + timedelta(seconds=ttl_seconds)
+def _consumo_item(producto, destino, unidade, saidas, voltas, fecha_producto):
+    destino = destino or 'desconocido'
+    saidas = int(saidas or 0)
+    voltas = int(voltas or 0)
+    return {
+        'producto': producto or 'desconocido',
+        'unidade': (unidade or '').strip(),
+        'destino': destino,
+        'destino_label': _destino_display(destino),
+        'saidas': saidas,
+        'voltas': voltas,
+        'neto': saidas - voltas,
+        'fecha_producto': fecha_producto.isoformat() if fecha_producto else None
     }
 
 
-def _serialize_alert_rows(rows, hoy, expired=False):
-    items = []
-    for nombre, fecha_producto, grupo, cantidad in rows:
-        if not fecha_producto:
-            continue
+def _saidas_por_destino_item(destino, total):
+    destino = (destino or '').strip() or 'desconocido'
+    return {
+        'destino': destino,
+        'destino_label': _destino_display(destino),
+        'total': int(total or 0)
+    }
 
-        item = {
-            'nombre': nombre,
-            'fecha_producto': fecha_producto.isoformat(),
-            'grupo': grupo,
-            'cantidad': cantidad,
-        }
-        if expired:
-            item['dias_vencido'] = (hoy - fecha_producto).days
-        else:
-            item['dias_restantes'] = (fecha_producto - hoy).days
-        items.append(item)
-    return items
+
+def _periodo_inicio(dia, agrupar):
+    if agrupar == 'semana':
+        # Semanas ISO: de lunes a domingo
+        return dia - timedelta(days=dia.weekday())
+    return dia
+
+
+def _build_desglose(rows, agrupar, fecha_desde, fecha_hasta):
+    """
+    Desglose por día o semana a partir de filas (dia, producto, destino, unidade,
+    saidas, voltas, fecha_producto) ya agregadas por día en movimientos_daily.
+    Incluye los periodos sin movimientos con listas vacías.
+    """
+    paso = timedelta(days=7 if agrupar == 'semana' else 1)
+    periodos = {}
+    inicio = _periodo_inicio(fecha_desde, agrupar)
+    while inicio <= fecha_hasta:
+        periodos[inicio] = {'items': {}, 'destinos': {}}
+        inicio += paso
+
+    for row in rows:
+        periodo = periodos[_periodo_inicio(row.dia, agrupar)]
+        destino = row.destino or 'desconocido'
+        item = periodo['items'].setdefault((row.producto, destino), [None, 0, 0, None])
+        if row.unidade and (item[0] is None or row.unidade > item[0]):
+            item[0] = row.unidade
+        item[1] += int(row.saidas or 0)
+        item[2] += int(row.voltas or 0)
+        if row.fecha_producto and (item[3] is None or row.fecha_producto > item[3]):
+            item[3] = row.fecha_producto
+        periodo['destinos'][destino] = periodo['destinos'].get(destino, 0) + int(row.saidas or 0)
+
+    desglose = []
+    for inicio, periodo in periodos.items():
+        saidas_por_destino = [
+            _saidas_por_destino_item(destino, total)
+            for destino, total in sorted(periodo['destinos'].items(), key=lambda kv: (-kv[1], kv[0]))
+        ]
+        consumo_por_item = [
+            _consumo_item(producto, destino, *valores)
+            for (producto, destino), valores in sorted(periodo['items'].items())
+        ]
+        desglose.append({
+            'periodo': inicio.isoformat(),
+            'fecha_desde': max(inicio, fecha_desde).isoformat(),
+            'fecha_hasta': min(inicio + paso - timedelta(days=1), fecha_hasta).isoformat(),
+            'saidas_por_destino': saidas_por_destino,
+            'consumo_por_item': consumo_por_item
+        })
+    return desglose
+
+
+def _get_or_compute_payload(cache_key, compute, ttl_seconds=_CACHE_TTL_SECONDS):
+    # Backend configurable (DASHBOARD_CACHE_BACKEND): memoria del proceso o SQLite compartido.
+    # Única vía a la caché del dashboard: single-flight + stale-while-revalidate
+    # (DASHBOARD_CACHE_STALE_SECONDS), sin recálculos simultáneos al vencer.
+    # Con ETag (app/conditional.py) la clave incluye la versión de datos: un payload
+    # de otra versión no puede salir con el ETag de esta
+    version = g.get('data_version')
+    if version is not None:
+        cache_key = f'{cache_key}@{version[0]}.{version[1]}'
+    return get_or_compute(cache_key, compute, ttl_seconds)
+
+
+def _compute_stats_payload():
+    hoy = datetime.now().date()
+
+    # Conteos por grupo, conteos por bucket de vencimiento y top 5 de cada bucket
+    # en una sola sentencia (ver app/dashboard_stats.py)
+    group_counts, alerts = compute_stats(db.session, hoy)
+    total_stock = sum(group_counts.values())
+
+    return {
+        'success': True,
+        'stats': {
+            'total_stock': total_stock,
+            'congelados': group_counts.get('CON', 0),
+            'hortifruti': group_counts.get('HOR', 0),
+            'frutales': group_counts.get('FRU', 0),
+            'secos': group_counts.get('SEC', 0),
+            'lacteos': group_counts.get('LAC', 0)
+        },
+        'alerts': alerts,
+        'timestamp': datetime.utcnow().isoformat()
+    }
 
 
 @dashboard_bp.route('/stats', methods=['GET'])
@@ -138,85 +218,7 @@ def get_stats():
     Obtiene estadísticas del dashboard
     """
     try:
-        cached = _get_cached_payload('stats')
-        if cached:
-            return jsonify(cached)
-
-        hoy = datetime.now().date()
-
-        # Una sola consulta para conteos por grupo (en vez de count() por cada grupo)
-        group_counts_rows = (
-            db.session.query(StockActual.grupo, func.count())
-            .group_by(StockActual.grupo)
-            .all()
-        )
-        group_counts = {grupo: int(total) for grupo, total in group_counts_rows}
-        total_stock = sum(group_counts.values())
-
-        # Alertas usando filtros por rango (evita cargar toda la tabla en memoria)
-        alert_columns = (
-            StockActual.nombre,
-            StockActual.fecha_producto,
-            StockActual.grupo,
-            StockActual.cantidad,
-        )
-        alert_base = db.session.query(*alert_columns).filter(StockActual.fecha_producto.isnot(None))
-
-        hoy_mas_3 = hoy + timedelta(days=3)
-        hoy_mas_4 = hoy + timedelta(days=4)
-        hoy_mas_7 = hoy + timedelta(days=7)
-
-        q_vencidos = alert_base.filter(StockActual.fecha_producto < hoy)
-        q_vencen_3 = alert_base.filter(
-            StockActual.fecha_producto >= hoy,
-            StockActual.fecha_producto <= hoy_mas_3
-        )
-        q_vencen_7 = alert_base.filter(
-            StockActual.fecha_producto >= hoy_mas_4,
-            StockActual.fecha_producto <= hoy_mas_7
-        )
-
-        vencidos_count = q_vencidos.count()
-        vencen_3_count = q_vencen_3.count()
-        vencen_7_count = q_vencen_7.count()
-
-        vencidos_lista = _serialize_alert_rows(
-            q_vencidos.order_by(StockActual.fecha_producto.asc()).limit(5).all(),
-            hoy,
-            expired=True
-        )
-        vencen_3_dias_lista = _serialize_alert_rows(
-            q_vencen_3.order_by(StockActual.fecha_producto.asc()).limit(5).all(),
-            hoy
-        )
-        vencen_7_dias_lista = _serialize_alert_rows(
-            q_vencen_7.order_by(StockActual.fecha_producto.asc()).limit(5).all(),
-            hoy
-        )
-
-        payload = {
-            'success': True,
-            'stats': {
-                'total_stock': total_stock,
-                'congelados': group_counts.get('CON', 0),
-                'hortifruti': group_counts.get('HOR', 0),
-                'frutales': group_counts.get('FRU', 0),
-                'secos': group_counts.get('SEC', 0),
-                'lacteos': group_counts.get('LAC', 0)
-            },
-            'alerts': {
-                'vencidos': vencidos_count,
-                'vencidos_lista': vencidos_lista,
-                'vencen_3_dias': vencen_3_count,
-                'vencen_3_dias_lista': vencen_3_dias_lista,
-                'vencen_7_dias': vencen_7_count,
-                'vencen_7_dias_lista': vencen_7_dias_lista
-            },
-            'timestamp': datetime.utcnow().isoformat()
-        }
-
-        _set_cached_payload('stats', payload)
-        return jsonify(payload)
+        return jsonify(_get_or_compute_payload('stats', _compute_stats_payload))
     
     except Exception as e:
         logger.error(f'Error en GET /api/dashboard/stats: {str(e)}')
@@ -226,6 +228,21 @@ def get_stats():
         }), 500
 
 
+def _compute_movimientos_recientes_payload():
+    rows = db.session.query(*MOVIMIENTO_ROW_COLUMNS).order_by(
+        Movimiento.fecha_movimiento.desc()
+    ).limit(10).all()
+    
+    data = [movimiento_row_to_dict(row) for row in rows]
+    
+    return {
+        'success': True,
+        'data': data,
+        'total': len(data),
+        'timestamp': datetime.utcnow().isoformat()
+    }
+
+
 @dashboard_bp.route('/movimientos-recientes', methods=['GET'])
 def get_movimientos_recientes():
     """
@@ -233,28 +250,119 @@ def get_movimientos_recientes():
     Obtiene los últimos 10 movimientos
     """
     try:
-        cached = _get_cached_payload('movimientos_recientes')
-        if cached:
-            return jsonify(cached)
+        return jsonify(_get_or_compute_payload(
+            'movimientos_recientes',
+            _compute_movimientos_recientes_payload,
+            ttl_seconds=5
+        ))
+    
+    except Exception as e:
+        logger.error(f'Error en GET /api/dashboard/movimientos-recientes: {str(e)}')
+        return jsonify({
+            'success': False,
+            'error': f'Erro interno do servidor: {str(e)}'
+        }), 500
+
+
+# Movimientos nuevos enviados en un evento del feed en vivo
+_LIVE_MAX_NUEVOS = 50
+
+
+def compute_live_event(previous_version, version):
+    """
+    Payload de un evento del feed en vivo (ver app/live.py): stats/alertas,
+    movimientos recientes y los movimientos insertados desde previous_version.
+
+    Se ejecuta una vez por cambio de versión para todos los clientes; usa las
+    mismas entradas de caché (por versión) que GET /stats y /movimientos-recientes.
+    """
+    g.data_version = version
+    nuevos = []
+    if previous_version is not None and version[0] > previous_version[0]:
+        rows = db.session.query(*MOVIMIENTO_ROW_COLUMNS).filter(
+            Movimiento.id > previous_version[0]
+        ).order_by(Movimiento.id.desc()).limit(_LIVE_MAX_NUEVOS).all()
+        nuevos = [movimiento_row_to_dict(row) for row in rows]
+    
+    return {
+        'version': f'{version[0]}.{version[1]}',
+        'stats': _get_or_compute_payload('stats', _compute_stats_payload),
+        'movimientos': _get_or_compute_payload(
+            'movimientos_recientes',
+            _compute_movimientos_recientes_payload,
+            ttl_seconds=5
+        ),
+        'nuevos': nuevos,
+        'timestamp': datetime.utcnow().isoformat()
+    }
+
 
-        movimientos = Movimiento.query.order_by(
-            Movimiento.fecha_movimiento.desc()
-        ).limit(10).all()
+@dashboard_bp.route('/stream', methods=['GET'])
+def stream_dashboard():
+    """
+    GET /api/dashboard/stream
+    Server-Sent Events: evento 'update' con stats, alertas y movimientos recientes
+    al conectar y cada vez que cambian los datos
+    """
+    try:
+        if request.method == 'HEAD':
+            # HEAD no lee el cuerpo: solo las cabeceras, sin registrar un suscriptor
+            response = Response(mimetype='text/event-stream')
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
         
-        data = [m.to_dict() for m in movimientos]
+        feed = get_live_feed()
+        subscription = feed.subscribe()
+        if subscription is None:
+            # El dashboard pasa a consultar /api/batch periódicamente (sin tiempo real)
+            logger.warning(
+                f'Feed en vivo lleno ({current_app.config["LIVE_MAX_SUBSCRIBERS"]} clientes por worker): '
+                f'cliente sin stream; subir GUNICORN_THREADS / LIVE_MAX_SUBSCRIBERS o añadir workers'
+            )
+            response = jsonify({
+                'success': False,
+                'error': 'Muitas conexões ao vivo abertas; tente novamente em instantes'
+            })
+            response.headers['Retry-After'] = '120'
+            return response, 503
         
-        payload = {
+        response = Response(
+            feed.stream(subscription, request.headers.get('Last-Event-ID')),
+            mimetype='text/event-stream'
+        )
+        response.headers['Cache-Control'] = 'no-cache'
+        # nginx: no acumular el stream en el buffer del proxy
+        response.headers['X-Accel-Buffering'] = 'no'
+        # Si el cuerpo nunca se llega a iterar (cliente que corta antes) el finally
+        # del generador no se ejecuta: se libera el suscriptor al cerrar la respuesta
+        subscriber = subscription[0]
+        response.call_on_close(lambda: feed.unsubscribe(subscriber))
+        return response
+    
+    except Exception as e:
+        logger.error(f'Error en GET /api/dashboard/stream: {str(e)}')
+        return jsonify({
+            'success': False,
+            'error': f'Erro interno do servidor: {str(e)}'
+        }), 500
+
+
+@dashboard_bp.route('/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """
+    GET /api/dashboard/cache-stats
+    Contadores de la caché del dashboard (hits, misses, evictions, entries)
+    """
+    try:
+        backend = get_cache_backend()
+        return jsonify({
             'success': True,
-            'data': data,
-            'total': len(data),
+            'backend': backend.name,
+            'stats': backend.stats(),
             'timestamp': datetime.utcnow().isoformat()
-        }
-
-        _set_cached_payload('movimientos_recientes', payload, ttl_seconds=5)
-        return jsonify(payload)
-    
+        })
     except Exception as e:
-        logger.error(f'Error en GET /api/dashboard/movimientos-recientes: {str(e)}')
+        logger.error(f'Error en GET /api/dashboard/cache-stats: {str(e)}')
         return jsonify({
             'success': False,
             'error': f'Erro interno do servidor: {str(e)}'
@@ -268,39 +376,58 @@ def get_resumo_diario():
 
     Parámetros:
     - fecha: YYYY-MM-DD (default: hoy en America/Sao_Paulo)
+    - fecha_desde / fecha_hasta: YYYY-MM-DD, rango inclusivo (reemplaza a fecha;
+      máximo RESUMO_MAX_DIAS días)
+    - agrupar: desglose opcional de consumo_por_item y saidas_por_destino: dia|semana
     - destino: concepto de servicio (opcional): alm|jan|kit|cof
     """
     try:
         tz_sp = _sao_paulo_tz()
         fecha_raw = (request.args.get('fecha') or '').strip()
+        fecha_desde_raw = (request.args.get('fecha_desde') or '').strip()
+        fecha_hasta_raw = (request.args.get('fecha_hasta') or '').strip()
+        agrupar = (request.args.get('agrupar') or '').strip().lower()
         destino_raw = (request.args.get('destino') or '').strip()
         destino_norm = destino_raw.lower()
 
-        if fecha_raw:
+        fechas = {}
+        for nombre, valor in (('fecha', fecha_raw), ('fecha_desde', fecha_desde_raw), ('fecha_hasta', fecha_hasta_raw)):
+            if not valor:
+                continue
             try:
-                fecha_obj = datetime.strptime(fecha_raw, '%Y-%m-%d').date()
+                fechas[nombre] = datetime.strptime(valor, '%Y-%m-%d').date()
             except ValueError:
-                return jsonify({'success': False, 'error': 'Parâmetro fecha inválido. Use YYYY-MM-DD'}), 400
+                return jsonify({'success': False, 'error': f'Parâmetro {nombre} inválido. Use YYYY-MM-DD'}), 400
+
+        if 'fecha_desde' in fechas or 'fecha_hasta' in fechas:
+            # Con un solo extremo, el rango es ese único día
+            fecha_desde = fechas.get('fecha_desde', fechas.get('fecha_hasta'))
+            fecha_hasta = fechas.get('fecha_hasta', fecha_desde)
         else:
-            fecha_obj = datetime.now(tz_sp).date()
+            fecha_desde = fecha_hasta = fechas.get('fecha') or datetime.now(tz_sp).date()
+
+        if fecha_hasta < fecha_desde:
+            return jsonify({'success': False, 'error': 'Parâmetro fecha_hasta deve ser maior ou igual a fecha_desde'}), 400
+        if (fecha_hasta - fecha_desde).days + 1 > RESUMO_MAX_DIAS:
+            return jsonify({'success': False, 'error': f'Intervalo máximo de {RESUMO_MAX_DIAS} dias'}), 400
+
+        if agrupar and agrupar not in RESUMO_AGRUPACIONES:
+            return jsonify({'success': False, 'error': 'Parâmetro agrupar inválido. Use dia, semana ou vazio'}), 400
 
         if destino_norm and destino_norm not in SERVICE_CONCEPTS:
             return jsonify({'success': False, 'error': 'Parâmetro destino inválido. Use alm, jan, kit, cof ou vazio'}), 400
 
-        day_start = datetime.combine(fecha_obj, time.min)
-        day_end = day_start + timedelta(days=1)
+        # Agregados desde el rollup diario (concepto/tipo ya normalizados)
 
-        concepto_norm = func.lower(func.trim(func.coalesce(Movimiento.concepto, '')))
-        tipo_norm = func.lower(func.trim(func.coalesce(Movimiento.tipo, '')))
-        unidade_norm = func.nullif(func.trim(func.coalesce(Movimiento.unidade, '')), '')
+        concepto_norm = MovimientoDiario.concepto
+        tipo_norm = MovimientoDiario.tipo
+        cantidad = MovimientoDiario.cantidad_total
+        unidade_norm = func.nullif(MovimientoDiario.unidade, '')
         is_service_concept = concepto_norm.in_(SERVICE_CONCEPTS)
-        in_day = (
-            Movimiento.fecha_movimiento >= day_start,
-            Movimiento.fecha_movimiento < day_end
-        )
 
-        base_query = Movimiento.query.filter(
-            *in_day
+        base_query = MovimientoDiario.query.filter(
+            MovimientoDiario.dia >= fecha_desde,
+            MovimientoDiario.dia <= fecha_hasta
         )
 
         if destino_norm:
@@ -310,13 +437,60 @@ def get_resumo_diario():
             is_service_concept,
             tipo_norm.in_(('saida', 'entrada'))
         )
-        summary_row = base_query.with_entities(
-            func.coalesce(func.sum(case(((is_service_concept & (tipo_norm == 'saida')), Movimiento.cantidad), else_=0)), 0),
-            func.coalesce(func.sum(case(((is_service_concept & (tipo_norm == 'entrada')), Movimiento.cantidad), else_=0)), 0),
-            func.coalesce(func.sum(case((tipo_norm == 'descarte', Movimiento.cantidad), else_=0)), 0),
-            func.coalesce(func.sum(case((((tipo_norm == 'entrada') & (concepto_norm == 'fornecedor')), Movimiento.cantidad), else_=0)), 0)
-        ).first()
+        # Resumen, saídas por destino, consumo por item y desglose no dependen entre
+        # sí: se ejecutan en paralelo, cada uno en su conexión (ver app/parallel.py)
+        destino_label = concepto_norm
+        saidas_total = func.coalesce(func.sum(case((tipo_norm == 'saida', cantidad), else_=0)), 0)
+        statements = {
+            'summary': base_query.with_entities(
+                func.coalesce(func.sum(case(((is_service_concept & (tipo_norm == 'saida')), cantidad), else_=0)), 0),
+                func.coalesce(func.sum(case(((is_service_concept & (tipo_norm == 'entrada')), cantidad), else_=0)), 0),
+                func.coalesce(func.sum(case((tipo_norm == 'descarte', cantidad), else_=0)), 0),
+                func.coalesce(func.sum(case((((tipo_norm == 'entrada') & (concepto_norm == 'fornecedor')), cantidad), else_=0)), 0)
+            ).statement,
+            'saidas_por_destino': (
+                consumo_query.with_entities(
+                    destino_label.label('destino'),
+                    saidas_total.label('total')
+                )
+                .group_by(destino_label)
+                .order_by(saidas_total.desc(), destino_label.asc())
+                .statement
+            ),
+            # Consumo neto por producto + destino:
+            # neto = sum(saidas) - sum(voltas) para o mesmo par (produto, destino)
+            'consumo': (
+                consumo_query.with_entities(
+                    MovimientoDiario.nombre.label('producto'),
+                    destino_label.label('destino'),
+                    func.max(unidade_norm).label('unidade'),
+                    saidas_total.label('saidas'),
+                    func.coalesce(func.sum(case((tipo_norm == 'entrada', cantidad), else_=0)), 0).label('voltas'),
+                    func.max(case((tipo_norm == 'saida', MovimientoDiario.fecha_producto_max), else_=None)).label('fecha_producto')
+                )
+                .group_by(MovimientoDiario.nombre, destino_label)
+                .order_by(MovimientoDiario.nombre.asc(), destino_label.asc())
+                .statement
+            ),
+        }
+        if agrupar:
+            # Una consulta más sobre el rollup, agregada por día; el desglose se arma en memoria
+            statements['desglose'] = (
+                consumo_query.with_entities(
+                    MovimientoDiario.dia.label('dia'),
+                    MovimientoDiario.nombre.label('producto'),
+                    concepto_norm.label('destino'),
+                    func.max(unidade_norm).label('unidade'),
+                    saidas_total.label('saidas'),
+                    func.coalesce(func.sum(case((tipo_norm == 'entrada', cantidad), else_=0)), 0).label('voltas'),
+                    func.max(case((tipo_norm == 'saida', MovimientoDiario.fecha_producto_max), else_=None)).label('fecha_producto')
+                )
+                .group_by(MovimientoDiario.dia, MovimientoDiario.nombre, concepto_norm)
+                .statement
+            )
+        results = run_queries(db.session, statements)
 
+        summary_row = results['summary'][0]
         saidas_bruto = int(summary_row[0] or 0)
         voltas = int(summary_row[1] or 0)
         descartes = int(summary_row[2] or 0)
@@ -328,60 +502,23 @@ def get_resumo_diario():
             {'tipo': 'entrada', 'total': voltas}
         ]
 
-        destino_label = concepto_norm
-        saidas_por_destino_rows = (
-            consumo_query.with_entities(
-                destino_label.label('destino'),
-                func.coalesce(func.sum(case((tipo_norm == 'saida', Movimiento.cantidad), else_=0)), 0).label('total')
-            )
-            .group_by(destino_label)
-            .order_by(func.coalesce(func.sum(case((tipo_norm == 'saida', Movimiento.cantidad), else_=0)), 0).desc(), destino_label.asc())
-            .all()
-        )
-        saidas_por_destino = []
-        for row in saidas_por_destino_rows:
-            destino = (row.destino or '').strip() or 'desconocido'
-            saidas_por_destino.append({
-                'destino': destino,
-                'destino_label': _destino_display(destino),
-                'total': int(row.total or 0)
-            })
+        saidas_por_destino = [_saidas_por_destino_item(row.destino, row.total) for row in results['saidas_por_destino']]
+        consumo_por_item = [
+            _consumo_item(row.producto, row.destino, row.unidade, row.saidas, row.voltas, row.fecha_producto)
+            for row in results['consumo']
+        ]
 
-        # Consumo neto por producto + destino:
-        # neto = sum(saidas) - sum(voltas) para o mesmo par (produto, destino)
-        consumo_rows = (
-            consumo_query.with_entities(
-                Movimiento.nombre.label('producto'),
-                destino_label.label('destino'),
-                func.max(unidade_norm).label('unidade'),
-                func.coalesce(func.sum(case((tipo_norm == 'saida', Movimiento.cantidad), else_=0)), 0).label('saidas'),
-                func.coalesce(func.sum(case((tipo_norm == 'entrada', Movimiento.cantidad), else_=0)), 0).label('voltas'),
-                func.max(case((tipo_norm == 'saida', Movimiento.fecha_producto), else_=None)).label('fecha_producto')
-            )
-            .group_by(Movimiento.nombre, destino_label)
-            .order_by(Movimiento.nombre.asc(), destino_label.asc())
-            .all()
-        )
-        consumo_por_item = []
-        for row in consumo_rows:
-            destino = row.destino or 'desconocido'
-            saidas_item = int(row.saidas or 0)
-            voltas_item = int(row.voltas or 0)
-            consumo_por_item.append({
-                'producto': row.producto or 'desconocido',
-                'unidade': (row.unidade or '').strip(),
-                'destino': destino,
-                'destino_label': _destino_display(destino),
-                'saidas': saidas_item,
-                'voltas': voltas_item,
-                'neto': saidas_item - voltas_item,
-                'fecha_producto': row.fecha_producto.isoformat() if row.fecha_producto else None
-            })
+        extra = {}
+        if agrupar:
+            extra['desglose'] = _build_desglose(results['desglose'], agrupar, fecha_desde, fecha_hasta)
 
         return jsonify({
             'success': True,
             'filters': {
-                'fecha': fecha_obj.isoformat(),
+                'fecha': fecha_desde.isoformat(),
+                'fecha_desde': fecha_desde.isoformat(),
+                'fecha_hasta': fecha_hasta.isoformat(),
+                'agrupar': agrupar,
                 'destino': destino_raw or '',
                 'timezone': 'America/Sao_Paulo'
             },
@@ -396,6 +533,7 @@ def get_resumo_diario():
             'saidas_por_destino': saidas_por_destino,
             'consumo_por_item': consumo_por_item,
             'total_listado': len(consumo_por_item),
+            **extra,
             'timestamp': datetime.utcnow().isoformat()
         })
 
@@ -433,28 +571,25 @@ def export_consumo_neto_por_servico():
         else:
             fecha_obj = datetime.now(tz_sp).date()
 
-        day_start = datetime.combine(fecha_obj, time.min)
-        day_end = day_start + timedelta(days=1)
-
-        concepto_norm = func.lower(func.trim(func.coalesce(Movimiento.concepto, '')))
-        tipo_norm = func.lower(func.trim(func.coalesce(Movimiento.tipo, '')))
-        unidade_norm = func.nullif(func.trim(func.coalesce(Movimiento.unidade, '')), '')
+        concepto_norm = MovimientoDiario.concepto
+        tipo_norm = MovimientoDiario.tipo
+        cantidad = MovimientoDiario.cantidad_total
+        unidade_norm = func.nullif(MovimientoDiario.unidade, '')
 
         rows = (
             db.session.query(
-                Movimiento.nombre.label('producto'),
+                MovimientoDiario.nombre.label('producto'),
                 concepto_norm.label('servicio'),
                 func.max(unidade_norm).label('unidade'),
-                func.coalesce(func.sum(case((tipo_norm == 'saida', Movimiento.cantidad), else_=0)), 0).label('liberado'),
-                func.coalesce(func.sum(case((tipo_norm == 'entrada', Movimiento.cantidad), else_=0)), 0).label('voltas')
+                func.coalesce(func.sum(case((tipo_norm == 'saida', cantidad), else_=0)), 0).label('liberado'),
+                func.coalesce(func.sum(case((tipo_norm == 'entrada', cantidad), else_=0)), 0).label('voltas')
             )
             .filter(
-                Movimiento.fecha_movimiento >= day_start,
-                Movimiento.fecha_movimiento < day_end,
+                MovimientoDiario.dia == fecha_obj,
                 concepto_norm.in_(SERVICE_CONCEPTS),
                 tipo_norm.in_(('saida', 'entrada'))
             )
-            .group_by(Movimiento.nombre, concepto_norm)
+            .group_by(MovimientoDiario.nombre, concepto_norm)
             .all()
         )
 
@@ -0,0 +1,186 @@
+"""
+Cálculo de estadísticas y alertas de vencimiento del dashboard
+
+compute_stats() resuelve en una sola sentencia:
+- conteo de stock por grupo (GROUP BY)
+- conteo por bucket de vencimiento (agregados condicionales COUNT(CASE ...))
+- los 5 primeros de cada bucket (row_number() OVER (PARTITION BY bucket ...))
+
+compute_stats_legacy() es la versión portable (una consulta por conteo y por
+lista, en paralelo); se usa en SQLite y en motores sin funciones de ventana.
+"""
+
+from datetime import timedelta
+
+from sqlalchemy import Date, Integer, String, case, cast, func, literal, null, select, union_all
+
+from app.models import StockActual
+from app.parallel import run_queries
+
+ALERT_BUCKETS = ('vencidos', 'vencen_3_dias', 'vencen_7_dias')
+ALERT_LIST_SIZE = 5
+
+
+def _bucket_bounds(hoy):
+    return hoy + timedelta(days=3), hoy + timedelta(days=4), hoy + timedelta(days=7)
+
+
+def _alert_item(bucket, nombre, fecha_producto, grupo, cantidad, hoy):
+    item = {
+        'nombre': nombre,
+        'fecha_producto': fecha_producto.isoformat(),
+        'grupo': grupo,
+        'cantidad': cantidad,
+    }
+    if bucket == 'vencidos':
+        item['dias_vencido'] = (hoy - fecha_producto).days
+    else:
+        item['dias_restantes'] = (fecha_producto - hoy).days
+    return item
+
+
+def supports_window_functions(session):
+    """Indica si el motor soporta funciones de ventana (SQLite >= 3.25, Postgres)"""
+    dialect = session.get_bind().dialect
+    if dialect.name == 'sqlite':
+        return dialect.dbapi.sqlite_version_info >= (3, 25, 0)
+    return True
+
+
+def build_stats_statement(hoy):
+    """
+    Sentencia única con dos tipos de fila:
+    - 'alerta': top 5 de cada bucket (row_number() OVER (PARTITION BY bucket ...))
+    - 'grupo': conteo por grupo y conteos por bucket con agregados condicionales
+    """
+    hoy_mas_3, hoy_mas_4, hoy_mas_7 = _bucket_bounds(hoy)
+    fecha = StockActual.fecha_producto
+
+    condiciones = {
+        'vencidos': fecha < hoy,
+        'vencen_3_dias': fecha.between(hoy, hoy_mas_3),
+        'vencen_7_dias': fecha.between(hoy_mas_4, hoy_mas_7),
+    }
+    bucket = case(*((condicion, key) for key, condicion in condiciones.items()), else_=None)
+
+    ranked = (
+        select(
+            StockActual.nombre,
+            fecha.label('fecha_producto'),
+            StockActual.grupo,
+            StockActual.cantidad,
+            bucket.label('bucket'),
+            func.row_number().over(partition_by=bucket, order_by=(fecha.asc(), StockActual.nombre.asc())).label('rn'),
+        )
+        # Todos los buckets caen en fecha_producto <= hoy + 7: rango sobre el índice de fecha
+        .where(fecha <= hoy_mas_7)
+        .subquery('ranked')
+    )
+
+    alerts_part = (
+        select(
+            literal('alerta', String).label('kind'),
+            ranked.c.bucket.label('clave'),
+            ranked.c.nombre,
+            ranked.c.fecha_producto,
+            ranked.c.grupo,
+            ranked.c.cantidad,
+            ranked.c.rn,
+            *(cast(null(), Integer).label(key) for key in ALERT_BUCKETS),
+        )
+        .where(ranked.c.bucket.isnot(None), ranked.c.rn <= ALERT_LIST_SIZE)
+    )
+    groups_part = (
+        select(
+            literal('grupo', String),
+            StockActual.grupo,
+            cast(null(), String),
+            cast(null(), Date),
+            cast(null(), String),
+            func.count(),
+            cast(null(), Integer),
+            *(func.count(case((condiciones[key], 1))) for key in ALERT_BUCKETS),
+        )
+        .group_by(StockActual.grupo)
+    )
+    # La rama de alertas va primero: define los nombres y tipos de las columnas del UNION
+    return union_all(alerts_part, groups_part)
+
+
+def prefers_single_statement(session):
+    """
+    La sentencia única ahorra idas y vueltas al servidor. En SQLite (en proceso)
+    no hay red de por medio y las consultas con LIMIT servidas por el índice de
+    fecha son más baratas que la ventana, así que se usa la versión separada.
+    """
+    return session.get_bind().dialect.name != 'sqlite'
+
+
+def compute_stats(session, hoy, single_statement=None):
+    """
+    Calcular conteos por grupo y alertas de vencimiento.
+
+    Args:
+        single_statement: forzar (True) o descartar (False) la sentencia única;
+            None decide según el motor (ver prefers_single_statement)
+
+    Returns:
+        (group_counts, alerts) con alerts en el formato del payload de /api/dashboard/stats
+    """
+    if single_statement is None:
+        single_statement = prefers_single_statement(session)
+    if not single_statement or not supports_window_functions(session):
+        return compute_stats_legacy(session, hoy)
+
+    group_counts = {}
+    totals = dict.fromkeys(ALERT_BUCKETS, 0)
+    listas = {key: [] for key in ALERT_BUCKETS}
+
+    for row in session.execute(build_stats_statement(hoy)):
+        if row.kind == 'grupo':
+            # En las filas de grupo, 'cantidad' lleva el conteo del grupo
+            group_counts[row.clave] = int(row.cantidad)
+            for key in ALERT_BUCKETS:
+                totals[key] += int(getattr(row, key))
+            continue
+        item = _alert_item(row.clave, row.nombre, row.fecha_producto, row.grupo, row.cantidad, hoy)
+        listas[row.clave].append((row.rn, item))
+
+    alerts = {}
+    for key in ALERT_BUCKETS:
+        alerts[key] = totals[key]
+        alerts[f'{key}_lista'] = [item for _, item in sorted(listas[key], key=lambda pair: pair[0])]
+    return group_counts, alerts
+
+
+def compute_stats_legacy(session, hoy):
+    """
+    Versión portable sin funciones de ventana: una consulta por conteo y por
+    lista, independientes entre sí y ejecutadas en paralelo (ver app/parallel.py)
+    """
+    hoy_mas_3, hoy_mas_4, hoy_mas_7 = _bucket_bounds(hoy)
+    fecha = StockActual.fecha_producto
+
+    condiciones = {
+        'vencidos': fecha < hoy,
+        'vencen_3_dias': (fecha >= hoy) & (fecha <= hoy_mas_3),
+        'vencen_7_dias': (fecha >= hoy_mas_4) & (fecha <= hoy_mas_7),
+    }
+
+    statements = {'grupos': select(StockActual.grupo, func.count()).group_by(StockActual.grupo)}
+    for key, condicion in condiciones.items():
+        statements[key] = select(func.count()).select_from(StockActual).where(fecha.isnot(None), condicion)
+        statements[f'{key}_lista'] = (
+            select(StockActual.nombre, fecha, StockActual.grupo, StockActual.cantidad)
+            .where(fecha.isnot(None), condicion)
+            .order_by(fecha.asc(), StockActual.nombre.asc())
+            .limit(ALERT_LIST_SIZE)
+        )
+    results = run_queries(session, statements)
+
+    group_counts = {grupo: int(total) for grupo, total in results['grupos']}
+    alerts = {}
+    for key in ALERT_BUCKETS:
+        alerts[key] = int(results[key][0][0])
+        alerts[f'{key}_lista'] = [_alert_item(key, *row, hoy) for row in results[f'{key}_lista']]
+    return group_counts, alerts
@@ -0,0 +1,129 @@
+"""
+Versiones de datos baratas para invalidar cachés
+
+- movimientos: max(movimientos.id) (lectura del índice de la PK)
+- stock_actual: contador en data_versions incrementado por triggers en cada escritura
+
+En PostgreSQL, además, cada sentencia que escribe en movimientos o stock_actual
+envía un NOTIFY por DATA_VERSION_CHANNEL (lo escucha app/live.py).
+"""
+
+from sqlalchemy import text
+
+_POSTGRES_DDL = (
+    """
+    CREATE OR REPLACE FUNCTION data_version_bump() RETURNS trigger AS $$
+    BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = TG_TABLE_NAME;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS data_version_stock_actual ON stock_actual",
+    """
+    CREATE TRIGGER data_version_stock_actual
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON stock_actual
+    FOR EACH STATEMENT EXECUTE FUNCTION data_version_bump()
+    """,
+)
+
+# Canal de NOTIFY en cada sentencia que escribe en movimientos o stock_actual (ver app/live.py)
+DATA_VERSION_CHANNEL = 'stockv01_data_versions'
+
+_POSTGRES_NOTIFY_DDL = (
+    f"""
+    CREATE OR REPLACE FUNCTION data_version_notify() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{DATA_VERSION_CHANNEL}', TG_TABLE_NAME);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS data_version_notify_movimientos ON movimientos",
+    """
+    CREATE TRIGGER data_version_notify_movimientos
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON movimientos
+    FOR EACH STATEMENT EXECUTE FUNCTION data_version_notify()
+    """,
+    "DROP TRIGGER IF EXISTS data_version_notify_stock_actual ON stock_actual",
+    """
+    CREATE TRIGGER data_version_notify_stock_actual
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON stock_actual
+    FOR EACH STATEMENT EXECUTE FUNCTION data_version_notify()
+    """,
+)
+
+_SQLITE_BUMP = "BEGIN UPDATE data_versions SET version = version + 1 WHERE name = 'stock_actual'; END"
+
+_SQLITE_DDL = (
+    "DROP TRIGGER IF EXISTS data_version_stock_actual_ai",
+    "DROP TRIGGER IF EXISTS data_version_stock_actual_au",
+    "DROP TRIGGER IF EXISTS data_version_stock_actual_ad",
+    f"CREATE TRIGGER data_version_stock_actual_ai AFTER INSERT ON stock_actual {_SQLITE_BUMP}",
+    f"CREATE TRIGGER data_version_stock_actual_au AFTER UPDATE ON stock_actual {_SQLITE_BUMP}",
+    f"CREATE TRIGGER data_version_stock_actual_ad AFTER DELETE ON stock_actual {_SQLITE_BUMP}",
+)
+
+
+def install_data_version_triggers(connection):
+    """Crear (o recrear) los triggers que incrementan data_versions"""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        statements = _POSTGRES_DDL
+    elif dialect == 'sqlite':
+        statements = _SQLITE_DDL
+    else:
+        raise NotImplementedError(f'data_versions no soporta el dialecto {dialect}')
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+
+def install_data_version_notify(connection):
+    """
+    Crear (o recrear) los triggers de NOTIFY en PostgreSQL.
+
+    En otros dialectos no hay NOTIFY: el feed en vivo consulta la versión periódicamente.
+    """
+    if connection.dialect.name != 'postgresql':
+        return
+    for statement in _POSTGRES_NOTIFY_DDL:
+        connection.exec_driver_sql(statement)
+
+
+def on_data_versions_created(target, connection, **kw):
+    """Listener after_create: registrar contadores e instalar triggers"""
+    connection.execute(text("INSERT INTO data_versions (name, version) VALUES ('stock_actual', 0)"))
+    install_data_version_triggers(connection)
+
+
+def get_data_version(name):
+    """
+    Obtener la versión actual de un conjunto de datos ('movimientos' o 'stock').
+
+    Cualquier escritura que afecte el conjunto cambia el valor retornado.
+    """
+    from app.models import db
+
+    if name == 'movimientos':
+        return db.session.execute(text('SELECT max(id) FROM movimientos')).scalar() or 0
+    if name == 'stock':
+        return db.session.execute(
+            text("SELECT version FROM data_versions WHERE name = 'stock_actual'")
+        ).scalar() or 0
+    raise ValueError(f'Versión de datos desconocida: {name}')
+
+
+def get_data_versions():
+    """
+    (versión de movimientos, versión de stock) en una sola sentencia.
+
+    movimientos solo recibe inserciones (carga masiva, populate_db.py), así que
+    max(id) cambia con cada escritura que afecta a los endpoints que lo leen.
+    """
+    from app.models import db
+
+    row = db.session.execute(text(
+        "SELECT (SELECT max(id) FROM movimientos), "
+        "(SELECT version FROM data_versions WHERE name = 'stock_actual')"
+    )).one()
+    return row[0] or 0, row[1] or 0
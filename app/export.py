@@ -0,0 +1,89 @@
+"""
+Exportación en streaming (CSV / NDJSON) con memoria constante
+
+Las filas llegan por lotes desde un cursor del servidor (yield_per /
+stream_results) y se escriben en bloques de ~EXPORT_CHUNK_BYTES, de modo que
+ni las filas ni la respuesta completa se acumulan en memoria.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+_DEFAULT_CHUNK_BYTES = 64 * 1024
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Tipo no serializable: {type(value).__name__}')
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _encode_rows(fmt, columns, partitions):
+    """Generar texto serializado por cada lote de filas (incluye la cabecera CSV)"""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(columns)
+        for rows in partitions:
+            writer.writerows([_csv_value(v) for v in row] for row in rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        dumps = json.JSONEncoder(default=_json_default, ensure_ascii=False).encode
+        for rows in partitions:
+            yield ''.join(dumps(dict(zip(columns, row))) + '\n' for row in rows)
+
+
+def iter_export_chunks(fmt, columns, partitions, gzip=False, chunk_bytes=_DEFAULT_CHUNK_BYTES):
+    """
+    Generar los bloques (bytes) de una exportación.
+
+    Args:
+        fmt: 'csv' | 'ndjson'
+        columns: nombres de columna, en el orden de las filas
+        partitions: iterable de lotes de filas (p. ej. Result.partitions())
+        gzip: comprimir el flujo; cada bloque termina en Z_SYNC_FLUSH para que
+            el cliente pueda descomprimir lo recibido sin esperar al final
+        chunk_bytes: tamaño aproximado de cada bloque emitido
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    pending = []
+    pending_size = 0
+
+    def emit(data):
+        if compressor is None:
+            return data
+        return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    for text in _encode_rows(fmt, columns, partitions):
+        if not text:
+            continue
+        data = text.encode('utf-8')
+        pending.append(data)
+        pending_size += len(data)
+        if pending_size >= chunk_bytes:
+            yield emit(b''.join(pending))
+            pending = []
+            pending_size = 0
+
+    tail = emit(b''.join(pending)) if pending else b''
+    if compressor is not None:
+        tail += compressor.flush()
+    if tail:
+        yield tail
@@ -0,0 +1,137 @@
+"""
+Campos parciales (fields=) y formato columnar (format=columnar) de los listados
+
+Cada recurso describe sus campos de salida como nombre -> (columnas de origen,
+función). Con fields= solo se consultan las columnas que necesitan los campos
+pedidos (más las de la clave de orden, que hacen falta para los cursores) y
+solo se devuelven esos campos.
+
+format=columnar devuelve data = {"columns": [...], "rows": [[...], ...]} en
+lugar de una lista de objetos: los nombres de los campos no se repiten en cada
+fila. Sin fields ni format la respuesta es la de siempre.
+"""
+
+from app.models import MOVIMIENTO_ROW_COLUMNS
+
+RESPONSE_FORMATS = ('objects', 'columnar')
+
+
+class FieldsetError(ValueError):
+    """fields= o format= inválido (se responde con 400)"""
+
+
+def _same(value):
+    return value
+
+
+# Campos de /api/stock: misma forma que StockActual.to_dict() (+ producto)
+STOCK_FIELDS = {
+    'id': (('nombre',), lambda nombre: hash(nombre) & 0x7fffffff),
+    'nombre': (('nombre',), _same),
+    'producto': (('nombre',), _same),
+    'unidade': (('unidade',), _same),
+    'grupo': (('grupo',), _same),
+    # El proveedor JSON serializa la fecha (ver app/responses.py)
+    'fecha_producto': (('fecha_producto',), _same),
+    'contenedor': (('contenedor',), _same),
+    'cantidad': (('cantidad',), _same),
+}
+STOCK_SOURCE_COLUMNS = ('nombre', 'unidade', 'grupo', 'fecha_producto', 'contenedor', 'cantidad')
+STOCK_KEY_COLUMNS = ('fecha_producto', 'nombre')
+
+# Campos de /api/movimientos: misma forma que movimiento_row_to_dict(); las
+# fechas salen como date/datetime y el proveedor JSON las escribe en ISO 8601
+MOVIMIENTO_FIELDS = {
+    'id': (('id',), _same),
+    'tipo': (('tipo',), lambda tipo: tipo or 'ajuste'),
+    'grupo': (('grupo',), _same),
+    'concepto': (('concepto',), lambda concepto: concepto or 'desconocido'),
+    'producto': (('nombre',), _same),
+    'fecha_producto': (('fecha_producto',), _same),
+    'cantidad': (('cantidad',), _same),
+    'descripcion': (('unidade', 'nombre'), lambda unidade, nombre: f'{unidade} de {nombre}'),
+    'fecha': (('fecha_movimiento',), _same),
+    'usuario': ((), lambda: 'Sistema'),
+    'referencia': (('id',), str),
+    'created_at': (('fecha_movimiento',), _same),
+}
+MOVIMIENTO_SOURCE_COLUMNS = tuple(column.key for column in MOVIMIENTO_ROW_COLUMNS)
+MOVIMIENTO_KEY_COLUMNS = ('fecha_movimiento', 'id')
+
+
+def parse_fieldset(fields_param, format_param, spec):
+    """
+    Validar fields= y format=.
+
+    Args:
+        fields_param: lista separada por comas ('' = todos los campos)
+        format_param: 'objects' (default) o 'columnar'
+        spec: STOCK_FIELDS o MOVIMIENTO_FIELDS
+
+    Returns:
+        (campos pedidos en orden o None si son todos, formato)
+
+    Raises:
+        FieldsetError: campo desconocido o formato inválido
+    """
+    response_format = (format_param or '').strip().lower() or 'objects'
+    if response_format not in RESPONSE_FORMATS:
+        raise FieldsetError(f'Parâmetro format inválido. Valores válidos: {", ".join(RESPONSE_FORMATS)}')
+
+    fields = []
+    for name in (fields_param or '').split(','):
+        name = name.strip()
+        if name and name not in fields:
+            fields.append(name)
+    if not fields:
+        return None, response_format
+
+    unknown = [name for name in fields if name not in spec]
+    if unknown:
+        raise FieldsetError(
+            f'Parâmetro fields inválido: {", ".join(unknown)}. Campos válidos: {", ".join(spec)}'
+        )
+    return fields, response_format
+
+
+def source_columns(fields, spec, all_columns, key_columns):
+    """Columnas a consultar (en el orden de all_columns) para los campos pedidos y la clave de orden"""
+    if fields is None:
+        return tuple(all_columns)
+    needed = set(key_columns)
+    for name in fields:
+        needed.update(spec[name][0])
+    return tuple(column for column in all_columns if column in needed)
+
+
+def make_row_serializer(fields, spec, columns):
+    """
+    Función fila -> lista de valores de los campos pedidos.
+
+    Los índices de las columnas de origen se resuelven una sola vez; por fila
+    solo se leen posiciones de la tupla y se aplican las funciones del campo.
+    """
+    index = {column: i for i, column in enumerate(columns)}
+    plan = []
+    for name in fields:
+        sources, fn = spec[name]
+        plan.append((fn, tuple(index[column] for column in sources)))
+
+    def serialize(row):
+        return [fn(*[row[i] for i in positions]) for fn, positions in plan]
+
+    return serialize
+
+
+def build_data(rows, fields, response_format, spec, columns):
+    """
+    Construir 'data' para campos parciales o formato columnar.
+
+    Returns:
+        lista de objetos o {"columns": [...], "rows": [[...], ...]}
+    """
+    fields = list(fields or spec)
+    serialize = make_row_serializer(fields, spec, columns)
+    if response_format == 'columnar':
+        return {'columns': fields, 'rows': [serialize(row) for row in rows]}
+    return [dict(zip(fields, serialize(row))) for row in rows]
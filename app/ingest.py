@@ -0,0 +1,379 @@
+"""
+Carga masiva de movimientos (CSV / NDJSON) con mantenimiento de stock_actual
+
+Cada lote se normaliza una sola vez en Python (tipo canónico, concepto en
+minúsculas, textos recortados) y se escribe en bloque (COPY en Postgres,
+executemany en SQLite):
+
+- las filas van directo a movimientos
+- el delta neto por producto del lote (entrada/ajuste suman, saida/descarte
+  restan) va a una tabla temporal y se aplica a stock_actual con un único
+  INSERT ... SELECT ... ON CONFLICT DO UPDATE
+
+Toda la carga corre en una transacción: si hay filas inválidas y no se pidió
+omitirlas, no se escribe nada. La transacción toma primero el lock del rollup
+diario (ver app/movimientos_daily.py) para que un refresco no avance la marca
+por encima de los ids de la carga antes de que confirme, y antes de confirmar
+agrega las filas nuevas a movimientos_daily.
+"""
+
+import csv
+import json
+import logging
+import time
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+from app.models import Movimiento, normalize_concepto, normalize_tipo
+from app.movimientos_daily import aggregate_pending, lock_rollup
+
+logger = logging.getLogger(__name__)
+
+INGEST_FORMATS = ('csv', 'ndjson')
+
+INGEST_COLUMNS = (
+    'nombre', 'cantidad', 'tipo', 'fecha_producto', 'unidade',
+    'grupo', 'concepto', 'fecha_movimiento', 'contenedor'
+)
+
+# Nombres alternativos aceptados en la entrada (los de la API pública)
+FIELD_ALIASES = {
+    'producto': 'nombre',
+    'fecha': 'fecha_movimiento',
+}
+
+DEFAULT_BATCH_SIZE = 50000
+MAX_REPORTED_ERRORS = 100
+
+_DELTAS_COLUMNS = ('nombre', 'unidade', 'grupo', 'fecha_producto', 'contenedor', 'delta')
+
+_DELTAS_COLUMNS_SQL = """
+    nombre VARCHAR(200) PRIMARY KEY,
+    unidade VARCHAR(100),
+    grupo VARCHAR(100) NOT NULL,
+    fecha_producto DATE,
+    contenedor VARCHAR(100),
+    delta BIGINT NOT NULL
+"""
+
+_DELTAS_DDL = {
+    'postgresql': f'CREATE TEMP TABLE IF NOT EXISTS ingest_stock_deltas ({_DELTAS_COLUMNS_SQL}) ON COMMIT DROP',
+    'sqlite': f'CREATE TEMP TABLE IF NOT EXISTS ingest_stock_deltas ({_DELTAS_COLUMNS_SQL})',
+}
+
+# WHERE 1 = 1: en SQLite evita la ambigüedad entre ON CONFLICT y un JOIN ... ON
+_UPSERT_STOCK_SQL = """
+    INSERT INTO stock_actual (nombre, unidade, grupo, fecha_producto, contenedor, cantidad)
+    SELECT nombre,
+           coalesce(unidade, ''),
+           grupo,
+           coalesce(fecha_producto, CURRENT_DATE),
+           coalesce(contenedor, ''),
+           delta
+    FROM ingest_stock_deltas
+    WHERE 1 = 1
+    ON CONFLICT (nombre) DO UPDATE
+        SET cantidad = coalesce(stock_actual.cantidad, 0) + excluded.cantidad
+        WHERE excluded.cantidad <> 0
+"""
+
+# Signo del delta de stock por tipo de movimiento
+_STOCK_SIGN = {
+    'entrada': 1,
+    'ajuste': 1,
+    'saida': -1,
+    'descarte': -1,
+}
+
+
+class IngestError(ValueError):
+    """Carga rechazada por filas inválidas (la transacción se deshace)"""
+
+    def __init__(self, message, errors):
+        super().__init__(message)
+        self.errors = errors
+
+
+def detect_format(filename=None, content_type=None):
+    """Inferir 'csv' o 'ndjson' a partir de la extensión o el Content-Type"""
+    hint = f'{filename or ""} {content_type or ""}'.lower()
+    return 'csv' if 'csv' in hint else 'ndjson'
+
+
+def iter_records(stream, fmt):
+    """Generar (número de línea, dict) desde un flujo de texto CSV o NDJSON"""
+    if fmt == 'csv':
+        reader = csv.reader(stream)
+        header = [name.strip() for name in next(reader, [])]
+        for row in reader:
+            if row:
+                yield reader.line_num, dict(zip(header, row))
+        return
+
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f'JSON inválido: {e}')
+            continue
+        yield line_number, record
+
+
+def _text(value, max_length, field):
+    value = (str(value).strip() if value is not None else '') or None
+    if value is not None and len(value) > max_length:
+        raise ValueError(f'{field} excede {max_length} caracteres')
+    return value
+
+
+def _date(value, field):
+    if value in (None, ''):
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value).strip()[:10])
+    except ValueError:
+        raise ValueError(f'{field} inválida: {value!r}')
+
+
+def _datetime(value, field):
+    if value in (None, ''):
+        return None
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ValueError(f'{field} inválida: {value!r}')
+
+
+def normalize_record(record):
+    """
+    Validar y normalizar un registro de entrada.
+
+    Returns:
+        tupla con los valores en el orden de INGEST_COLUMNS
+
+    Raises:
+        ValueError con el motivo si el registro no es válido
+    """
+    if not isinstance(record, dict):
+        raise ValueError('el registro debe ser un objeto')
+    for alias, field in FIELD_ALIASES.items():
+        if field not in record and alias in record:
+            record[field] = record[alias]
+
+    nombre = _text(record.get('nombre'), 200, 'nombre')
+    if nombre is None:
+        raise ValueError('nombre es obligatorio')
+    grupo = _text(record.get('grupo'), 100, 'grupo')
+    if grupo is None:
+        raise ValueError('grupo es obligatorio')
+
+    tipo = normalize_tipo(record.get('tipo'))
+    if tipo is None:
+        raise ValueError(f'tipo inválido: {record.get("tipo")!r}')
+
+    cantidad = record.get('cantidad')
+    try:
+        cantidad = int(cantidad)
+    except (TypeError, ValueError):
+        raise ValueError(f'cantidad inválida: {cantidad!r}')
+
+    concepto = normalize_concepto(record.get('concepto'))
+    if concepto is not None and len(concepto) > 100:
+        raise ValueError('concepto excede 100 caracteres')
+
+    return (
+        nombre,
+        cantidad,
+        tipo,
+        _date(record.get('fecha_producto'), 'fecha_producto'),
+        _text(record.get('unidade'), 100, 'unidade'),
+        grupo,
+        concepto,
+        _datetime(record.get('fecha_movimiento'), 'fecha_movimiento'),
+        _text(record.get('contenedor'), 100, 'contenedor'),
+    )
+
+
+def _copy_postgres(connection, table, columns, rows):
+    columns_sql = ', '.join(columns)
+    cursor = connection.connection.cursor()
+    try:
+        if hasattr(cursor, 'copy'):
+            # psycopg 3
+            with cursor.copy(f'COPY {table} ({columns_sql}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            # psycopg2
+            import io
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            cursor.copy_expert(f'COPY {table} ({columns_sql}) FROM STDIN WITH (FORMAT csv)', buffer)
+    finally:
+        cursor.close()
+
+
+def _sqlite_value(value):
+    # Mismo formato de texto que usa SQLAlchemy para Date/DateTime en SQLite
+    if isinstance(value, datetime):
+        return value.isoformat(' ', 'microseconds')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _executemany_sqlite(connection, table, columns, rows):
+    date_positions = [i for i, name in enumerate(columns) if name.startswith('fecha')]
+    prepared = []
+    for row in rows:
+        row = list(row)
+        for i in date_positions:
+            if row[i] is not None:
+                row[i] = _sqlite_value(row[i])
+        prepared.append(row)
+
+    placeholders = ', '.join('?' for _ in columns)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.executemany(f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders})', prepared)
+    finally:
+        cursor.close()
+
+
+_BULK_WRITERS = {
+    'postgresql': _copy_postgres,
+    'sqlite': _executemany_sqlite,
+}
+
+
+def bulk_insert(connection, table, columns, rows):
+    """Insertar filas (tuplas en el orden de columns) en bloque: COPY en Postgres, executemany en SQLite"""
+    writer = _BULK_WRITERS.get(connection.dialect.name)
+    if writer is None:
+        raise NotImplementedError(f'La carga masiva no soporta el dialecto {connection.dialect.name}')
+    writer(connection, table, columns, rows)
+
+
+def _stock_deltas(rows):
+    """Delta neto por producto del lote, con los atributos para crear productos nuevos"""
+    deltas = {}
+    for nombre, cantidad, tipo, fecha_producto, unidade, grupo, _, _, contenedor in rows:
+        current = deltas.get(nombre)
+        if current is None:
+            deltas[nombre] = [nombre, unidade, grupo, fecha_producto, contenedor, _STOCK_SIGN[tipo] * cantidad]
+            continue
+        current[5] += _STOCK_SIGN[tipo] * cantidad
+        if fecha_producto and (current[3] is None or fecha_producto > current[3]):
+            current[3] = fecha_producto
+        current[1] = current[1] or unidade
+        current[4] = current[4] or contenedor
+    return deltas.values()
+
+
+def _apply_batch(connection, rows):
+    """Escribir un lote y aplicar sus deltas a stock_actual. Retorna (movimientos insertados, filas de stock tocadas)"""
+    bulk_insert(connection, 'movimientos', INGEST_COLUMNS, rows)
+    bulk_insert(connection, 'ingest_stock_deltas', _DELTAS_COLUMNS, _stock_deltas(rows))
+    stock_rows = connection.execute(text(_UPSERT_STOCK_SQL)).rowcount
+    connection.execute(text('DELETE FROM ingest_stock_deltas'))
+    return len(rows), stock_rows
+
+
+def ingest_movimientos(engine, stream, fmt, batch_size=DEFAULT_BATCH_SIZE, skip_invalid=False, defer_indexes=False):
+    """
+    Cargar movimientos desde un flujo de texto y aplicar los deltas a stock_actual.
+
+    Args:
+        engine: Engine de SQLAlchemy (Postgres o SQLite)
+        stream: flujo de texto (archivo o cuerpo de la petición)
+        fmt: 'csv' | 'ndjson'
+        batch_size: filas normalizadas por lote (acota la memoria)
+        skip_invalid: omitir filas inválidas en lugar de rechazar la carga
+        defer_indexes: quitar los índices secundarios de movimientos durante la
+            carga y recrearlos al final (dentro de la misma transacción). Conviene
+            cuando la carga es grande respecto a la tabla: mantener ~8 índices
+            fila a fila domina el coste de la inserción
+
+    Returns:
+        dict con filas leídas, insertadas, rechazadas, productos de stock
+        tocados, errores (hasta MAX_REPORTED_ERRORS) y duración
+
+    Raises:
+        IngestError si hay filas inválidas y skip_invalid es False
+    """
+    dialect = engine.dialect.name
+    if dialect not in _DELTAS_DDL:
+        raise NotImplementedError(f'La carga masiva no soporta el dialecto {dialect}')
+    if fmt not in INGEST_FORMATS:
+        raise ValueError(f'Formato no soportado: {fmt}')
+
+    started = time.perf_counter()
+    read = inserted = rejected = stock_rows = 0
+    errors = []
+
+    with engine.begin() as connection:
+        # Hasta confirmar, refresh_movimientos_daily() espera en lugar de saltar estos ids
+        lock_rollup(connection)
+        connection.execute(text(_DELTAS_DDL[dialect]))
+        connection.execute(text('DELETE FROM ingest_stock_deltas'))
+
+        deferred = list(Movimiento.__table__.indexes) if defer_indexes else []
+        for index in deferred:
+            index.drop(connection, checkfirst=True)
+
+        batch = []
+        for line_number, record in iter_records(stream, fmt):
+            read += 1
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                row = normalize_record(record)
+            except ValueError as e:
+                rejected += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({'linea': line_number, 'error': str(e)})
+                continue
+
+            if rejected and not skip_invalid:
+                # La carga se cancelará: solo seguir validando para informar errores
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                batch_inserted, batch_stock = _apply_batch(connection, batch)
+                inserted += batch_inserted
+                stock_rows += batch_stock
+                batch = []
+
+        if rejected and not skip_invalid:
+            # Salir del with con excepción deshace la transacción completa
+            raise IngestError(f'{rejected} filas inválidas; carga cancelada', errors)
+
+        if batch:
+            batch_inserted, batch_stock = _apply_batch(connection, batch)
+            inserted += batch_inserted
+            stock_rows += batch_stock
+
+        for index in deferred:
+            index.create(connection)
+
+        # Rollup diario en la misma transacción (los endpoints solo lo leen)
+        aggregate_pending(connection)
+
+    elapsed = time.perf_counter() - started
+    logger.info(f'Carga masiva: {inserted} movimientos en {elapsed:.2f}s ({rejected} rechazados)')
+    return {
+        'filas_leidas': read,
+        'insertados': inserted,
+        'rechazados': rejected,
+        'productos_actualizados': stock_rows,
+        'errores': errors,
+        'segundos': round(elapsed, 3),
+        'filas_por_segundo': int(inserted / elapsed) if elapsed > 0 else inserted,
+    }
@@ -0,0 +1,255 @@
+"""
+Instrumentación por petición: sentencias SQL, tiempos, cabecera Server-Timing y /metrics
+
+Con METRICS_ENABLED=true, init_instrumentation() registra:
+- eventos before/after_cursor_execute del engine, que acumulan número de
+  sentencias y tiempo de base de datos de la petición en curso
+- un proveedor JSON que mide el tiempo de serialización de jsonify()
+- hooks before/after_request que emiten la cabecera Server-Timing y observan
+  los histogramas por blueprint y endpoint
+- GET /metrics en formato de exposición de Prometheus, con
+  Authorization: Bearer <METRICS_TOKEN> (para el scraper) o sesión de
+  administrador; sin METRICS_TOKEN solo con sesión de administrador
+
+Deshabilitado (default) no se registra nada: ni eventos ni hooks, así que el
+coste es nulo. Los histogramas son por proceso; con varios workers de
+gunicorn, Prometheus debe raspar cada uno o agregarlos.
+"""
+
+import hmac
+import threading
+import time
+from contextvars import ContextVar
+
+from flask import Response, current_app, request, session
+from sqlalchemy import event
+
+from app.responses import FastJSONProvider
+
+METRICS_PREFIX = 'stockv01'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Estadísticas de la petición en curso (None fuera de una petición instrumentada)
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Acumuladores de una petición (las sentencias pueden llegar desde varios hilos, ver app/parallel.py)"""
+
+    __slots__ = ('started', 'queries', 'db_seconds', 'serialize_seconds', '_lock')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add_query(self, seconds):
+        with self._lock:
+            self.queries += 1
+            self.db_seconds += seconds
+
+
+def current_request_metrics():
+    """Estadísticas de la petición en curso, o None si la instrumentación está deshabilitada"""
+    return _current.get()
+
+
+class Histogram:
+    """Histograma acumulativo con etiquetas, al estilo de Prometheus"""
+
+    def __init__(self, name, documentation, buckets, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = [(labels, list(s[0]), s[1], s[2]) for labels, s in sorted(self._series.items())]
+        for labels, counts, total, value_sum in snapshot:
+            base = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, labels))
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{base},le="{_format_number(bound)}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {total}')
+            lines.append(f'{self.name}_count{{{base}}} {total}')
+            lines.append(f'{self.name}_sum{{{base}}} {_format_number(value_sum)}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """Histogramas de peticiones y colectores adicionales (líneas de texto ya formateadas)"""
+
+    def __init__(self):
+        labels = ('blueprint', 'endpoint')
+        self.request_seconds = Histogram(
+            f'{METRICS_PREFIX}_request_duration_seconds', 'Duración total de la petición', LATENCY_BUCKETS, labels
+        )
+        self.db_seconds = Histogram(
+            f'{METRICS_PREFIX}_db_duration_seconds', 'Tiempo en sentencias SQL por petición', LATENCY_BUCKETS, labels
+        )
+        self.db_queries = Histogram(
+            f'{METRICS_PREFIX}_db_queries', 'Sentencias SQL por petición', QUERY_COUNT_BUCKETS, labels
+        )
+        self.serialize_seconds = Histogram(
+            f'{METRICS_PREFIX}_serialization_duration_seconds', 'Tiempo de serialización JSON por petición',
+            LATENCY_BUCKETS, labels
+        )
+        self.response_bytes = Histogram(
+            f'{METRICS_PREFIX}_response_size_bytes', 'Tamaño del cuerpo de la respuesta', SIZE_BUCKETS, labels
+        )
+        self.histograms = [self.request_seconds, self.db_seconds, self.db_queries,
+                           self.serialize_seconds, self.response_bytes]
+        self.collectors = []
+
+    def register_collector(self, collector):
+        """Registrar una función que devuelve líneas de exposición adicionales"""
+        self.collectors.append(collector)
+
+    def clear(self):
+        for histogram in self.histograms:
+            histogram.clear()
+
+    def expose(self):
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.expose())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+class TimedJSONProvider(FastJSONProvider):
+    """Proveedor JSON (ver app/responses.py) que suma el tiempo de serialización a la petición en curso"""
+
+    def dumps_bytes(self, obj, indent=False):
+        metrics = _current.get()
+        if metrics is None:
+            return super().dumps_bytes(obj, indent=indent)
+        started = time.perf_counter()
+        try:
+            return super().dumps_bytes(obj, indent=indent)
+        finally:
+            metrics.serialize_seconds += time.perf_counter() - started
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        # Inicio por conexión: una petición puede tener sentencias en curso en varios hilos
+        conn.info['metrics_cursor_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    metrics = _current.get()
+    started = conn.info.pop('metrics_cursor_started', None)
+    if metrics is not None and started is not None:
+        metrics.add_query(time.perf_counter() - started)
+
+
+def instrument_engine(engine):
+    """Registrar los eventos de cursor en un engine (idempotente)"""
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def server_timing_header(metrics, total_seconds):
+    """Valor de Server-Timing: db (con número de sentencias), serialize y total, en ms"""
+    return (
+        f'db;dur={metrics.db_seconds * 1000:.2f};desc="{metrics.queries} queries", '
+        f'serialize;dur={metrics.serialize_seconds * 1000:.2f}, '
+        f'total;dur={total_seconds * 1000:.2f}'
+    )
+
+
+def _metrics_access_error():
+    """Respuesta 401/403 si la petición no puede leer /metrics, None si puede"""
+    token = current_app.config.get('METRICS_TOKEN')
+    auth_header = request.headers.get('Authorization', '')
+    if token and hmac.compare_digest(auth_header, f'Bearer {token}'):
+        return None
+    user = session.get('user')
+    if user and user.get('role') == 'admin':
+        return None
+    status = 403 if user else 401
+    return Response('Acesso negado a /metrics\n', status=status, mimetype='text/plain')
+
+
+def init_instrumentation(app, engines):
+    """Registrar eventos (en todos los engines: primario y réplicas), hooks y /metrics si METRICS_ENABLED está activo"""
+    if not app.config.get('METRICS_ENABLED'):
+        return None
+
+    registry = MetricsRegistry()
+    app.extensions['metrics'] = registry
+    app.json = TimedJSONProvider(app)
+    for engine in engines:
+        instrument_engine(engine)
+    metrics_path = app.config.get('METRICS_PATH') or '/metrics'
+
+    @app.before_request
+    def _start_request_metrics():
+        _current.set(RequestMetrics())
+
+    @app.after_request
+    def _finish_request_metrics(response):
+        metrics = _current.get()
+        if metrics is None or request.endpoint in (None, 'static', 'metrics'):
+            return response
+        total = time.perf_counter() - metrics.started
+        response.headers['Server-Timing'] = server_timing_header(metrics, total)
+
+        labels = (request.blueprint or '', request.endpoint)
+        registry.request_seconds.observe(labels, total)
+        registry.db_seconds.observe(labels, metrics.db_seconds)
+        registry.db_queries.observe(labels, metrics.queries)
+        registry.serialize_seconds.observe(labels, metrics.serialize_seconds)
+        # Las respuestas en streaming no tienen tamaño conocido aquí
+        size = response.calculate_content_length()
+        if size is not None:
+            registry.response_bytes.observe(labels, size)
+        return response
+
+    @app.teardown_request
+    def _reset_request_metrics(exc):
+        _current.set(None)
+
+    def metrics_view():
+        denied = _metrics_access_error()
+        if denied is not None:
+            return denied
+        return Response(registry.expose(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule(metrics_path, 'metrics', metrics_view, methods=['GET'])
+    return registry
@@ -0,0 +1,251 @@
+"""
+Feed en vivo del dashboard (Server-Sent Events)
+
+GET /api/dashboard/stream mantiene la conexión abierta y envía un evento
+'update' (stats, alertas y movimientos recientes) al conectar y cada vez que
+cambia la versión de datos (ver app/data_version.py) o el día.
+
+Un solo hilo por proceso vigila la versión, sin importar cuántos clientes haya:
+- PostgreSQL con psycopg 3: LISTEN en DATA_VERSION_CHANNEL (los triggers de la
+  migración 4 envían NOTIFY en cada escritura); cada LIVE_LISTEN_TIMEOUT
+  segundos se lee la versión igualmente, por si se perdió una notificación
+- otros motores (SQLite): consulta de la versión cada LIVE_POLL_INTERVAL segundos
+
+Cuando la versión cambia el evento se calcula una vez, se serializa una vez y
+se reparte a la cola de cada suscriptor. Entre dos cálculos pasan al menos
+LIVE_POLL_INTERVAL segundos (una ráfaga de escrituras produce un solo evento).
+El hilo termina cuando no quedan suscriptores.
+
+Cada cliente ocupa un hilo del servidor mientras está conectado (ver
+gunicorn.conf.py); como mucho LIVE_MAX_SUBSCRIBERS por proceso, y al arrancar
+ese límite se reduce para que queden LIVE_RESERVED_THREADS de los
+WORKER_THREADS hilos para las demás peticiones.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import date
+
+from flask import current_app
+
+from app.data_version import DATA_VERSION_CHANNEL, get_data_versions
+from app.models import db
+
+logger = logging.getLogger(__name__)
+
+# Eventos pendientes por cliente; un cliente más lento recibe solo el último
+_SUBSCRIBER_QUEUE_SIZE = 8
+# Reintento del EventSource tras perder la conexión (ms)
+_RETRY_MS = 5000
+
+
+class _PostgresListener:
+    """Conexión dedicada (fuera del pool) con LISTEN en DATA_VERSION_CHANNEL"""
+
+    def __init__(self, engine):
+        self.raw = engine.raw_connection()
+        # No vuelve al pool: queda escuchando mientras viva el hilo
+        self.raw.detach()
+        self.connection = self.raw.driver_connection
+        self.connection.autocommit = True
+        self.connection.execute(f'LISTEN {DATA_VERSION_CHANNEL}')
+
+    def wait(self, timeout):
+        """Esperar una notificación (o timeout); las acumuladas se descartan al leer la versión"""
+        for _ in self.connection.notifies(timeout=timeout, stop_after=1):
+            pass
+
+    def close(self):
+        try:
+            self.raw.close()
+        except Exception:
+            pass
+
+
+def _open_listener(engine):
+    """_PostgresListener si el motor es PostgreSQL con psycopg 3; None para consultar periódicamente"""
+    if engine.dialect.name != 'postgresql' or engine.dialect.driver != 'psycopg':
+        return None
+    try:
+        return _PostgresListener(engine)
+    except Exception as e:
+        logger.warning(f'LISTEN no disponible, se consulta la versión periódicamente: {e}')
+        return None
+
+
+class LiveFeed:
+    """Vigila la versión de datos y reparte cada evento a todos los suscriptores"""
+
+    def __init__(self, app, compute_event):
+        """
+        Args:
+            app: aplicación Flask (el hilo abre su propio contexto de aplicación)
+            compute_event: función(versión anterior o None, versión) -> payload del evento
+        """
+        self.app = app
+        self.compute_event = compute_event
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._latest = None
+        self._thread = None
+        self._pid = os.getpid()
+
+    def subscribe(self):
+        """
+        Registrar un cliente.
+
+        Returns:
+            (cola, último evento o None), o None si se alcanzó LIVE_MAX_SUBSCRIBERS
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # Tras un fork: el hilo y los clientes eran del proceso padre
+                self._subscribers = set()
+                self._latest = None
+                self._thread = None
+                self._pid = os.getpid()
+            if len(self._subscribers) >= self.app.config.get('LIVE_MAX_SUBSCRIBERS', 4):
+                return None
+            subscriber = queue.Queue(maxsize=_SUBSCRIBER_QUEUE_SIZE)
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stockv01-live', daemon=True)
+                self._thread.start()
+            return subscriber, self._latest
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event_id, message):
+        """Guardar el evento como el último y ponerlo en la cola de cada suscriptor"""
+        event = (event_id, message)
+        with self._lock:
+            self._latest = event
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # Cada evento trae el estado completo: basta con el último
+                while True:
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        break
+                subscriber.put_nowait(event)
+
+    def stream(self, subscription, last_event_id=None):
+        """Generador de la respuesta text/event-stream de un suscriptor"""
+        subscriber, latest = subscription
+        heartbeat = self.app.config.get('LIVE_HEARTBEAT_SECONDS', 15)
+        sent = last_event_id
+        try:
+            yield f'retry: {_RETRY_MS}\n\n'.encode('utf-8')
+            if latest is not None and latest[0] != sent:
+                sent = latest[0]
+                yield latest[1]
+            while True:
+                try:
+                    event_id, message = subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    # Comentario SSE: mantiene viva la conexión y detecta clientes que se fueron
+                    yield b': ping\n\n'
+                    continue
+                if event_id == sent:
+                    continue
+                sent = event_id
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+    def _check(self, previous):
+        """Leer la versión y, si cambió (o cambió el día), calcular y publicar el evento"""
+        with self.app.app_context():
+            version = get_data_versions()
+            key = (version, date.today())
+            if previous is not None and key == previous:
+                return previous
+            payload = self.compute_event(previous[0] if previous else None, version)
+            event_id = f'{version[0]}.{version[1]}.{key[1].isoformat()}'
+            data = self.app.json.dumps(payload)
+        self.publish(event_id, f'id: {event_id}\nevent: update\ndata: {data}\n\n'.encode('utf-8'))
+        return key
+
+    def _run(self):
+        config = self.app.config
+        poll_interval = config.get('LIVE_POLL_INTERVAL', 2.0)
+        listen_timeout = config.get('LIVE_LISTEN_TIMEOUT', 30.0)
+        with self.app.app_context():
+            listener = _open_listener(db.engine)
+        previous = None
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        self._latest = None
+                        return
+                started = time.monotonic()
+                try:
+                    previous = self._check(previous)
+                except Exception as e:
+                    logger.warning(f'Error al actualizar el feed en vivo: {e}')
+
+                if listener is not None:
+                    try:
+                        listener.wait(listen_timeout)
+                    except Exception as e:
+                        logger.warning(f'Conexión LISTEN perdida, se consulta la versión periódicamente: {e}')
+                        listener.close()
+                        listener = None
+                # Intervalo mínimo entre dos lecturas de la versión (agrupa ráfagas de NOTIFY)
+                remaining = poll_interval - (time.monotonic() - started)
+                if remaining > 0:
+                    time.sleep(remaining)
+        finally:
+            if listener is not None:
+                listener.close()
+
+
+def check_live_capacity(config):
+    """
+    Limitar LIVE_MAX_SUBSCRIBERS a los hilos que sobran tras reservar LIVE_RESERVED_THREADS.
+
+    Sin este límite los clientes del stream pueden ocupar todos los hilos del
+    worker: las demás peticiones quedan en cola y el 503 nunca llega a enviarse.
+    """
+    threads = config.get('WORKER_THREADS', 8)
+    reserved = config.get('LIVE_RESERVED_THREADS', 4)
+    limit = max(0, threads - reserved)
+    requested = config.get('LIVE_MAX_SUBSCRIBERS', 4)
+    if requested <= limit:
+        return
+    config['LIVE_MAX_SUBSCRIBERS'] = limit
+    if limit == 0:
+        logger.warning(
+            f'WORKER_THREADS={threads} no deja hilos para el feed en vivo con '
+            f'LIVE_RESERVED_THREADS={reserved}: GET /api/dashboard/stream responde 503'
+        )
+    else:
+        logger.warning(
+            f'LIVE_MAX_SUBSCRIBERS={requested} ocuparía los hilos reservados '
+            f'(WORKER_THREADS={threads}, LIVE_RESERVED_THREADS={reserved}): se limita a {limit}'
+        )
+
+
+def init_live_feed(app, compute_event):
+    """Registrar el feed en vivo en app.extensions['live_feed']"""
+    check_live_capacity(app.config)
+    app.extensions['live_feed'] = LiveFeed(app, compute_event)
+
+
+def get_live_feed():
+    return current_app.extensions['live_feed']
@@ -0,0 +1,147 @@
+"""
+Migraciones del esquema con tabla de versión (schema_version)
+
+Cada migración es idempotente y se registra en schema_version al aplicarse.
+`flask migrate` aplica las pendientes; al arrancar, create_app() solo lee la
+versión (una consulta) en lugar de ejecutar create_all() en cada worker:
+
+- versión al día: no se hace nada más
+- atrasada y AUTO_MIGRATE activo (desarrollo y pruebas): se migra
+- atrasada sin AUTO_MIGRATE (producción): se registra el error y las
+  peticiones responden 503 hasta que se ejecute `flask migrate`
+
+En PostgreSQL la migración toma un advisory lock, de modo que dos procesos
+que migran a la vez no aplican dos veces la misma versión.
+"""
+
+import logging
+from datetime import datetime
+
+from flask import jsonify
+from sqlalchemy import inspect, text
+
+from app.data_version import install_data_version_notify
+from app.models import db, Movimiento, SchemaVersion, MOVIMIENTOS_NORM_EXPRESSIONS
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock de Postgres durante la migración
+_MIGRATION_LOCK_KEY = 7301516
+
+
+def create_tables(connection):
+    """Crear las tablas que falten (los listeners after_create instalan triggers y filas iniciales)"""
+    db.metadata.create_all(connection)
+
+
+def ensure_movimientos_norm_columns(connection):
+    """Agregar las columnas normalizadas generadas a una tabla movimientos ya existente.
+
+    En PostgreSQL la columna es STORED: el ALTER reescribe la tabla y rellena los
+    valores de todas las filas (tomar una ventana de mantenimiento en tablas
+    grandes). SQLite no permite agregar columnas STORED con ALTER TABLE, así que
+    se agregan como VIRTUAL, que también se pueden indexar.
+    """
+    existing = {column['name'] for column in inspect(connection).get_columns('movimientos')}
+    storage = 'VIRTUAL' if connection.dialect.name == 'sqlite' else 'STORED'
+    table = Movimiento.__table__
+    for name, expression in MOVIMIENTOS_NORM_EXPRESSIONS.items():
+        if name in existing:
+            continue
+        column_type = table.c[name].type.compile(dialect=connection.dialect)
+        connection.execute(text(
+            f'ALTER TABLE movimientos ADD COLUMN {name} {column_type} GENERATED ALWAYS AS ({expression}) {storage}'
+        ))
+
+
+def ensure_indexes(connection):
+    """Crear índices declarados en los modelos que falten en tablas ya existentes.
+
+    create_all() no agrega índices nuevos a tablas que ya existen, por lo que
+    las bases creadas antes de declarar un índice no lo tendrían.
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+# (versión, descripción, función(connection)); solo se agregan al final
+MIGRATIONS = [
+    (1, 'Esquema inicial', create_tables),
+    (2, 'Columnas normalizadas de movimientos', ensure_movimientos_norm_columns),
+    (3, 'Índices declarados en los modelos', ensure_indexes),
+    (4, 'Notificaciones de cambios de datos (LISTEN/NOTIFY)', install_data_version_notify),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(connection):
+    """Versión aplicada (0 si la tabla schema_version no existe)"""
+    if not inspect(connection).has_table(SchemaVersion.__tablename__):
+        return 0
+    return connection.execute(text('SELECT max(version) FROM schema_version')).scalar() or 0
+
+
+def _read_version(engine):
+    # Camino rápido del arranque: una consulta, sin inspeccionar el catálogo
+    try:
+        with engine.connect() as connection:
+            return connection.execute(text('SELECT max(version) FROM schema_version')).scalar() or 0
+    except Exception:
+        return 0
+
+
+def migrate(engine):
+    """Aplicar las migraciones pendientes. Retorna la lista de (versión, descripción) aplicadas"""
+    applied = []
+    with engine.begin() as connection:
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': _MIGRATION_LOCK_KEY})
+        SchemaVersion.__table__.create(connection, checkfirst=True)
+        version = current_version(connection)
+        for number, description, apply in MIGRATIONS:
+            if number <= version:
+                continue
+            logger.info(f'Aplicando migración {number}: {description}')
+            apply(connection)
+            connection.execute(SchemaVersion.__table__.insert().values(
+                version=number, description=description, applied_at=datetime.utcnow()
+            ))
+            applied.append((number, description))
+    return applied
+
+
+def _outdated_response(current):
+    return jsonify({
+        'success': False,
+        'error': f'Esquema do banco desatualizado (versão {current}, esperada {SCHEMA_VERSION}). Execute flask migrate'
+    }), 503
+
+
+def init_schema(app, engine):
+    """Comprobar la versión del esquema al arrancar (ver docstring del módulo)"""
+    version = _read_version(engine)
+    if version == SCHEMA_VERSION:
+        return version
+    if version > SCHEMA_VERSION:
+        logger.warning(f'El esquema ({version}) es más nuevo que la aplicación ({SCHEMA_VERSION})')
+        return version
+    if app.config.get('AUTO_MIGRATE'):
+        migrate(engine)
+        return SCHEMA_VERSION
+
+    logger.error(f'Esquema desactualizado (versión {version}, esperada {SCHEMA_VERSION}): ejecute flask migrate')
+    state = {'version': version}
+
+    @app.before_request
+    def _require_schema_version():
+        # Se vuelve a comprobar en cada petición hasta que alguien migre
+        if state['version'] >= SCHEMA_VERSION:
+            return None
+        state['version'] = _read_version(engine)
+        if state['version'] >= SCHEMA_VERSION:
+            return None
+        return _outdated_response(state['version'])
+
+    return version
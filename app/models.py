@@ -1,7 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from datetime import datetime
+from app.stock_latest import on_stock_latest_created
+from app.data_version import on_data_versions_created
+from app.movimientos_daily import on_rollup_state_created
+from app.replicas import RoutingSession
 
-db = SQLAlchemy()
+# RoutingSession envía los SELECT de peticiones de lectura a réplicas (ver app/replicas.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class Product(db.Model):
     """Modelo para productos de inventario"""
@@ -58,9 +64,85 @@ class StockActual(db.Model):
         }
 
 
+class StockLatest(db.Model):
+    """Última fila por producto de stock_actual (mantenida por triggers, ver app/stock_latest.py)"""
+    __tablename__ = 'stock_latest'
+    __table_args__ = (
+        # Paginación por keyset sobre (fecha_producto, nombre)
+        db.Index('ix_stock_latest_fecha_nombre', 'fecha_producto', 'nombre'),
+    )
+    
+    nombre = db.Column(db.String(200), primary_key=True)
+    unidade = db.Column(db.String(100), nullable=False)
+    grupo = db.Column(db.String(100), nullable=False, index=True)
+    fecha_producto = db.Column(db.Date, nullable=False)
+    contenedor = db.Column(db.String(100), nullable=False, index=True)
+    cantidad = db.Column(db.Integer, default=0)
+    
+    def __repr__(self):
+        return f'<StockLatest {self.nombre}>'
+
+
+# Los triggers se instalan sobre stock_actual: crearla antes
+StockLatest.__table__.add_is_dependent_on(StockActual.__table__)
+event.listen(StockLatest.__table__, 'after_create', on_stock_latest_created)
+
+
+class DataVersion(db.Model):
+    """Contadores de versión de datos (incrementados por triggers, ver app/data_version.py)"""
+    __tablename__ = 'data_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DataVersion {self.name}={self.version}>'
+
+
+DataVersion.__table__.add_is_dependent_on(StockActual.__table__)
+event.listen(DataVersion.__table__, 'after_create', on_data_versions_created)
+
+
+# Tipos de movimiento válidos y alias aceptados en filtros y cargas
+TIPOS_MOVIMIENTO = ('entrada', 'saida', 'descarte', 'ajuste')
+TIPO_ALIASES = {
+    'entrada': 'entrada',
+    'saida': 'saida',
+    'salida': 'saida',
+    'saída': 'saida',
+    'descarte': 'descarte',
+    'ajuste': 'ajuste'
+}
+
+
+def normalize_tipo(value):
+    """Tipo canónico ('entrada', 'saida', ...) o None si no es válido"""
+    return TIPO_ALIASES.get((value or '').strip().lower())
+
+
+def normalize_concepto(value):
+    """Concepto en minúsculas y sin espacios; None si está vacío"""
+    return (value or '').strip().lower() or None
+
+
+# Columnas normalizadas de movimientos, generadas por la base al escribir
+# (ningún escritor tiene que calcularlas: ORM, COPY o executemany)
+MOVIMIENTOS_NORM_EXPRESSIONS = {
+    'tipo_norm': "lower(trim(coalesce(tipo, '')))",
+    'concepto_norm': "lower(trim(coalesce(concepto, '')))",
+    'unidade_norm': "trim(coalesce(unidade, ''))",
+}
+
+
 class Movimiento(db.Model):
     """Modelo para movimientos de inventario"""
     __tablename__ = 'movimientos'
+    __table_args__ = (
+        # Soporta la paginación por cursor (keyset) ordenada por (fecha_movimiento, id)
+        db.Index('ix_movimientos_fecha_id', 'fecha_movimiento', 'id'),
+        # Rebanadas por rango de fechas filtradas por concepto/tipo normalizados
+        db.Index('ix_movimientos_fecha_concepto_tipo_norm', 'fecha_movimiento', 'concepto_norm', 'tipo_norm'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(200), nullable=False, index=True)
@@ -72,22 +154,95 @@ class Movimiento(db.Model):
     concepto = db.Column(db.String(100), nullable=True, index=True)
     fecha_movimiento = db.Column(db.DateTime, index=True)
     contenedor = db.Column(db.String(100), index=True)
+    # Diferidas: no se cargan con la entidad, se usan en filtros y agregados
+    tipo_norm = db.deferred(db.Column(db.Text, db.Computed(MOVIMIENTOS_NORM_EXPRESSIONS['tipo_norm'], persisted=True)))
+    concepto_norm = db.deferred(db.Column(db.String(100), db.Computed(MOVIMIENTOS_NORM_EXPRESSIONS['concepto_norm'], persisted=True)))
+    unidade_norm = db.deferred(db.Column(db.String(100), db.Computed(MOVIMIENTOS_NORM_EXPRESSIONS['unidade_norm'], persisted=True)))
     
     def __repr__(self):
         return f'<Movimiento {self.tipo} {self.nombre}>'
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'tipo': self.tipo or 'ajuste',
-            'grupo': self.grupo,
-            'concepto': self.concepto or 'desconocido',
-            'producto': self.nombre,
-            'fecha_producto': self.fecha_producto.isoformat() if self.fecha_producto else None,
-            'cantidad': self.cantidad,
-            'descripcion': f'{self.unidade} de {self.nombre}',
-            'fecha': self.fecha_movimiento.isoformat() if self.fecha_movimiento else None,
-            'usuario': 'Sistema',
-            'referencia': str(self.id),
-            'created_at': self.fecha_movimiento.isoformat() if self.fecha_movimiento else None
-        }
+        return movimiento_row_to_dict((
+            self.id, self.tipo, self.grupo, self.concepto, self.nombre,
+            self.fecha_producto, self.cantidad, self.unidade, self.fecha_movimiento
+        ))
+
+
+# Columnas de los listados de movimientos, en el orden que espera movimiento_row_to_dict().
+# db.session.query(*MOVIMIENTO_ROW_COLUMNS) devuelve tuplas sin pasar por el identity map.
+MOVIMIENTO_ROW_COLUMNS = (
+    Movimiento.id,
+    Movimiento.tipo,
+    Movimiento.grupo,
+    Movimiento.concepto,
+    Movimiento.nombre,
+    Movimiento.fecha_producto,
+    Movimiento.cantidad,
+    Movimiento.unidade,
+    Movimiento.fecha_movimiento,
+)
+
+
+def movimiento_row_to_dict(row):
+    """Serializar una fila de MOVIMIENTO_ROW_COLUMNS con la forma de Movimiento.to_dict()"""
+    id_, tipo, grupo, concepto, nombre, fecha_producto, cantidad, unidade, fecha_movimiento = row
+    fecha = fecha_movimiento.isoformat() if fecha_movimiento is not None else None
+    return {
+        'id': id_,
+        'tipo': tipo or 'ajuste',
+        'grupo': grupo,
+        'concepto': concepto or 'desconocido',
+        'producto': nombre,
+        'fecha_producto': fecha_producto.isoformat() if fecha_producto is not None else None,
+        'cantidad': cantidad,
+        'descripcion': f'{unidade} de {nombre}',
+        'fecha': fecha,
+        'usuario': 'Sistema',
+        'referencia': str(id_),
+        'created_at': fecha
+    }
+
+
+class MovimientoDiario(db.Model):
+    """Rollup diario de movimientos (mantenido incrementalmente, ver app/movimientos_daily.py)"""
+    __tablename__ = 'movimientos_daily'
+    
+    dia = db.Column(db.Date, primary_key=True)
+    nombre = db.Column(db.String(200), primary_key=True)
+    concepto = db.Column(db.String(100), primary_key=True)
+    tipo = db.Column(db.String(100), primary_key=True)
+    unidade = db.Column(db.String(100), primary_key=True)
+    cantidad_total = db.Column(db.BigInteger, nullable=False, default=0)
+    movimientos_count = db.Column(db.Integer, nullable=False, default=0)
+    fecha_producto_max = db.Column(db.Date)
+    
+    def __repr__(self):
+        return f'<MovimientoDiario {self.dia} {self.nombre} {self.tipo}>'
+
+
+class RollupState(db.Model):
+    """High-water mark (último movimientos.id agregado) de cada rollup"""
+    __tablename__ = 'rollup_state'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<RollupState {self.name}={self.last_id}>'
+
+
+event.listen(RollupState.__table__, 'after_create', on_rollup_state_created)
+
+
+class SchemaVersion(db.Model):
+    """Migraciones aplicadas (ver app/migrations.py)"""
+    __tablename__ = 'schema_version'
+    
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SchemaVersion {self.version}>'
@@ -0,0 +1,161 @@
+"""
+Rollup diario de movimientos (tabla movimientos_daily)
+
+Una fila por (dia, nombre, concepto, tipo, unidade) con la suma de cantidad,
+el número de movimientos y la fecha_producto máxima. concepto, tipo y unidade
+se toman de las columnas normalizadas de movimientos (concepto_norm, tipo_norm,
+unidade_norm), con '' en lugar de NULL para que formen parte de la clave.
+
+Se mantiene de forma incremental: rollup_state guarda el último movimientos.id
+agregado (high-water mark) y solo se suman los movimientos nuevos. Los
+movimientos sin fecha_movimiento no pertenecen a ningún día y no se agregan.
+
+Los endpoints solo leen el rollup (pueden ir a una réplica). Lo actualizan las
+escrituras: ingest_movimientos agrega sus filas con aggregate_pending() antes
+de confirmar, y `flask refresh-movimientos-daily` (cron) recoge los movimientos
+insertados por otras vías.
+
+La marca avanza hasta max(id) visible, así que una inserción que todavía no
+confirmó cuando el refresco lee max(id) quedaría por debajo de la marca para
+siempre. Para evitarlo, quien inserta en movimientos toma al comienzo de su
+transacción el lock de la fila de rollup_state (lock_rollup(), lo hace
+ingest_movimientos): el refresco toma el mismo lock antes de leer max(id) y
+espera a que la carga confirme. Dos cargas simultáneas quedan en secuencia.
+
+El rollup asume movimientos de solo inserción: ediciones o borrados de filas
+ya agregadas (o inserciones que no toman lock_rollup()) requieren
+`flask rebuild-movimientos-daily`.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import text
+
+ROLLUP_NAME = 'movimientos_daily'
+
+# Movimientos agregados por transacción en cada paso incremental
+_BATCH_SIZE = 50000
+
+_DAY_EXPRESSIONS = {
+    'postgresql': 'CAST(fecha_movimiento AS DATE)',
+    'sqlite': 'date(fecha_movimiento)',
+}
+
+_UPSERT_SQL = """
+    INSERT INTO movimientos_daily
+        (dia, nombre, concepto, tipo, unidade, cantidad_total, movimientos_count, fecha_producto_max)
+    SELECT {day} AS dia,
+           nombre,
+           concepto_norm AS concepto,
+           tipo_norm AS tipo,
+           unidade_norm AS unidade,
+           sum(cantidad),
+           count(*),
+           max(fecha_producto)
+    FROM movimientos
+    WHERE id > :desde AND id <= :hasta AND fecha_movimiento IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5
+    ON CONFLICT (dia, nombre, concepto, tipo, unidade) DO UPDATE SET
+        cantidad_total = movimientos_daily.cantidad_total + excluded.cantidad_total,
+        movimientos_count = movimientos_daily.movimientos_count + excluded.movimientos_count,
+        fecha_producto_max = CASE
+            WHEN movimientos_daily.fecha_producto_max IS NULL
+                 OR excluded.fecha_producto_max > movimientos_daily.fecha_producto_max
+            THEN excluded.fecha_producto_max
+            ELSE movimientos_daily.fecha_producto_max
+        END
+"""
+
+
+def _upsert_statement(dialect):
+    day = _DAY_EXPRESSIONS.get(dialect)
+    if day is None:
+        raise NotImplementedError(f'movimientos_daily no soporta el dialecto {dialect}')
+    return text(_UPSERT_SQL.format(day=day))
+
+
+def _pending_range(connection):
+    return connection.execute(text(
+        """
+        SELECT (SELECT last_id FROM rollup_state WHERE name = :name),
+               (SELECT coalesce(max(id), 0) FROM movimientos)
+        """
+    ), {'name': ROLLUP_NAME}).one()
+
+
+def lock_rollup(connection):
+    """
+    Tomar el lock de la fila de rollup_state hasta el final de la transacción.
+
+    Escribir en la fila bloquea la fila (Postgres) o la base (SQLite). Lo toman
+    el refresco antes de leer max(id) y las cargas de movimientos al comenzar:
+    el refresco no avanza la marca por encima de ids que aún no confirmaron.
+    """
+    connection.execute(
+        text('UPDATE rollup_state SET updated_at = :now WHERE name = :name'),
+        {'now': datetime.utcnow(), 'name': ROLLUP_NAME}
+    )
+
+
+def _aggregate_batch(connection, batch_size):
+    """Agregar el siguiente lote de movimientos nuevos. Retorna el id hasta el que se agregó, o None"""
+    # Dos workers no agregan el mismo rango (el segundo ve la marca avanzada) y
+    # una carga en curso confirma antes de que se lea max(id)
+    lock_rollup(connection)
+    last_id, max_id = _pending_range(connection)
+    if max_id <= last_id:
+        return None
+
+    hasta = max_id if batch_size is None else min(max_id, last_id + batch_size)
+    connection.execute(_upsert_statement(connection.dialect.name), {'desde': last_id, 'hasta': hasta})
+    connection.execute(
+        text('UPDATE rollup_state SET last_id = :hasta WHERE name = :name'),
+        {'hasta': hasta, 'name': ROLLUP_NAME}
+    )
+    return hasta
+
+
+def aggregate_pending(connection):
+    """
+    Agregar todos los movimientos pendientes dentro de la transacción actual.
+
+    Para quien ya tiene lock_rollup() (ingest_movimientos): el rollup se
+    confirma junto con los movimientos. Retorna el id hasta el que se agregó, o None.
+    """
+    return _aggregate_batch(connection, batch_size=None)
+
+
+def refresh_movimientos_daily(engine, batch_size=_BATCH_SIZE):
+    """
+    Agregar al rollup los movimientos con id mayor que la marca de rollup_state.
+
+    Sin movimientos nuevos cuesta una sola lectura (marca y max(id)).
+    Cada lote se confirma en su propia transacción.
+    """
+    with engine.connect() as connection:
+        last_id, max_id = _pending_range(connection)
+    if max_id <= last_id:
+        return last_id
+
+    while True:
+        with engine.begin() as connection:
+            hasta = _aggregate_batch(connection, batch_size)
+        if hasta is None or hasta >= max_id:
+            break
+    return max_id
+
+
+def rebuild_movimientos_daily(connection):
+    """Reconstruir movimientos_daily completo desde movimientos. Retorna filas del rollup"""
+    connection.execute(text('DELETE FROM movimientos_daily'))
+    connection.execute(text('UPDATE rollup_state SET last_id = 0 WHERE name = :name'), {'name': ROLLUP_NAME})
+    _aggregate_batch(connection, batch_size=None)
+    return connection.execute(text('SELECT count(*) FROM movimientos_daily')).scalar()
+
+
+def on_rollup_state_created(target, connection, **kw):
+    """Listener after_create: registrar la marca del rollup"""
+    connection.execute(
+        text('INSERT INTO rollup_state (name, last_id, updated_at) VALUES (:name, 0, :now)'),
+        {'name': ROLLUP_NAME, 'now': datetime.utcnow()}
+    )
@@ -0,0 +1,121 @@
+"""
+Ejecución en paralelo de consultas (y subpeticiones) independientes de un mismo endpoint
+
+run_queries() recibe un dict nombre -> sentencia SELECT y ejecuta cada una en
+su propia conexión del pool, en un ThreadPoolExecutor compartido por el
+proceso (PARALLEL_QUERY_THREADS hilos). Cada petición tiene como mucho
+PARALLEL_QUERIES_PER_REQUEST sentencias en vuelo a la vez, de modo que el
+tiempo del endpoint se acerca al de su consulta más lenta y no a la suma, sin
+que una sola petición acapare el pool.
+
+Los hilos ejecutan con una copia de los contextvars de la petición (contexto
+de aplicación y de petición de Flask, métricas de app/instrumentation.py), así
+que la réplica elegida, las métricas y el registro de sentencias lentas siguen
+funcionando. No usan la sesión de la petición (no es thread-safe): solo
+sentencias de lectura que no dependen de escrituras sin confirmar.
+
+Se ejecuta en secuencia, con la sesión, cuando el límite es 1, hay una sola
+sentencia o el engine comparte una única conexión (SQLite en memoria).
+run_parallel() es la versión genérica para funciones (la usa /api/batch).
+"""
+
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, has_app_context
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+# True dentro de una tarea del executor
+_in_worker = contextvars.ContextVar('parallel_in_worker', default=False)
+
+
+def _get_executor(max_workers):
+    """Executor del proceso; se recrea tras un fork (los hilos no sobreviven al fork)"""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stockv01-query')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def supports_parallel(engine):
+    """False si todas las conexiones del engine son la misma (SQLite en memoria)"""
+    return not isinstance(engine.pool, (StaticPool, SingletonThreadPool))
+
+
+def _run_statement(engine, statement):
+    with engine.connect() as connection:
+        return connection.execute(statement).all()
+
+
+def _in_worker_thread(fn, args):
+    _in_worker.set(True)
+    return fn(*args)
+
+
+def run_parallel(tasks, limit=None):
+    """
+    Ejecutar tareas independientes en el executor del proceso.
+
+    Args:
+        tasks: dict nombre -> (función, argumentos)
+        limit: tareas simultáneas (default: PARALLEL_QUERIES_PER_REQUEST)
+
+    Returns:
+        dict nombre -> resultado (la primera excepción se propaga)
+
+    Cada tarea corre en su propia copia de los contextvars. Dentro de una tarea
+    (p. ej. una subpetición de /api/batch que a su vez llama a run_queries) se
+    ejecuta en secuencia: esperar en el mismo executor podría agotarlo.
+    """
+    config = current_app.config if has_app_context() else {}
+    if limit is None:
+        limit = config.get('PARALLEL_QUERIES_PER_REQUEST', 4)
+    if limit <= 1 or len(tasks) <= 1 or _in_worker.get():
+        return {
+            name: contextvars.copy_context().run(fn, *args)
+            for name, (fn, args) in tasks.items()
+        }
+
+    executor = _get_executor(config.get('PARALLEL_QUERY_THREADS', 8))
+    slots = threading.BoundedSemaphore(limit)
+    futures = {}
+    for name, (fn, args) in tasks.items():
+        slots.acquire()
+        # Una copia por tarea: un Context no puede ejecutarse en dos hilos a la vez
+        context = contextvars.copy_context()
+        future = executor.submit(context.run, _in_worker_thread, fn, args)
+        future.add_done_callback(lambda _: slots.release())
+        futures[name] = future
+    return {name: future.result() for name, future in futures.items()}
+
+
+def run_queries(session, statements, limit=None):
+    """
+    Ejecutar sentencias SELECT independientes, en paralelo cuando es posible.
+
+    Args:
+        session: sesión de la petición; decide el engine de cada sentencia
+            (primario o réplica de lectura) y se usa en el modo secuencial
+        statements: dict nombre -> sentencia
+        limit: sentencias simultáneas (default: PARALLEL_QUERIES_PER_REQUEST)
+
+    Returns:
+        dict nombre -> lista de filas
+    """
+    if limit is None:
+        limit = current_app.config.get('PARALLEL_QUERIES_PER_REQUEST', 4) if has_app_context() else 4
+    engines = {name: session.get_bind(clause=statement) for name, statement in statements.items()}
+    sequential = limit <= 1 or len(statements) <= 1 or _in_worker.get()
+    if sequential or not all(supports_parallel(e) for e in engines.values()):
+        return {name: session.execute(statement).all() for name, statement in statements.items()}
+    return run_parallel(
+        {name: (_run_statement, (engines[name], statement)) for name, statement in statements.items()},
+        limit=limit
+    )
@@ -0,0 +1,236 @@
+"""
+Pool de conexiones configurable por variables de entorno y sus métricas
+
+build_engine_options() traduce la configuración DB_* a SQLALCHEMY_ENGINE_OPTIONS:
+- DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT: tamaño del pool por worker
+  (conexiones totales = workers × (size + overflow)); no aplica a SQLite
+- DB_POOL_RECYCLE: segundos tras los que una conexión se reemplaza
+- DB_POOL_PRE_PING: comprobar la conexión al sacarla del pool
+- DB_STATEMENT_TIMEOUT_MS: statement_timeout de PostgreSQL
+- DB_PGBOUNCER: modo compatible con PgBouncer en transaction pooling: sin
+  prepared statements del servidor (psycopg 3) y el statement_timeout se fija
+  con SET LOCAL en cada transacción, porque PgBouncer no acepta el parámetro
+  `options` de arranque ni conserva los SET de sesión
+
+Al arrancar, check_pool_capacity() comprueba que size + overflow alcance para
+los hilos de petición del worker (WORKER_THREADS) más los del executor de
+consultas en paralelo (PARALLEL_QUERY_THREADS); si no, reduce el paralelismo
+en lugar de dejar que los checkouts esperen hasta DB_POOL_TIMEOUT.
+
+Con METRICS_ENABLED, el pool registra el tiempo de espera de cada checkout y
+/metrics expone conexiones activas (checked out), ociosas, overflow y
+timeouts por engine.
+"""
+
+import logging
+import os
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from app.instrumentation import LATENCY_BUCKETS, METRICS_PREFIX, Histogram
+
+logger = logging.getLogger(__name__)
+
+CHECKOUT_WAIT = Histogram(
+    f'{METRICS_PREFIX}_db_pool_checkout_wait_seconds',
+    'Tiempo para obtener una conexión del pool (incluye abrirla si hace falta)',
+    LATENCY_BUCKETS,
+    ('engine',)
+)
+_timeouts = {}
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool que mide la espera de cada checkout y cuenta los timeouts"""
+
+    metrics_label = 'default'
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            _timeouts[self.metrics_label] = _timeouts.get(self.metrics_label, 0) + 1
+            raise
+        finally:
+            CHECKOUT_WAIT.observe((self.metrics_label,), time.perf_counter() - started)
+
+    def recreate(self):
+        # engine.dispose() crea un pool nuevo: conservar la etiqueta
+        pool = super().recreate()
+        pool.metrics_label = self.metrics_label
+        return pool
+
+
+def build_engine_options(config, uri=None):
+    """SQLALCHEMY_ENGINE_OPTIONS a partir de la configuración DB_* (respeta opciones ya definidas)"""
+    uri = uri or config.get('SQLALCHEMY_DATABASE_URI')
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if not uri:
+        return options
+    url = make_url(uri)
+    backend = url.get_backend_name()
+
+    options.setdefault('pool_pre_ping', config.get('DB_POOL_PRE_PING', True))
+    if config.get('DB_POOL_RECYCLE'):
+        options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+
+    if backend == 'sqlite':
+        # SQLite usa su propio pool (un archivo local, o una conexión en memoria)
+        return options
+
+    options.setdefault('pool_size', config.get('DB_POOL_SIZE', 5))
+    options.setdefault('max_overflow', config.get('DB_MAX_OVERFLOW', 11))
+    options.setdefault('pool_timeout', config.get('DB_POOL_TIMEOUT', 30))
+    if config.get('METRICS_ENABLED'):
+        options.setdefault('poolclass', InstrumentedQueuePool)
+
+    if backend == 'postgresql':
+        connect_args = dict(options.get('connect_args') or {})
+        timeout_ms = config.get('DB_STATEMENT_TIMEOUT_MS') or 0
+        if config.get('DB_PGBOUNCER'):
+            if url.get_driver_name() == 'psycopg':
+                # Sin prepared statements del servidor: en transaction pooling la
+                # siguiente transacción puede ir a otra conexión del servidor
+                connect_args.setdefault('prepare_threshold', None)
+        elif timeout_ms:
+            existing = connect_args.get('options', '')
+            connect_args['options'] = f'{existing} -c statement_timeout={int(timeout_ms)}'.strip()
+        if connect_args:
+            options['connect_args'] = connect_args
+    return options
+
+
+def install_statement_timeout(engine, config):
+    """En modo PgBouncer, fijar statement_timeout con SET LOCAL al comenzar cada transacción"""
+    timeout_ms = config.get('DB_STATEMENT_TIMEOUT_MS') or 0
+    if not (config.get('DB_PGBOUNCER') and timeout_ms and engine.dialect.name == 'postgresql'):
+        return
+
+    @event.listens_for(engine, 'begin')
+    def _set_local_statement_timeout(connection):
+        connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout_ms)}')
+
+
+def label_engine_pool(engine, label):
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        engine.pool.metrics_label = label
+
+
+def pool_status(engine):
+    """Estado del pool: activas (checked out), ociosas, overflow y tamaño configurado"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return None
+    return {
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+        'max_overflow': pool._max_overflow,
+    }
+
+
+def pool_metrics_collector(engines):
+    """Colector para MetricsRegistry: gauges del pool por engine y espera de checkout"""
+    def collect():
+        # En cada llamada: con preload el colector se crea en el maestro, antes del fork
+        pid = os.getpid()
+        lines = []
+        gauges = (
+            ('checked_out', 'Conexiones en uso'),
+            ('checked_in', 'Conexiones ociosas en el pool'),
+            ('overflow', 'Conexiones abiertas por encima de pool_size'),
+            ('size', 'pool_size configurado'),
+            ('max_overflow', 'max_overflow configurado'),
+        )
+        statuses = [(label, pool_status(engine)) for label, engine in engines().items()]
+        statuses = [(label, status) for label, status in statuses if status is not None]
+        for key, documentation in gauges:
+            name = f'{METRICS_PREFIX}_db_pool_{key}'
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} gauge')
+            for label, status in statuses:
+                lines.append(f'{name}{{engine="{label}",pid="{pid}"}} {status[key]}')
+        name = f'{METRICS_PREFIX}_db_pool_timeouts_total'
+        lines.append(f'# HELP {name} Checkouts que agotaron DB_POOL_TIMEOUT')
+        lines.append(f'# TYPE {name} counter')
+        for label, _ in statuses:
+            lines.append(f'{name}{{engine="{label}",pid="{pid}"}} {_timeouts.get(label, 0)}')
+        lines.extend(CHECKOUT_WAIT.expose())
+        return lines
+
+    return collect
+
+
+def check_pool_capacity(config, engines):
+    """
+    Ajustar PARALLEL_QUERY_THREADS / PARALLEL_QUERIES_PER_REQUEST al pool más chico.
+
+    Cada hilo de petición (WORKER_THREADS) y cada hilo del executor de
+    app/parallel.py pueden tener una conexión a la vez. Si el pool no los cubre,
+    el executor se limita a lo que sobra tras los hilos de petición (en
+    secuencia si sobran menos de 2) y se registra un aviso.
+
+    Returns:
+        capacidad (size + overflow) del pool más chico, o None si no hay QueuePool fuera de SQLite
+    """
+    # SQLite usa el pool por defecto de SQLAlchemy (DB_* no aplica) y escribe de a uno
+    capacities = [
+        status['size'] + status['max_overflow']
+        for status in (pool_status(engine) for engine in engines if engine.dialect.name != 'sqlite')
+        if status is not None
+    ]
+    if not capacities:
+        return None
+    capacity = min(capacities)
+    threads = config.get('WORKER_THREADS', 1)
+    parallel_threads = config.get('PARALLEL_QUERY_THREADS', 8)
+    per_request = config.get('PARALLEL_QUERIES_PER_REQUEST', 4)
+
+    if threads > capacity:
+        logger.warning(
+            f'El pool ({capacity} conexiones) no cubre los {threads} hilos de petición del worker: '
+            f'aumente DB_POOL_SIZE/DB_MAX_OVERFLOW o reduzca GUNICORN_THREADS'
+        )
+    if per_request <= 1 or threads + parallel_threads <= capacity:
+        return capacity
+
+    spare = capacity - threads
+    if spare < 2:
+        config['PARALLEL_QUERIES_PER_REQUEST'] = 1
+        logger.warning(
+            f'El pool ({capacity} conexiones) no deja conexiones para consultas en paralelo '
+            f'con {threads} hilos de petición: se ejecutan en secuencia'
+        )
+    else:
+        config['PARALLEL_QUERY_THREADS'] = spare
+        config['PARALLEL_QUERIES_PER_REQUEST'] = min(per_request, spare)
+        logger.warning(
+            f'El pool ({capacity} conexiones) no cubre {threads} hilos de petición + {parallel_threads} '
+            f'del executor: PARALLEL_QUERY_THREADS se reduce a {spare}'
+        )
+    return capacity
+
+
+def init_pool(app, db):
+    """Timeouts por transacción, etiquetas y colector de métricas de los engines de la aplicación"""
+    def engines():
+        return {key or 'default': engine for key, engine in db.engines.items()}
+
+    with app.app_context():
+        for label, engine in engines().items():
+            install_statement_timeout(engine, app.config)
+            label_engine_pool(engine, label)
+        check_pool_capacity(app.config, engines().values())
+
+    registry = app.extensions.get('metrics')
+    if registry is not None:
+        def app_engines():
+            with app.app_context():
+                return engines()
+        registry.register_collector(pool_metrics_collector(app_engines))
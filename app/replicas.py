@@ -0,0 +1,187 @@
+"""
+Enrutamiento de lecturas a réplicas (DATABASE_READ_URL)
+
+DATABASE_READ_URL acepta una o varias URLs separadas por comas; cada una se
+registra como bind `replica_<n>` de Flask-SQLAlchemy. Las peticiones GET/HEAD
+de los blueprints de solo lectura (api, dashboard) eligen una réplica por
+round-robin y la sesión (RoutingSession) envía ahí sus SELECT; escrituras,
+flush y cualquier otra sentencia siguen yendo al primario.
+
+Se vuelve al primario cuando:
+- ninguna réplica está sana: cada REPLICA_HEALTH_INTERVAL segundos se
+  comprueba cada réplica (y su retraso en Postgres); si la consulta falla o el
+  retraso supera REPLICA_MAX_LAG_SECONDS queda fuera hasta la siguiente
+  comprobación
+- la petición lo pide para leer lo recién escrito: cabecera
+  `X-Read-Primary: true` o parámetro `primary=true`
+
+La respuesta indica el origen en la cabecera X-DB-Source. Para probarlo en
+local basta con dos archivos SQLite (p. ej. una copia de la base como réplica).
+"""
+
+import itertools
+import logging
+import threading
+import time
+
+from flask import g, has_app_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, text
+from sqlalchemy.sql.elements import TextClause
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND_PREFIX = 'replica_'
+READ_BLUEPRINTS = ('api', 'dashboard')
+PRIMARY_SOURCE = 'primary'
+
+# Retraso de la réplica en segundos (0 si está al día o es el primario)
+_LAG_QUERIES = {
+    'postgresql': """
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END
+    """,
+    'sqlite': 'SELECT 0',
+}
+
+
+def parse_read_urls(value):
+    """Lista de URLs de DATABASE_READ_URL (separadas por comas)"""
+    return [url.strip() for url in (value or '').split(',') if url.strip()]
+
+
+def replica_binds(config):
+    """SQLALCHEMY_BINDS con una entrada replica_<n> por URL de lectura (mismas opciones DB_* que el primario)"""
+    from app.pool import build_engine_options
+
+    binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+    for i, url in enumerate(parse_read_urls(config.get('DATABASE_READ_URL'))):
+        binds[f'{REPLICA_BIND_PREFIX}{i}'] = {'url': url, **build_engine_options(config, uri=url)}
+    return binds
+
+
+def _is_read_statement(clause):
+    if isinstance(clause, Select):
+        return True
+    if isinstance(clause, TextClause):
+        words = clause.text.split(None, 1)
+        return bool(words) and words[0].upper() in ('SELECT', 'WITH')
+    return False
+
+
+class RoutingSession(Session):
+    """Sesión que envía los SELECT a la réplica elegida para la petición en curso"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context():
+            engine = g.get('read_engine')
+            if engine is not None and _is_read_statement(clause):
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaState:
+    __slots__ = ('name', 'engine', 'healthy', 'lag', 'checked_at', 'error')
+
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+        self.lag = 0.0
+        self.checked_at = 0.0
+        self.error = None
+
+
+class ReadReplicaRouter:
+    """Round-robin entre réplicas sanas, con comprobación periódica de salud y retraso"""
+
+    def __init__(self, engines, max_lag_seconds=30, health_interval=5):
+        self.replicas = [ReplicaState(name, engine) for name, engine in engines]
+        self.max_lag_seconds = max_lag_seconds
+        self.health_interval = health_interval
+        self._cycle = itertools.cycle(range(len(self.replicas)))
+        self._lock = threading.Lock()
+
+    def check(self, replica):
+        """Comprobar salud y retraso de una réplica"""
+        query = _LAG_QUERIES.get(replica.engine.dialect.name, 'SELECT 0')
+        try:
+            with replica.engine.connect() as connection:
+                replica.lag = float(connection.execute(text(query)).scalar() or 0)
+            replica.healthy = replica.lag <= self.max_lag_seconds
+            replica.error = None if replica.healthy else f'retraso de {replica.lag:.1f}s'
+        except Exception as e:
+            replica.healthy = False
+            replica.error = str(e)
+        replica.checked_at = time.monotonic()
+        if not replica.healthy:
+            logger.warning(f'Réplica {replica.name} fuera de rotación: {replica.error}')
+        return replica.healthy
+
+    def choose(self):
+        """(nombre, engine) de la siguiente réplica sana, o None para usar el primario"""
+        now = time.monotonic()
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                replica = self.replicas[next(self._cycle)]
+                due = now - replica.checked_at >= self.health_interval
+                if due:
+                    # Marcar antes de comprobar: otras peticiones no repiten la comprobación
+                    replica.checked_at = now
+            if due:
+                self.check(replica)
+            if replica.healthy:
+                return replica.name, replica.engine
+        return None
+
+    def status(self):
+        return [
+            {'name': r.name, 'healthy': r.healthy, 'lag_seconds': r.lag, 'error': r.error}
+            for r in self.replicas
+        ]
+
+
+def wants_primary():
+    """Override por petición para leer lo recién escrito (read-after-write)"""
+    values = (request.headers.get('X-Read-Primary', ''), request.args.get('primary', ''))
+    return any(v.strip().lower() in ('1', 'true', 'yes') for v in values)
+
+
+def init_replicas(app, db):
+    """Registrar el router y los hooks de petición si hay réplicas configuradas"""
+    with app.app_context():
+        engines = sorted(
+            (key, engine) for key, engine in db.engines.items()
+            if key and key.startswith(REPLICA_BIND_PREFIX)
+        )
+    if not engines:
+        return None
+
+    router = ReadReplicaRouter(
+        engines,
+        max_lag_seconds=app.config.get('REPLICA_MAX_LAG_SECONDS', 30),
+        health_interval=app.config.get('REPLICA_HEALTH_INTERVAL', 5)
+    )
+    app.extensions['read_replicas'] = router
+
+    @app.before_request
+    def _route_reads_to_replica():
+        if request.blueprint not in READ_BLUEPRINTS or request.method not in ('GET', 'HEAD'):
+            return
+        chosen = None if wants_primary() else router.choose()
+        if chosen is not None:
+            g.read_source, g.read_engine = chosen
+        else:
+            g.read_source = PRIMARY_SOURCE
+
+    @app.after_request
+    def _add_read_source_header(response):
+        source = g.get('read_source')
+        if source:
+            response.headers['X-DB-Source'] = source
+        return response
+
+    return router
@@ -0,0 +1,148 @@
+"""
+Capa de respuestas: codificador JSON rápido y compresión negociada
+
+init_responses() se aplica a toda la aplicación (todos los blueprints usan
+jsonify, que pasa por app.json):
+
+- FastJSONProvider: orjson si está instalado (fechas, datetimes y UUID
+  nativos, directamente a bytes) y, si no, el json de la biblioteca estándar
+  con fechas en ISO 8601 (no el formato HTTP de Flask). Las vistas pueden
+  devolver date/datetime sin llamar a isoformat().
+- Compresión: br (si el módulo brotli está instalado) o gzip según
+  Accept-Encoding, para respuestas JSON/texto de al menos
+  RESPONSE_COMPRESS_MIN_BYTES. No toca las respuestas en streaming ni las que
+  ya traen Content-Encoding (p. ej. /api/movimientos/export).
+"""
+
+import gzip
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/html', 'text/plain', 'text/csv')
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+def _default(value):
+    """Tipos que ni orjson ni json serializan por sí mismos"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # Igual que Flask: sin pérdida de precisión
+        return str(value)
+    if isinstance(value, UUID):
+        return str(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f'Objeto de tipo {type(value).__name__} no serializable a JSON')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Proveedor JSON de Flask con orjson (o json de la biblioteca estándar) y fechas ISO 8601"""
+
+    # El orden de las claves es el de la vista; ordenarlas solo cuesta tiempo
+    sort_keys = False
+    # UTF-8 sin escapar, como orjson, también con la biblioteca estándar
+    ensure_ascii = False
+
+    def dumps_bytes(self, obj, indent=False):
+        if orjson is not None:
+            option = _ORJSON_OPTIONS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            return orjson.dumps(obj, default=_default, option=option)
+        return json.dumps(
+            obj,
+            default=_default,
+            ensure_ascii=self.ensure_ascii,
+            sort_keys=self.sort_keys,
+            indent=2 if indent else None,
+            separators=None if indent else (',', ':')
+        ).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            kwargs.setdefault('default', _default)
+            return json.dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.dumps_bytes(obj, indent=indent), mimetype=self.mimetype)
+
+
+def negotiate_encoding(accept_encodings):
+    """'br', 'gzip' o None según Accept-Encoding y los módulos disponibles"""
+    offered = ('br', 'gzip') if brotli is not None else ('gzip',)
+    return accept_encodings.best_match(offered)
+
+
+def compress_response(response, min_bytes, gzip_level=6, brotli_quality=4):
+    """Comprimir el cuerpo de la respuesta si el cliente lo acepta y vale la pena"""
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    # La representación depende de Accept-Encoding aunque esta vez no se comprima
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < min_bytes:
+        return response
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=brotli_quality)
+    else:
+        compressed = gzip.compress(body, compresslevel=gzip_level, mtime=0)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_responses(app):
+    """Registrar el proveedor JSON rápido y la compresión de respuestas"""
+    app.json = FastJSONProvider(app)
+    if not app.config.get('RESPONSE_COMPRESSION', True):
+        return
+
+    # Los after_request se ejecutan en orden inverso: registrado primero, comprime al final
+    @app.after_request
+    def _compress(response):
+        config = current_app.config
+        return compress_response(
+            response,
+            min_bytes=config.get('RESPONSE_COMPRESS_MIN_BYTES', 1024),
+            gzip_level=config.get('RESPONSE_GZIP_LEVEL', 6),
+            brotli_quality=config.get('RESPONSE_BROTLI_QUALITY', 4)
+        )
@@ -0,0 +1,305 @@
+"""
+Registro de sentencias lentas con captura automática del plan
+
+Con SLOW_QUERY_MS > 0, init_slow_query_log() mide cada sentencia con los
+eventos before/after_cursor_execute del engine. Las que superan el umbral se
+registran (SQL normalizado, parámetros, duración y endpoint que la originó)
+como una línea JSON en un archivo rotativo por proceso: SLOW_QUERY_LOG_PATH
+con el pid antes de la extensión (stockv01_slow_queries.<pid>.log). La rotación
+de RotatingFileHandler no es segura entre procesos; con un archivo por worker
+cada uno rota el suyo, y read() mezcla los de todos los workers del host.
+
+El plan se captura fuera de la petición, en un hilo propio con otra conexión
+del pool, solo para consultas SELECT/WITH (plan_mode()):
+- PostgreSQL: EXPLAIN (ANALYZE, BUFFERS) dentro de una transacción que se
+  revierte y con statement_timeout. ANALYZE ejecuta la sentencia otra vez: los
+  SELECT que bloquean filas (FOR UPDATE/SHARE) o llaman funciones con efectos
+  (nextval, pg_advisory_*...) usan EXPLAIN sin ANALYZE
+- SQLite: EXPLAIN QUERY PLAN
+DML, DDL, PRAGMA, SET y los propios EXPLAIN se registran sin plan: suelen
+correr en transacciones (migraciones, cargas) cuyas tablas la conexión del
+EXPLAIN todavía no ve.
+
+Cada SQL normalizado se explica como mucho una vez por
+SLOW_QUERY_EXPLAIN_INTERVAL segundos; si la cola está llena la entrada se
+registra sin plan.
+"""
+
+import glob
+import json
+import logging
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_QUEUE_SIZE = 100
+_MAX_PARAM_LENGTH = 200
+_SKIP_KEY = 'slow_query_skip'
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_VALUE_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+_WRITE_KEYWORDS = re.compile(r'\b(INSERT|UPDATE|DELETE|MERGE|CREATE|DROP|ALTER|TRUNCATE)\b', re.IGNORECASE)
+_ROW_LOCK = re.compile(r'\bFOR\s+(UPDATE|NO\s+KEY\s+UPDATE|SHARE|KEY\s+SHARE)\b', re.IGNORECASE)
+_SIDE_EFFECT_FUNCTIONS = re.compile(
+    r'\b(nextval|setval|pg_advisory\w*|pg_try_advisory\w*|pg_notify|set_config|pg_sleep\w*'
+    r'|pg_cancel_backend|pg_terminate_backend|lo_\w+|dblink\w*)\s*\(',
+    re.IGNORECASE
+)
+
+
+def normalize_sql(statement):
+    """SQL en una línea con literales reemplazados por ? y listas de valores colapsadas"""
+    normalized = _STRING_LITERAL.sub('?', statement)
+    normalized = _NUMBER_LITERAL.sub('?', normalized)
+    normalized = _WHITESPACE.sub(' ', normalized).strip()
+    return _VALUE_LIST.sub('(?, ...)', normalized)
+
+
+def _format_parameters(parameters):
+    def short(value):
+        text_value = repr(value)
+        return text_value if len(text_value) <= _MAX_PARAM_LENGTH else text_value[:_MAX_PARAM_LENGTH] + '...'
+
+    if isinstance(parameters, dict):
+        return {str(k): short(v) for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [short(v) for v in parameters]
+    return short(parameters)
+
+
+def plan_mode(statement):
+    """
+    Cómo capturar el plan de una sentencia.
+
+    Returns:
+        'analyze' (SELECT/WITH sin efectos: se puede ejecutar otra vez),
+        'explain' (SELECT con bloqueos o funciones con efectos: solo el plan
+        estimado) o None (DML, DDL, PRAGMA, EXPLAIN, SET...: sin plan)
+    """
+    head = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+    if head not in ('SELECT', 'WITH') or _WRITE_KEYWORDS.search(statement):
+        return None
+    if _ROW_LOCK.search(statement) or _SIDE_EFFECT_FUNCTIONS.search(statement):
+        return 'explain'
+    return 'analyze'
+
+
+def explain_statement(connection, statement, parameters, timeout_ms):
+    """Plan de la sentencia como lista de líneas de texto, o None si no corresponde (ver plan_mode())"""
+    mode = plan_mode(statement)
+    if mode is None:
+        return None
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        options = '(ANALYZE, BUFFERS)' if mode == 'analyze' else ''
+        with connection.begin() as transaction:
+            connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout_ms)}')
+            rows = connection.exec_driver_sql(f'EXPLAIN {options} {statement}', parameters).fetchall()
+            # ANALYZE ejecuta la sentencia: no dejar rastro
+            transaction.rollback()
+        return [row[0] for row in rows]
+    if dialect == 'sqlite':
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+        depth = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append('  ' * depth[node_id] + detail)
+        return lines
+    return None
+
+
+class SlowQueryLog:
+    """Umbral, archivo rotativo y cola de planes pendientes de una aplicación"""
+
+    def __init__(self, threshold_ms, path, max_bytes, backups,
+                 explain=True, explain_interval=60, explain_timeout_ms=5000):
+        self.threshold = threshold_ms / 1000
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.explain = explain
+        self.explain_interval = explain_interval
+        self.explain_timeout_ms = explain_timeout_ms
+        self._explained_at = {}
+        self._queue = queue.Queue(maxsize=_QUEUE_SIZE)
+        self._worker = None
+        self._lock = threading.Lock()
+
+        self._file_logger = logging.getLogger(f'{__name__}.file.{id(self)}')
+        self._file_logger.propagate = False
+        self._file_logger.setLevel(logging.INFO)
+        self._handler = None
+        self._handler_pid = None
+
+    def process_path(self, pid=None):
+        """Archivo del proceso: SLOW_QUERY_LOG_PATH con el pid antes de la extensión"""
+        root, ext = os.path.splitext(self.path)
+        return f'{root}.{pid or os.getpid()}{ext}'
+
+    def _process_handler(self):
+        # Con preload la instancia se crea en el maestro: cada worker abre su propio archivo tras el fork
+        with self._lock:
+            if self._handler_pid != os.getpid():
+                if self._handler is not None:
+                    self._file_logger.removeHandler(self._handler)
+                self._handler = RotatingFileHandler(
+                    self.process_path(), maxBytes=self.max_bytes, backupCount=self.backups,
+                    encoding='utf-8', delay=True
+                )
+                self._handler.setFormatter(logging.Formatter('%(message)s'))
+                self._file_logger.addHandler(self._handler)
+                self._handler_pid = os.getpid()
+            return self._handler
+
+    def install(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['slow_query_started'].pop()
+        elapsed = time.perf_counter() - started
+        if elapsed < self.threshold or conn.info.get(_SKIP_KEY):
+            return
+        self.record(conn.engine, statement, parameters, elapsed, executemany)
+
+    def _handle_error(self, context):
+        # La sentencia falló: after_cursor_execute no se llama, descartar su inicio
+        started = context.connection.info.get('slow_query_started') if context.connection is not None else None
+        if started:
+            started.pop()
+
+    def record(self, engine, statement, parameters, elapsed, executemany=False):
+        """Registrar una sentencia lenta; el plan (si corresponde) se captura en segundo plano con el mismo engine"""
+        normalized = normalize_sql(statement)
+        entry = {
+            'timestamp': datetime.utcnow().isoformat(),
+            'duration_ms': round(elapsed * 1000, 2),
+            'endpoint': request.endpoint if has_request_context() else None,
+            'path': request.full_path.rstrip('?') if has_request_context() else None,
+            'database': engine.url.render_as_string(hide_password=True),
+            'sql': normalized,
+            'parameters': _format_parameters(parameters) if not executemany else f'{len(parameters)} filas (executemany)',
+            'plan': None,
+        }
+        logger.warning(f'Sentencia lenta ({entry["duration_ms"]} ms) en {entry["endpoint"]}: {normalized[:200]}')
+
+        if self.explain and not executemany and plan_mode(statement) is not None \
+                and self._should_explain(normalized):
+            try:
+                self._queue.put_nowait((engine, entry, statement, parameters))
+                self._ensure_worker()
+                return
+            except queue.Full:
+                entry['plan_error'] = 'cola de EXPLAIN llena'
+        self.write(entry)
+
+    def _should_explain(self, normalized):
+        now = time.monotonic()
+        with self._lock:
+            last = self._explained_at.get(normalized)
+            if last is not None and now - last < self.explain_interval:
+                return False
+            self._explained_at[normalized] = now
+            if len(self._explained_at) > 1000:
+                self._explained_at.clear()
+            return True
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='slow-query-explain', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            engine, entry, statement, parameters = self._queue.get()
+            try:
+                with engine.connect() as connection:
+                    connection.info[_SKIP_KEY] = True
+                    try:
+                        entry['plan'] = explain_statement(connection, statement, parameters, self.explain_timeout_ms)
+                    finally:
+                        connection.info.pop(_SKIP_KEY, None)
+            except Exception as e:
+                entry['plan_error'] = str(e)
+            self.write(entry)
+            self._queue.task_done()
+
+    def write(self, entry):
+        self._process_handler()
+        self._file_logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def wait(self):
+        """Esperar a que se capturen los planes pendientes (pruebas y scripts)"""
+        self._queue.join()
+
+    def process_paths(self):
+        """Archivos actuales (sin rotar) de todos los procesos que escribieron en este host"""
+        root, ext = os.path.splitext(self.path)
+        paths = []
+        for candidate in glob.glob(f'{glob.escape(root)}.*{glob.escape(ext)}'):
+            pid = candidate[len(root) + 1:len(candidate) - len(ext)]
+            if pid.isdigit():
+                paths.append(candidate)
+        return paths
+
+    def read(self, limit=100):
+        """Últimas `limit` entradas de los archivos de todos los workers del host, más recientes primero"""
+        if self._handler is not None and self._handler_pid == os.getpid():
+            self._handler.flush()
+        entries = []
+        for path in self.process_paths():
+            try:
+                with open(path, encoding='utf-8') as f:
+                    lines = deque(f, maxlen=limit)
+            except FileNotFoundError:
+                continue
+            for line in lines:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+        entries.sort(key=lambda entry: entry.get('timestamp') or '', reverse=True)
+        return entries[:limit]
+
+
+def init_slow_query_log(app, engines):
+    """Registrar el registro de sentencias lentas en todos los engines si SLOW_QUERY_MS > 0"""
+    threshold_ms = app.config.get('SLOW_QUERY_MS') or 0
+    if threshold_ms <= 0:
+        return None
+    slow_log = SlowQueryLog(
+        threshold_ms,
+        app.config.get('SLOW_QUERY_LOG_PATH') or os.path.join(tempfile.gettempdir(), 'stockv01_slow_queries.log'),
+        app.config.get('SLOW_QUERY_LOG_MAX_BYTES', 5 * 1024 * 1024),
+        app.config.get('SLOW_QUERY_LOG_BACKUPS', 3),
+        explain=app.config.get('SLOW_QUERY_EXPLAIN', True),
+        explain_interval=app.config.get('SLOW_QUERY_EXPLAIN_INTERVAL', 60),
+        explain_timeout_ms=app.config.get('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', 5000),
+    )
+    for engine in engines:
+        slow_log.install(engine)
+    app.extensions['slow_queries'] = slow_log
+    return slow_log
+
+
+def get_slow_query_log(app):
+    return app.extensions.get('slow_queries')
@@ -1,13 +1,27 @@
 /**
  * Script do Dashboard
  * Carrega estatísticas e alertas do inventário
+ * Atualização ao vivo via Server-Sent Events (/api/dashboard/stream); se o
+ * servidor recusar o stream (limite de clientes por worker), consulta /api/batch
+ * periodicamente
  */
 
+// Intervalo das consultas enquanto o stream está recusado
+const DASHBOARD_POLL_MS = 15000;
+// Nova tentativa de stream enquanto consulta (pode ter liberado uma vaga)
+const DASHBOARD_STREAM_RETRY_MS = 120000;
+
 class Dashboard {
     constructor() {
         this.initializeElements();
         this.attachEventListeners();
-        this.loadDashboard();
+
+        if (window.EventSource) {
+            // O primeiro evento do stream traz o estado atual: não é preciso carregar antes
+            this.connectStream();
+        } else {
+            this.loadDashboard();
+        }
     }
     
     /**
@@ -29,31 +43,81 @@ class Dashboard {
         this.refreshBtn.addEventListener('click', () => this.loadDashboard());
     }
     
+    /**
+     * Assinar o feed ao vivo: um evento 'update' ao conectar e a cada mudança nos dados
+     * O EventSource reconecta sozinho (enviando Last-Event-ID) se a conexão cair
+     */
+    connectStream() {
+        const source = new EventSource('/api/dashboard/stream');
+        this.eventSource = source;
+        source.addEventListener('update', (event) => this.onStreamUpdate(event));
+        source.addEventListener('error', () => {
+            if (source.readyState === EventSource.CLOSED) {
+                // Servidor recusou o stream (ex.: 503): consulta periodicamente
+                this.eventSource = null;
+                this.startPolling();
+            }
+        });
+        source.addEventListener('open', () => this.stopPolling());
+    }
+
+    /**
+     * Consultar /api/batch a cada DASHBOARD_POLL_MS (os ETags evitam reenviar dados iguais)
+     * e tentar o stream de novo a cada DASHBOARD_STREAM_RETRY_MS
+     */
+    startPolling() {
+        this.loadDashboard();
+        if (!this.pollTimer) {
+            this.pollTimer = setInterval(() => this.loadDashboard(), DASHBOARD_POLL_MS);
+        }
+        clearTimeout(this.streamRetryTimer);
+        this.streamRetryTimer = setTimeout(() => {
+            this.streamRetryTimer = null;
+            this.connectStream();
+        }, DASHBOARD_STREAM_RETRY_MS);
+    }
+
+    stopPolling() {
+        clearInterval(this.pollTimer);
+        clearTimeout(this.streamRetryTimer);
+        this.pollTimer = null;
+        this.streamRetryTimer = null;
+    }
+
+    /**
+     * Renderizar um evento do feed ao vivo (stats, alertas e movimentos recentes)
+     */
+    onStreamUpdate(event) {
+        try {
+            const payload = JSON.parse(event.data);
+            this.hideError();
+            this.renderStats(payload.stats);
+            this.renderAlerts(payload.stats);
+            this.renderMovimientos(payload.movimientos);
+        } catch (error) {
+            console.error('Erro ao processar atualização ao vivo:', error);
+        }
+    }
+
     /**
      * Carregar todos os dados do dashboard
+     * Uma única requisição (POST /api/batch) para stats, alertas e movimentos recentes
      */
     async loadDashboard() {
         try {
             this.hideError();
 
-            // Carregar primeiro o essencial (stats + alertas)
-            const statsData = await this.fetchStats();
+            const results = await this.fetchBatch([
+                { name: 'stats', path: '/api/dashboard/stats' },
+                { name: 'movimientos', path: '/api/dashboard/movimientos-recientes' }
+            ]);
+
+            const statsData = this.unwrapResult(results.stats, 'Erro ao carregar estatísticas');
             this.renderStats(statsData);
             this.renderAlerts(statsData);
 
-            // Carregar resumo de movimentos depois (carga diferida)
-            this.loadMovementsDeferred();
-        } catch (error) {
-            console.error('Erro:', error);
-            this.showError(error.message);
-        }
-    }
-
-    loadMovementsDeferred() {
-        const run = async () => {
             try {
-                const movimentosData = await this.fetchMovimientos();
-                this.renderMovimientos(movimentosData);
+                this.renderMovimientos(this.unwrapResult(results.movimientos, 'Erro ao carregar movimentos'));
             } catch (error) {
                 console.error('Erro ao carregar resumo de movimentos:', error);
                 if (this.movimentosResumo) {
@@ -64,51 +128,66 @@ class Dashboard {
                     `;
                 }
             }
-        };
-
-        if (typeof window.requestIdleCallback === 'function') {
-            window.requestIdleCallback(() => run(), { timeout: 1000 });
-        } else {
-            setTimeout(run, 0);
+        } catch (error) {
+            console.error('Erro:', error);
+            this.showError(error.message);
         }
     }
-    
+
     /**
-     * Obter estatísticas da API
+     * Executar várias requisições GET da API em uma única ida e volta
+     * Cada sub-requisição leva o ETag do corpo guardado; 304 reutiliza o corpo (apiCache)
      */
-    async fetchStats() {
-        const response = await fetch('/api/dashboard/stats');
-        
+    async fetchBatch(requests) {
+        const cached = {};
+        const withEtags = requests.map(req => {
+            cached[req.name] = apiCache.get(req.path);
+            return cached[req.name] ? { ...req, etag: cached[req.name].etag } : req;
+        });
+
+        const response = await fetch('/api/batch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ requests: withEtags })
+        });
+
         if (!response.ok) {
             throw new Error(`Erro HTTP: ${response.status}`);
         }
-        
+
         const data = await response.json();
-        
+
         if (!data.success) {
-            throw new Error(data.error || 'Erro ao carregar estatísticas');
+            throw new Error(data.error || 'Erro ao carregar o dashboard');
         }
-        
-        return data;
+
+        requests.forEach(req => {
+            const result = data.results[req.name];
+            if (!result) return;
+            if (result.status === 304 && cached[req.name]) {
+                data.results[req.name] = { status: 200, etag: result.etag, body: cached[req.name].data };
+            } else if (result.status === 200 && result.etag) {
+                apiCache.set(req.path, result.etag, result.body);
+            }
+        });
+
+        return data.results;
     }
-    
+
     /**
-     * Obter movimentos recentes da API
+     * Corpo de uma sub-requisição do lote, ou erro se ela falhou
      */
-    async fetchMovimientos() {
-        const response = await fetch('/api/dashboard/movimientos-recientes');
-        
-        if (!response.ok) {
-            throw new Error(`Erro HTTP: ${response.status}`);
+    unwrapResult(result, fallbackMessage) {
+        if (!result) {
+            throw new Error(fallbackMessage);
         }
-        
-        const data = await response.json();
-        
-        if (!data.success) {
-            throw new Error(data.error || 'Erro ao carregar movimentos');
+        if (result.status !== 200) {
+            throw new Error((result.body && result.body.error) || `Erro HTTP: ${result.status}`);
         }
-        
-        return data;
+        if (!result.body || !result.body.success) {
+            throw new Error((result.body && result.body.error) || fallbackMessage);
+        }
+        return result.body;
     }
     
     /**
@@ -9,6 +9,11 @@ class MovimientosManager {
         this.limit = 10;
         this.totalRecords = 0;
 
+        // Paginação por cursor (keyset): tokens devolvidos pela API
+        this.cursor = null;
+        this.nextCursor = null;
+        this.prevCursor = null;
+
         this.tipoColors = {
             'entrada': 'success',
             'saida': 'danger',
@@ -89,7 +94,12 @@ class MovimientosManager {
         if (grupo) params.append('grupo', grupo);
 
         params.append('limit', this.limit);
-        params.append('offset', this.currentPage * this.limit);
+        // Só os campos exibidos na tabela, em formato columnar (resposta menor)
+        params.append('fields', 'fecha,tipo,grupo,producto,cantidad,descripcion,usuario');
+        params.append('format', 'columnar');
+        if (this.cursor) {
+            params.append('cursor', this.cursor);
+        }
 
         return params.toString();
     }
@@ -104,9 +114,9 @@ class MovimientosManager {
             this.hideNoResults();
 
             const params = this.buildFilterParams();
-            const response = await fetch(`/api/movimientos?${params}`);
+            const response = await fetchJsonCached(`/api/movimientos?${params}`);
 
-            const data = await response.json();
+            const data = response.data;
 
             if (!response.ok) {
                 throw new Error(data.error || `Erro HTTP: ${response.status}`);
@@ -116,12 +126,16 @@ class MovimientosManager {
                 throw new Error(data.error || 'Erro ao carregar movimentos');
             }
 
+            const items = columnarToObjects(data.data);
+
             this.totalRecords = data.pagination.total;
-            this.renderMovimientos(data.data);
-            this.updateIndicators(data.data);
+            this.nextCursor = data.pagination.next_cursor || null;
+            this.prevCursor = data.pagination.prev_cursor || null;
+            this.renderMovimientos(items);
+            this.updateIndicators(items);
             this.updatePagination();
 
-            if (data.data.length === 0) {
+            if (items.length === 0) {
                 this.showNoResults();
             }
 
@@ -129,6 +143,8 @@ class MovimientosManager {
             console.error('Erro:', error);
             this.showError(error.message);
             this.movimientosTableBody.innerHTML = '';
+            this.nextCursor = null;
+            this.prevCursor = null;
             this.updateIndicators([]);
         }
     }
@@ -207,15 +223,15 @@ class MovimientosManager {
         const currentPage = this.currentPage + 1;
 
         this.paginationInfo.textContent = `Página ${currentPage} de ${totalPages}`;
-        this.prevBtn.disabled = this.currentPage === 0;
-        this.nextBtn.disabled = this.currentPage >= totalPages - 1 || totalPages === 0;
+        this.prevBtn.disabled = this.currentPage === 0 || !this.prevCursor;
+        this.nextBtn.disabled = !this.nextCursor;
     }
 
     /**
      * Ao clicar em Filtrar
      */
     onFilterClick() {
-        this.currentPage = 0;
+        this.resetPagination();
         this.loadMovimientos();
     }
 
@@ -227,16 +243,28 @@ class MovimientosManager {
         this.fechaHastaFilter.value = '';
         this.tipoFilter.value = '';
         this.grupoFilter.value = '';
-        this.currentPage = 0;
+        this.resetPagination();
         this.loadMovimientos();
     }
 
+    /**
+     * Voltar para a primeira página (sem cursor)
+     */
+    resetPagination() {
+        this.currentPage = 0;
+        this.cursor = null;
+        this.nextCursor = null;
+        this.prevCursor = null;
+    }
+
     /**
      * Página anterior
      */
     previousPage() {
-        if (this.currentPage > 0) {
+        if (this.currentPage > 0 && this.prevCursor) {
             this.currentPage--;
+            // A primeira página é sempre carregada sem cursor
+            this.cursor = this.currentPage === 0 ? null : this.prevCursor;
             this.loadMovimientos();
         }
     }
@@ -245,9 +273,9 @@ class MovimientosManager {
      * Próxima página
      */
     nextPage() {
-        const totalPages = Math.ceil(this.totalRecords / this.limit);
-        if (this.currentPage < totalPages - 1) {
+        if (this.nextCursor) {
             this.currentPage++;
+            this.cursor = this.nextCursor;
             this.loadMovimientos();
         }
     }
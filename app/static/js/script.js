@@ -102,3 +102,67 @@ function disableDarkMode() {
 function confirmDelete(productName) {
     return confirm(`Tem certeza que deseja excluir "${productName}"?`);
 }
+
+/**
+ * Cache de respostas JSON da API (sessionStorage), revalidada com ETag
+ * O servidor responde 304 sem corpo quando os dados não mudaram
+ */
+const apiCache = {
+    prefix: 'apiCache:',
+
+    get(key) {
+        try {
+            return JSON.parse(sessionStorage.getItem(this.prefix + key));
+        } catch (error) {
+            return null;
+        }
+    },
+
+    set(key, etag, data) {
+        try {
+            sessionStorage.setItem(this.prefix + key, JSON.stringify({ etag, data }));
+        } catch (error) {
+            // Sem espaço no sessionStorage: a próxima requisição traz o corpo completo
+            sessionStorage.removeItem(this.prefix + key);
+        }
+    }
+};
+
+/**
+ * Converter data no formato columnar ({ columns, rows }) em lista de objetos
+ * Listas de objetos (format=objects) são retornadas sem alteração
+ */
+function columnarToObjects(data) {
+    if (!data || Array.isArray(data)) {
+        return data || [];
+    }
+    const { columns, rows } = data;
+    return rows.map(row => {
+        const item = {};
+        columns.forEach((column, i) => {
+            item[column] = row[i];
+        });
+        return item;
+    });
+}
+
+/**
+ * GET com If-None-Match: reutiliza o corpo guardado quando a resposta é 304
+ * Retorna { ok, status, data } (data é o JSON da resposta, também em erros)
+ */
+async function fetchJsonCached(url) {
+    const cached = apiCache.get(url);
+    const headers = cached && cached.etag ? { 'If-None-Match': cached.etag } : {};
+    const response = await fetch(url, { headers });
+
+    if (response.status === 304 && cached) {
+        return { ok: true, status: 200, data: cached.data };
+    }
+
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (response.ok && etag) {
+        apiCache.set(url, etag, data);
+    }
+    return { ok: response.ok, status: response.status, data };
+}
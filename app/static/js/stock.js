@@ -85,6 +85,9 @@ class StockManager {
         params.append('raw', 'true');
         params.append('limit', this.limit);
         params.append('offset', this.currentPage * this.limit);
+        // Só os campos exibidos na tabela, em formato columnar (resposta menor)
+        params.append('fields', 'grupo,producto,cantidad,contenedor,fecha_producto');
+        params.append('format', 'columnar');
 
         return params.toString();
     }
@@ -106,25 +109,27 @@ class StockManager {
             this.hideNoResults();
 
             const params = this.buildFilterParams();
-            const response = await fetch(`/api/stock?${params}`);
+            const response = await fetchJsonCached(`/api/stock?${params}`);
 
             if (!response.ok) {
                 throw new Error(`Erro HTTP: ${response.status}`);
             }
 
-            const data = await response.json();
+            const data = response.data;
 
             if (!data.success) {
                 throw new Error(data.error || 'Erro ao carregar estoque');
             }
 
+            const items = columnarToObjects(data.data);
+
             this.hasLoaded = true;
             this.totalRecords = data.pagination?.total || 0;
-            this.renderStock(data.data || []);
-            this.updateIndicators(data.data || []);
+            this.renderStock(items);
+            this.updateIndicators(items);
             this.updatePagination();
 
-            if (!data.data || data.data.length === 0) {
+            if (items.length === 0) {
                 this.showNoResults();
             }
         } catch (error) {
@@ -0,0 +1,103 @@
+"""
+Mantenimiento de la tabla stock_latest (última fila por producto de stock_actual)
+
+stock_latest guarda una fila por nombre: la de fecha_producto más reciente en
+stock_actual. Se mantiene con triggers sobre stock_actual (Postgres y SQLite),
+de modo que cualquier escritor (la app, cargas masivas o los sistemas de la
+cocina) la deja actualizada sin pasos extra.
+"""
+
+from sqlalchemy import text
+
+STOCK_COLUMNS = ('nombre', 'unidade', 'grupo', 'fecha_producto', 'contenedor', 'cantidad')
+
+_COLUMNS_SQL = ', '.join(STOCK_COLUMNS)
+
+_POSTGRES_DDL = (
+    f"""
+    CREATE OR REPLACE FUNCTION stock_latest_sync(p_nombre TEXT) RETURNS void AS $$
+    BEGIN
+        DELETE FROM stock_latest WHERE nombre = p_nombre;
+        INSERT INTO stock_latest ({_COLUMNS_SQL})
+        SELECT {_COLUMNS_SQL} FROM stock_actual
+        WHERE nombre = p_nombre
+        ORDER BY fecha_producto DESC
+        LIMIT 1;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION stock_latest_trigger() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM stock_latest_sync(OLD.nombre);
+        END IF;
+        IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.nombre IS DISTINCT FROM OLD.nombre) THEN
+            PERFORM stock_latest_sync(NEW.nombre);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS stock_latest_maintain ON stock_actual",
+    """
+    CREATE TRIGGER stock_latest_maintain
+    AFTER INSERT OR UPDATE OR DELETE ON stock_actual
+    FOR EACH ROW EXECUTE FUNCTION stock_latest_trigger()
+    """,
+)
+
+
+def _sqlite_sync(ref):
+    return (
+        f"DELETE FROM stock_latest WHERE nombre = {ref}.nombre; "
+        f"INSERT INTO stock_latest ({_COLUMNS_SQL}) "
+        f"SELECT {_COLUMNS_SQL} FROM stock_actual WHERE nombre = {ref}.nombre "
+        f"ORDER BY fecha_producto DESC LIMIT 1;"
+    )
+
+
+_SQLITE_DDL = (
+    "DROP TRIGGER IF EXISTS stock_latest_ai",
+    "DROP TRIGGER IF EXISTS stock_latest_au",
+    "DROP TRIGGER IF EXISTS stock_latest_ad",
+    f"CREATE TRIGGER stock_latest_ai AFTER INSERT ON stock_actual BEGIN {_sqlite_sync('NEW')} END",
+    f"CREATE TRIGGER stock_latest_au AFTER UPDATE ON stock_actual BEGIN {_sqlite_sync('OLD')} {_sqlite_sync('NEW')} END",
+    f"CREATE TRIGGER stock_latest_ad AFTER DELETE ON stock_actual BEGIN {_sqlite_sync('OLD')} END",
+)
+
+
+def install_stock_latest_triggers(connection):
+    """Crear (o recrear) los triggers que mantienen stock_latest"""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        statements = _POSTGRES_DDL
+    elif dialect == 'sqlite':
+        statements = _SQLITE_DDL
+    else:
+        raise NotImplementedError(f'stock_latest no soporta el dialecto {dialect}')
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+
+def rebuild_stock_latest(connection):
+    """Reconstruir stock_latest completo a partir de stock_actual. Retorna filas insertadas"""
+    connection.execute(text('DELETE FROM stock_latest'))
+    result = connection.execute(text(
+        f"""
+        INSERT INTO stock_latest ({_COLUMNS_SQL})
+        SELECT {_COLUMNS_SQL} FROM (
+            SELECT {_COLUMNS_SQL},
+                   row_number() OVER (PARTITION BY nombre ORDER BY fecha_producto DESC) AS rn
+            FROM stock_actual
+        ) ranked
+        WHERE rn = 1
+        """
+    ))
+    return result.rowcount
+
+
+def on_stock_latest_created(target, connection, **kw):
+    """Listener after_create: instalar triggers y poblar la tabla recién creada"""
+    install_stock_latest_triggers(connection)
+    rebuild_stock_latest(connection)
@@ -0,0 +1,94 @@
+"""
+Benchmark de /api/dashboard/stats: sentencia única vs consultas separadas
+Ejecutar: python benchmarks/bench_dashboard_stats.py [--filas 20000] [--repeticiones 50] [--rtt-ms 1.0]
+
+Crea una base SQLite en memoria (configuración testing) con stock_actual
+sintético y mide, para la sentencia única y compute_stats_legacy(), sentencias
+SQL (idas y vueltas) por llamada y tiempo medio. Con SQLite en proceso la
+latencia por sentencia es casi nula; --rtt-ms simula la ida y vuelta de red
+que cada sentencia paga contra un Postgres remoto.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+# Agregar el directorio del proyecto al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app import create_app
+from app.dashboard_stats import compute_stats, compute_stats_legacy
+from app.models import db, StockActual
+
+GRUPOS = ('CON', 'HOR', 'FRU', 'SEC', 'LAC')
+
+
+def seed(filas, semilla=42):
+    rnd = random.Random(semilla)
+    hoy = date.today()
+    db.session.bulk_insert_mappings(StockActual, [
+        {
+            'nombre': f'Producto {i:07d}',
+            'unidade': 'kg',
+            'grupo': rnd.choice(GRUPOS),
+            'fecha_producto': hoy + timedelta(days=rnd.randint(-30, 180)),
+            'contenedor': f'C{rnd.randint(1, 20)}',
+            'cantidad': rnd.randint(0, 100),
+        }
+        for i in range(filas)
+    ])
+    db.session.commit()
+
+
+def sentencia_unica(session, hoy):
+    return compute_stats(session, hoy, single_statement=True)
+
+
+def medir(func, repeticiones, rtt_ms):
+    sentencias = []
+
+    def listener(*args):
+        sentencias.append(1)
+        if rtt_ms:
+            time.sleep(rtt_ms / 1000)
+
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            resultado = func(db.session, date.today())
+            db.session.rollback()
+        elapsed = time.perf_counter() - inicio
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return resultado, len(sentencias) / repeticiones, elapsed / repeticiones * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--filas', type=int, default=20000)
+    parser.add_argument('--repeticiones', type=int, default=50)
+    parser.add_argument('--rtt-ms', type=float, default=1.0)
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    with app.app_context():
+        seed(args.filas)
+
+        nuevo, sentencias_nuevo, ms_nuevo = medir(sentencia_unica, args.repeticiones, args.rtt_ms)
+        legacy, sentencias_legacy, ms_legacy = medir(compute_stats_legacy, args.repeticiones, args.rtt_ms)
+        assert nuevo == legacy, 'la sentencia única y la versión legacy difieren'
+
+        print(f'stock_actual: {args.filas} filas, {args.repeticiones} repeticiones, RTT simulado {args.rtt_ms} ms')
+        print(f'{"variante":<22}{"sentencias":>12}{"ms/llamada":>14}')
+        print(f'{"sentencia única":<22}{sentencias_nuevo:>12.0f}{ms_nuevo:>14.2f}')
+        print(f'{"legacy":<22}{sentencias_legacy:>12.0f}{ms_legacy:>14.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+"""
+Benchmark de los endpoints JSON con percentiles y control de regresiones
+Ejecutar: python benchmarks/bench_endpoints.py [--escalas 10000,1000000,5000000] [--repeticiones 30]
+          [--salida resultados.json] [--comparar base.json --umbral 0.25]
+
+Para cada escala (número de movimientos) usa una base poblada con
+populate_db.py (se genera una sola vez y se reutiliza en --datos-dir) y pasa
+cada endpoint por el cliente de pruebas de Flask, midiendo:
+
+- latencia p50 / p95 / p99 (ms)
+- sentencias SQL por petición
+- pico de memoria Python por petición (tracemalloc, en una pasada aparte para
+  no inflar los tiempos)
+
+Por defecto se vacían la caché de totales y la del dashboard antes de cada
+petición, de modo que se mide el trabajo real contra la base (--con-cache para
+medir el camino cacheado).
+
+Los resultados se guardan en JSON. Con --comparar, el script termina con
+código 1 si algún caso empeora respecto a la base más allá de --umbral
+(relativo) y --margen-ms (absoluto, para ignorar ruido en casos de pocos ms),
+si ejecuta más sentencias SQL o si su pico de memoria crece más que --umbral.
+
+Como la configuración lee DATABASE_URL al importarse, cada escala se ejecuta
+en un subproceso propio.
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATOS_DIR = os.path.join(PROJECT_DIR, 'benchmarks', '.data')
+DEFAULT_ESCALAS = '10000,1000000,5000000'
+DEFAULT_URL = 'sqlite:///{datos_dir}/bench_{escala}.sqlite3'
+
+# Agregar el directorio del proyecto al path
+sys.path.insert(0, PROJECT_DIR)
+
+
+def casos(escala):
+    """(nombre, url) de cada caso medido; los filtros de fecha son relativos a hoy como en populate_db.py"""
+    hoy = date.today()
+    offset_profundo = max(0, (escala * 9 // 10) // 100 * 100)
+    return [
+        ('stock_raw', '/api/stock?limit=100'),
+        ('stock_dedup', '/api/stock?raw=false&limit=100'),
+        ('movimientos', '/api/movimientos?limit=100'),
+        ('movimientos_filtros', (
+            f'/api/movimientos?tipo=saida&grupo=LAC&fecha_desde={hoy - timedelta(days=30)}'
+            f'&fecha_hasta={hoy}&limit=100'
+        )),
+        ('movimientos_offset_profundo', f'/api/movimientos?limit=100&offset={offset_profundo}'),
+        ('dashboard_stats', '/api/dashboard/stats'),
+        ('dashboard_movimientos_recientes', '/api/dashboard/movimientos-recientes'),
+        ('dashboard_resumo_diario', f'/api/dashboard/resumo-diario?fecha={hoy - timedelta(days=1)}'),
+        ('dashboard_consumo_neto_export', f'/api/dashboard/consumo-neto-export?fecha={hoy - timedelta(days=1)}'),
+    ]
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano (valores ordenados)"""
+    if not valores:
+        return None
+    indice = max(0, min(len(valores) - 1, math.ceil(p / 100 * len(valores)) - 1))
+    return valores[indice]
+
+
+# ---------------------------------------------------------------------------
+# Subproceso: una escala
+# ---------------------------------------------------------------------------
+
+def preparar_datos(escala, reseed, seed):
+    """Poblar la base de la escala si no tiene exactamente `escala` movimientos"""
+    from app import create_app
+    from app.models import Movimiento
+    import populate_db
+
+    if not reseed:
+        app = create_app('development')
+        with app.app_context():
+            actual = Movimiento.query.count()
+        if actual == escala:
+            return
+        print(f'  base con {actual} movimientos, se regenera con {escala}', file=sys.stderr)
+
+    populate_db.populate_db(
+        movimientos=escala,
+        productos=min(5000, max(200, escala // 1000)),
+        dias=365,
+        seed=seed
+    )
+
+
+def medir_escala(escala, repeticiones, warmup, con_cache):
+    from sqlalchemy import event
+    from app import create_app
+    from app.cache import get_cache_backend
+    from app.counts import count_cache
+    from app.models import db
+
+    app = create_app('development')
+    app.config['DEBUG'] = False
+    client = app.test_client()
+    resultados = {}
+
+    with app.app_context():
+        engine = db.engine
+        dialecto = engine.dialect.name
+        sentencias = []
+
+        def contar(*args):
+            sentencias.append(1)
+
+        def limpiar():
+            if not con_cache:
+                count_cache.clear()
+                get_cache_backend().clear()
+
+        event.listen(engine, 'before_cursor_execute', contar)
+        try:
+            for nombre, url in casos(escala):
+                for _ in range(warmup):
+                    limpiar()
+                    client.get(url)
+
+                tiempos = []
+                sentencias_total = 0
+                status = None
+                for _ in range(repeticiones):
+                    limpiar()
+                    sentencias.clear()
+                    inicio = time.perf_counter()
+                    response = client.get(url)
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+                    sentencias_total += len(sentencias)
+                    status = response.status_code
+
+                # Pasada aparte con tracemalloc (ralentiza la asignación de memoria)
+                limpiar()
+                tracemalloc.start()
+                try:
+                    response = client.get(url)
+                    _, pico = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+
+                tiempos.sort()
+                resultados[nombre] = {
+                    'url': url,
+                    'status': status,
+                    'p50_ms': round(percentil(tiempos, 50), 3),
+                    'p95_ms': round(percentil(tiempos, 95), 3),
+                    'p99_ms': round(percentil(tiempos, 99), 3),
+                    'media_ms': round(sum(tiempos) / len(tiempos), 3),
+                    'sentencias': round(sentencias_total / repeticiones, 2),
+                    'pico_memoria_kb': round(pico / 1024, 1),
+                    'bytes_respuesta': len(response.get_data()),
+                }
+                print(
+                    f'  {nombre:<34}{resultados[nombre]["p50_ms"]:>9.2f}{resultados[nombre]["p95_ms"]:>9.2f}'
+                    f'{resultados[nombre]["p99_ms"]:>9.2f}{resultados[nombre]["sentencias"]:>8.1f}'
+                    f'{resultados[nombre]["pico_memoria_kb"]:>11.1f}',
+                    file=sys.stderr
+                )
+        finally:
+            event.remove(engine, 'before_cursor_execute', contar)
+
+    return {'dialecto': dialecto, 'casos': resultados}
+
+
+def ejecutar_escala(args):
+    """Entrada del subproceso: DATABASE_URL ya apunta a la base de la escala"""
+    # Los mensajes de populate_db.py van a stderr para no mezclarse con el JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        preparar_datos(args.escala, args.reseed, args.seed)
+    print(f'  {"caso":<34}{"p50":>9}{"p95":>9}{"p99":>9}{"sql":>8}{"mem KB":>11}', file=sys.stderr)
+    resultado = medir_escala(args.escala, args.repeticiones, args.warmup, args.con_cache)
+    json.dump(resultado, sys.stdout)
+
+
+# ---------------------------------------------------------------------------
+# Proceso principal
+# ---------------------------------------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(actual, base, umbral, margen_ms):
+    """Lista de regresiones (texto) de actual respecto a base"""
+    regresiones = []
+    for escala, datos in actual['escalas'].items():
+        base_escala = base.get('escalas', {}).get(escala)
+        if not base_escala:
+            continue
+        for nombre, caso in datos['casos'].items():
+            ref = base_escala['casos'].get(nombre)
+            if not ref:
+                continue
+            if caso['status'] != ref['status']:
+                regresiones.append(f'{escala}/{nombre}: status {ref["status"]} -> {caso["status"]}')
+            for metrica in ('p50_ms', 'p95_ms', 'p99_ms'):
+                limite = max(ref[metrica] * (1 + umbral), ref[metrica] + margen_ms)
+                if caso[metrica] > limite:
+                    regresiones.append(
+                        f'{escala}/{nombre}: {metrica} {ref[metrica]:.2f} -> {caso[metrica]:.2f} '
+                        f'(límite {limite:.2f})'
+                    )
+            if caso['sentencias'] > ref['sentencias']:
+                regresiones.append(f'{escala}/{nombre}: sentencias {ref["sentencias"]} -> {caso["sentencias"]}')
+            limite_memoria = ref['pico_memoria_kb'] * (1 + umbral) + 64
+            if caso['pico_memoria_kb'] > limite_memoria:
+                regresiones.append(
+                    f'{escala}/{nombre}: pico de memoria {ref["pico_memoria_kb"]} KB -> '
+                    f'{caso["pico_memoria_kb"]} KB'
+                )
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--escalas', default=DEFAULT_ESCALAS, help=f'Movimientos por escala (default: {DEFAULT_ESCALAS})')
+    parser.add_argument('--repeticiones', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--con-cache', action='store_true', help='No vaciar las cachés entre peticiones')
+    parser.add_argument('--datos-dir', default=DEFAULT_DATOS_DIR, help='Directorio de las bases SQLite generadas')
+    parser.add_argument('--database-url', default=DEFAULT_URL,
+                        help='Plantilla de URL por escala, con {escala} y {datos_dir} (p. ej. postgresql://.../bench_{escala})')
+    parser.add_argument('--reseed', action='store_true', help='Regenerar los datos aunque ya existan')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--salida', help='Archivo JSON de resultados (default: stdout)')
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior contra el que comparar')
+    parser.add_argument('--umbral', type=float, default=0.25, help='Empeoramiento relativo tolerado (default: 0.25)')
+    parser.add_argument('--margen-ms', type=float, default=2.0, help='Empeoramiento absoluto tolerado en ms (default: 2)')
+    parser.add_argument('--escala', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.escala is not None:
+        ejecutar_escala(args)
+        return 0
+
+    os.makedirs(args.datos_dir, exist_ok=True)
+    resultados = {
+        'meta': {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'repeticiones': args.repeticiones,
+            'con_cache': args.con_cache,
+        },
+        'escalas': {},
+    }
+
+    for escala in (int(e) for e in args.escalas.split(',') if e.strip()):
+        print(f'▶ escala {escala} movimientos', file=sys.stderr)
+        env = dict(os.environ, DATABASE_URL=args.database_url.format(escala=escala, datos_dir=args.datos_dir))
+        comando = [
+            sys.executable, os.path.abspath(__file__),
+            '--escala', str(escala),
+            '--repeticiones', str(args.repeticiones),
+            '--warmup', str(args.warmup),
+            '--seed', str(args.seed),
+        ]
+        if args.con_cache:
+            comando.append('--con-cache')
+        if args.reseed:
+            comando.append('--reseed')
+        proceso = subprocess.run(comando, env=env, cwd=PROJECT_DIR, stdout=subprocess.PIPE, check=True)
+        resultados['escalas'][str(escala)] = json.loads(proceso.stdout)
+
+    texto = json.dumps(resultados, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+        print(f'resultados guardados en {args.salida}', file=sys.stderr)
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)
+        regresiones = comparar(resultados, base, args.umbral, args.margen_ms)
+        if regresiones:
+            print(f'❌ {len(regresiones)} regresiones respecto a {args.comparar}:', file=sys.stderr)
+            for regresion in regresiones:
+                print(f'  - {regresion}', file=sys.stderr)
+            return 1
+        print(f'✅ sin regresiones respecto a {args.comparar}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
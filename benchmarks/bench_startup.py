@@ -0,0 +1,144 @@
+"""
+Benchmark del arranque: tiempo de import y de create_app() por proceso
+Ejecutar: python benchmarks/bench_startup.py [--repeticiones 5] [--salida startup.json]
+          [--comparar base.json --umbral 0.25]
+
+Cada repetición es un proceso nuevo (como un worker de gunicorn sin preload)
+sobre una base SQLite ya migrada, de modo que se mide el camino rápido:
+
+- import_ms: `import app` y sus dependencias (python -X importtime)
+- create_app_ms: create_app('development') con el esquema al día
+- login_ms: primer verify_credentials() (el hash del admin se calcula ahí,
+  no al importar)
+
+También lista los módulos que más tardan en importarse. Con --comparar termina
+con código 1 si la mediana de alguna métrica empeora más de --umbral (y más de
+--margen-ms).
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = """
+import json, time
+t0 = time.perf_counter()
+import app
+from app import create_app
+t1 = time.perf_counter()
+application = create_app('development')
+t2 = time.perf_counter()
+from app.auth import verify_credentials
+verify_credentials('admin', 'admin123')
+t3 = time.perf_counter()
+print(json.dumps({'import_ms': (t1 - t0) * 1000, 'create_app_ms': (t2 - t1) * 1000, 'login_ms': (t3 - t2) * 1000}))
+"""
+
+
+def parse_importtime(stderr):
+    """[(módulo, acumulado_ms)] de la salida de -X importtime"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|', 2)
+        modules.append((name.rstrip(), int(cumulative) / 1000))
+    return modules
+
+
+def run_probe(env):
+    proceso = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _PROBE],
+        cwd=PROJECT_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(proceso.stdout.strip().splitlines()[-1]), parse_importtime(proceso.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='Módulos más lentos a listar')
+    parser.add_argument('--salida', help='Archivo JSON de resultados (default: stdout)')
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior contra el que comparar')
+    parser.add_argument('--umbral', type=float, default=0.25)
+    parser.add_argument('--margen-ms', type=float, default=20.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DATABASE_URL=f'sqlite:///{os.path.join(tmp, "startup.sqlite3")}',
+            FLASK_ENV='development',
+        )
+        env.pop('ADMIN_PASSWORD_HASH', None)
+        # Primera ejecución: migra la base (no se mide)
+        run_probe(env)
+
+        muestras = []
+        modulos = {}
+        for _ in range(args.repeticiones):
+            tiempos, imports = run_probe(env)
+            muestras.append(tiempos)
+            for name, ms in imports:
+                modulos.setdefault(name.strip(), []).append(ms)
+
+    metricas = {
+        name: round(statistics.median(m[name] for m in muestras), 2)
+        for name in ('import_ms', 'create_app_ms', 'login_ms')
+    }
+    # Solo módulos de primer nivel (sin sangría en -X importtime) para no contar dos veces
+    mas_lentos = sorted(
+        ((name, statistics.median(values)) for name, values in modulos.items() if '.' not in name),
+        key=lambda item: -item[1]
+    )[:args.top]
+
+    resultados = {
+        'meta': {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'repeticiones': args.repeticiones,
+        },
+        'metricas': metricas,
+        'imports_mas_lentos_ms': {name: round(ms, 2) for name, ms in mas_lentos},
+    }
+
+    for name, value in metricas.items():
+        print(f'  {name:<16}{value:>10.2f}', file=sys.stderr)
+
+    texto = json.dumps(resultados, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)['metricas']
+        regresiones = []
+        for name, value in metricas.items():
+            ref = base.get(name)
+            if ref is None:
+                continue
+            limite = max(ref * (1 + args.umbral), ref + args.margen_ms)
+            if value > limite:
+                regresiones.append(f'{name}: {ref:.2f} -> {value:.2f} ms (límite {limite:.2f})')
+        if regresiones:
+            print(f'❌ {len(regresiones)} regresiones respecto a {args.comparar}:', file=sys.stderr)
+            for regresion in regresiones:
+                print(f'  - {regresion}', file=sys.stderr)
+            return 1
+        print(f'✅ sin regresiones respecto a {args.comparar}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
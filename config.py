@@ -13,6 +13,90 @@ class Config:
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
     PERMANENT_SESSION_LIFETIME = 3600  # 1 hora en segundos
+    
+    # Caché de totales de paginación (se invalida al cambiar la versión de datos)
+    COUNT_CACHE_TTL_SECONDS = int(os.getenv('COUNT_CACHE_TTL_SECONDS', '300'))
+    
+    # Caché del dashboard: 'memory' (por proceso) o 'sqlite' (compartida entre workers del host)
+    DASHBOARD_CACHE_BACKEND = os.getenv('DASHBOARD_CACHE_BACKEND', 'memory')
+    DASHBOARD_CACHE_PATH = os.getenv('DASHBOARD_CACHE_PATH')  # default: <tmp>/stockv01_dashboard_cache.sqlite3
+    DASHBOARD_CACHE_MAX_ENTRIES = int(os.getenv('DASHBOARD_CACHE_MAX_ENTRIES', '256'))
+    # Segundos que un payload vencido se sigue sirviendo mientras se recalcula en segundo plano
+    DASHBOARD_CACHE_STALE_SECONDS = int(os.getenv('DASHBOARD_CACHE_STALE_SECONDS', '20'))
+    # Tiempo máximo que una petición espera el recálculo hecho por otra
+    DASHBOARD_CACHE_LOCK_TIMEOUT = float(os.getenv('DASHBOARD_CACHE_LOCK_TIMEOUT', '10'))
+    
+    # Exportación en streaming: filas por lote del cursor del servidor y tamaño de cada bloque enviado
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '2000'))
+    EXPORT_CHUNK_BYTES = int(os.getenv('EXPORT_CHUNK_BYTES', str(64 * 1024)))
+    
+    # Carga masiva (POST /api/movimientos/ingest): sin token configurado el endpoint queda deshabilitado
+    INGEST_API_TOKEN = os.getenv('INGEST_API_TOKEN')
+    INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '50000'))
+    
+    # Pool de conexiones por worker (ver app/pool.py); tamaño/overflow no aplican a SQLite
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '11'))  # 5 + 11 = 8 hilos de petición + 8 del executor
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').strip().lower() in ('1', 'true', 'yes')
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))  # 0 = sin límite
+    DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'false').strip().lower() in ('1', 'true', 'yes')
+    # Hilos que atienden peticiones en cada worker (los de gunicorn.conf.py); cada uno puede tener una conexión
+    WORKER_THREADS = int(os.getenv('GUNICORN_THREADS', '8'))
+    
+    # Réplicas de lectura: una o varias URLs separadas por comas (ver app/replicas.py)
+    DATABASE_READ_URL = os.getenv('DATABASE_READ_URL')
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '30'))
+    REPLICA_HEALTH_INTERVAL = float(os.getenv('REPLICA_HEALTH_INTERVAL', '5'))
+    
+    # Consultas independientes de un endpoint en paralelo (ver app/parallel.py);
+    # cada una usa su propia conexión del pool. Si DB_POOL_SIZE + DB_MAX_OVERFLOW no cubre
+    # WORKER_THREADS + PARALLEL_QUERY_THREADS, init_pool() reduce el paralelismo al arrancar
+    PARALLEL_QUERIES_PER_REQUEST = int(os.getenv('PARALLEL_QUERIES_PER_REQUEST', '4'))
+    PARALLEL_QUERY_THREADS = int(os.getenv('PARALLEL_QUERY_THREADS', '8'))
+    
+    # Subpeticiones por llamada a POST /api/batch
+    BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', '10'))
+    
+    # ETag y 304 en /api/* según la versión de datos (ver app/conditional.py)
+    ETAG_ENABLED = os.getenv('ETAG_ENABLED', 'true').strip().lower() in ('1', 'true', 'yes')
+    
+    # Feed en vivo del dashboard (GET /api/dashboard/stream; ver app/live.py)
+    LIVE_POLL_INTERVAL = float(os.getenv('LIVE_POLL_INTERVAL', '2'))
+    LIVE_LISTEN_TIMEOUT = float(os.getenv('LIVE_LISTEN_TIMEOUT', '30'))
+    LIVE_HEARTBEAT_SECONDS = float(os.getenv('LIVE_HEARTBEAT_SECONDS', '15'))
+    # Cada cliente ocupa uno de los WORKER_THREADS hilos: init_live_feed() limita
+    # LIVE_MAX_SUBSCRIBERS para dejar LIVE_RESERVED_THREADS libres a las demás peticiones.
+    # Por encima del límite el stream responde 503 (con un aviso en el log) y el
+    # dashboard consulta /api/batch cada 15 s: dimensionar workers x hilos para las pantallas
+    LIVE_MAX_SUBSCRIBERS = int(os.getenv('LIVE_MAX_SUBSCRIBERS', '4'))
+    LIVE_RESERVED_THREADS = int(os.getenv('LIVE_RESERVED_THREADS', '4'))
+    
+    # Compresión de respuestas (gzip, o br con el módulo brotli instalado; ver app/responses.py)
+    RESPONSE_COMPRESSION = os.getenv('RESPONSE_COMPRESSION', 'true').strip().lower() in ('1', 'true', 'yes')
+    RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
+    RESPONSE_GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', '6'))
+    RESPONSE_BROTLI_QUALITY = int(os.getenv('RESPONSE_BROTLI_QUALITY', '4'))
+    
+    # Aplicar migraciones pendientes al arrancar (en producción: flask migrate)
+    AUTO_MIGRATE = os.getenv('AUTO_MIGRATE', 'true').strip().lower() in ('1', 'true', 'yes')
+    
+    # Instrumentación por petición (Server-Timing y /metrics); deshabilitada no tiene coste
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').strip().lower() in ('1', 'true', 'yes')
+    METRICS_PATH = os.getenv('METRICS_PATH', '/metrics')
+    # Token Bearer del scraper para /metrics; sin él solo accede una sesión de administrador
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    
+    # Registro de sentencias lentas con EXPLAIN (0 = deshabilitado)
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '0'))
+    SLOW_QUERY_LOG_PATH = os.getenv('SLOW_QUERY_LOG_PATH')  # default: <tmp>/stockv01_slow_queries.log
+    SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv('SLOW_QUERY_LOG_MAX_BYTES', str(5 * 1024 * 1024)))
+    SLOW_QUERY_LOG_BACKUPS = int(os.getenv('SLOW_QUERY_LOG_BACKUPS', '3'))
+    SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', 'true').strip().lower() in ('1', 'true', 'yes')
+    # Segundos mínimos entre dos EXPLAIN del mismo SQL normalizado y tiempo máximo de cada EXPLAIN
+    SLOW_QUERY_EXPLAIN_INTERVAL = int(os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', '60'))
+    SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.getenv('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', '5000'))
 
 class DevelopmentConfig(Config):
     """Configuración de desarrollo"""
@@ -31,6 +115,7 @@ class ProductionConfig(Config):
     DEBUG = False
     TESTING = False
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
+    AUTO_MIGRATE = os.getenv('AUTO_MIGRATE', 'false').strip().lower() in ('1', 'true', 'yes')
 
 class TestingConfig(Config):
     """Configuración de pruebas"""
@@ -0,0 +1,27 @@
+"""
+Configuración de gunicorn (gunicorn -c gunicorn.conf.py run:app)
+
+Con preload (GUNICORN_PRELOAD=true, default) la aplicación se importa y se crea
+una sola vez en el proceso maestro y los workers la heredan por fork: el
+arranque de cada worker no repite imports ni la comprobación del esquema.
+Las conexiones del pool abiertas en el maestro no se pueden compartir entre
+procesos, así que post_fork las descarta en cada worker.
+
+Cada cliente de GET /api/dashboard/stream (SSE) ocupa un hilo mientras está
+conectado: con threads > 1 gunicorn usa workers gthread, y app/live.py limita
+los clientes del stream para que LIVE_RESERVED_THREADS hilos sigan atendiendo
+las demás peticiones.
+"""
+
+import os
+
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').strip().lower() in ('1', 'true', 'yes')
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    from app import dispose_engines
+    from run import app
+    dispose_engines(app)
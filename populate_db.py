@@ -1,95 +1,331 @@
 """
-Script para poblador de base de datos con datos de ejemplo
-Ejecutar: python populate_db.py
+Generador de datos sintéticos para desarrollo y pruebas de rendimiento
+Ejecutar: python populate_db.py [--movimientos 1000000] [--productos 2000] [--seed 42] [--workers 4]
+
+Genera un catálogo de productos por grupo (CON, HOR, FRU, SEC, LAC), stock_actual
+con vencimientos repartidos (vencidos, por vencer en 3 y 7 días, resto) y
+movimientos con popularidad sesgada (Zipf), servicios alm/jan/kit/cof, voltas,
+compras a fornecedor, descartes y ajustes.
+
+Los movimientos se generan en bloques en paralelo (un proceso por worker) y se
+insertan en bloque (COPY en PostgreSQL, executemany en SQLite). Cada bloque usa
+su propia semilla derivada de --seed, así que el resultado es el mismo sin
+importar el número de workers.
 """
 
+import argparse
 import os
-import sys
-from datetime import datetime, timedelta
 import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from itertools import accumulate
 
 # Agregar el directorio del proyecto al path
 sys.path.insert(0, os.path.dirname(__file__))
 
 from app import create_app
+from app.ingest import INGEST_COLUMNS, bulk_insert
+from app.migrations import migrate
 from app.models import db, StockActual, Movimiento, Product
+from app.movimientos_daily import rebuild_movimientos_daily
+
+STOCK_COLUMNS = ('nombre', 'unidade', 'grupo', 'fecha_producto', 'contenedor', 'cantidad')
+
+# Por grupo: productos base, unidades, días de validez (mín, máx) y contenedores
+GRUPOS = {
+    'CON': {
+        'nombres': ['Frango', 'Carne Moída', 'Peixe', 'Camarão', 'Batata Palito', 'Hambúrguer',
+                    'Linguiça', 'Polpa de Fruta', 'Sorvete', 'Legumes Congelados'],
+        'unidades': ['kg', 'cx'],
+        'validez': (90, 365),
+        'contenedores': ['Freezer 1', 'Freezer 2', 'Câmara de Congelados'],
+    },
+    'HOR': {
+        'nombres': ['Alface', 'Tomate', 'Cebola', 'Cenoura', 'Batata', 'Abobrinha',
+                    'Pimentão', 'Brócolis', 'Couve', 'Pepino'],
+        'unidades': ['kg', 'un', 'maço'],
+        'validez': (3, 12),
+        'contenedores': ['Câmara Fria 1', 'Câmara Fria 2'],
+    },
+    'FRU': {
+        'nombres': ['Banana', 'Maçã', 'Laranja', 'Mamão', 'Melancia', 'Abacaxi',
+                    'Uva', 'Manga', 'Limão', 'Morango'],
+        'unidades': ['kg', 'un', 'cx'],
+        'validez': (5, 20),
+        'contenedores': ['Câmara Fria 1', 'Fruteira'],
+    },
+    'SEC': {
+        'nombres': ['Arroz', 'Feijão', 'Macarrão', 'Farinha', 'Açúcar', 'Café',
+                    'Óleo', 'Sal', 'Aveia', 'Molho de Tomate'],
+        'unidades': ['kg', 'lt', 'pct', 'cx'],
+        'validez': (120, 720),
+        'contenedores': ['Despensa A', 'Despensa B', 'Estoque Seco'],
+    },
+    'LAC': {
+        'nombres': ['Leite', 'Queijo Mussarela', 'Iogurte', 'Manteiga', 'Requeijão',
+                    'Creme de Leite', 'Queijo Prato', 'Ricota', 'Nata', 'Leite Condensado'],
+        'unidades': ['lt', 'kg', 'un'],
+        'validez': (7, 45),
+        'contenedores': ['Câmara de Laticínios', 'Geladeira 1'],
+    },
+}
+
+VARIANTES = ['Tradicional', 'Premium', 'Orgânico', 'Integral', 'Light', 'Extra',
+             'Selecionado', 'Especial', 'Caseiro', 'Regional']
+
+# (tipo, concepto, peso): saídas a serviços, voltas, compras, descartes e ajustes
+MEZCLA_MOVIMIENTOS = [
+    ('saida', 'servicio', 55),
+    ('entrada', 'servicio', 12),
+    ('entrada', 'fornecedor', 20),
+    ('descarte', None, 6),
+    ('ajuste', None, 7),
+]
+
+# Servicio: (peso, hora inicial, hora final)
+SERVICIOS = {
+    'alm': (45, 9, 12),
+    'jan': (30, 15, 19),
+    'kit': (15, 5, 8),
+    'cof': (10, 13, 16),
+}
+
+# Exponente de la distribución Zipf de popularidad de productos
+ZIPF_S = 1.1
+
+# Estado de cada worker (lo carga _init_worker una vez por proceso)
+_catalogo = None
+_pesos_acumulados = None
+_fecha_fin = None
+_dias = None
+
+
+def construir_catalogo(productos, rnd):
+    """Lista de productos (nombre, grupo, unidade, contenedor, validez_min, validez_max) y sus pesos Zipf"""
+    codigos = list(GRUPOS)
+    catalogo = []
+    usados = set()
+    i = 0
+    while len(catalogo) < productos:
+        grupo = codigos[i % len(codigos)]
+        config = GRUPOS[grupo]
+        base = config['nombres'][(i // len(codigos)) % len(config['nombres'])]
+        variante = VARIANTES[(i // (len(codigos) * len(config['nombres']))) % len(VARIANTES)]
+        nombre = f'{base} {variante}'
+        serie = i // (len(codigos) * len(config['nombres']) * len(VARIANTES))
+        if serie:
+            nombre = f'{nombre} {serie + 1}'
+        i += 1
+        if nombre in usados:
+            continue
+        usados.add(nombre)
+        catalogo.append((
+            nombre,
+            grupo,
+            rnd.choice(config['unidades']),
+            rnd.choice(config['contenedores']),
+            *config['validez'],
+        ))
+
+    # La popularidad no depende del grupo: barajar antes de asignar rangos Zipf
+    rnd.shuffle(catalogo)
+    pesos = [1 / (rank ** ZIPF_S) for rank in range(1, len(catalogo) + 1)]
+    return catalogo, pesos
+
+
+def generar_stock(catalogo, pesos, hoy, rnd):
+    """Una fila de stock_actual por producto, con vencimientos que cubren todas las alertas"""
+    maximo = pesos[0]
+    filas = []
+    for (nombre, grupo, unidade, contenedor, validez_min, validez_max), peso in zip(catalogo, pesos):
+        sorteo = rnd.random()
+        if sorteo < 0.06:
+            dias = -rnd.randint(1, 10)               # vencidos
+        elif sorteo < 0.14:
+            dias = rnd.randint(0, 3)                 # vencen en 3 días
+        elif sorteo < 0.24:
+            dias = rnd.randint(4, 7)                 # vencen en 7 días
+        else:
+            dias = rnd.randint(min(8, validez_max), max(8, validez_max))
+        cantidad = int(5 + 500 * (peso / maximo) * rnd.uniform(0.5, 1.5)) if rnd.random() > 0.05 else 0
+        filas.append((nombre, unidade, grupo, hoy + timedelta(days=dias), contenedor, cantidad))
+    return filas
+
+
+def _init_worker(catalogo, pesos_acumulados, fecha_fin, dias):
+    global _catalogo, _pesos_acumulados, _fecha_fin, _dias
+    _catalogo = catalogo
+    _pesos_acumulados = pesos_acumulados
+    _fecha_fin = fecha_fin
+    _dias = dias
+
+
+def generar_bloque(args):
+    """Generar un bloque de movimientos (tuplas en el orden de INGEST_COLUMNS)"""
+    seed, indice, tamano = args
+    rnd = random.Random(f'{seed}-{indice}')
+
+    productos = rnd.choices(_catalogo, cum_weights=_pesos_acumulados, k=tamano)
+    tipos = rnd.choices(MEZCLA_MOVIMIENTOS, weights=[m[2] for m in MEZCLA_MOVIMIENTOS], k=tamano)
+    servicios = rnd.choices(list(SERVICIOS), weights=[s[0] for s in SERVICIOS.values()], k=tamano)
+    inicio = datetime.combine(_fecha_fin - timedelta(days=_dias - 1), datetime.min.time())
+
+    filas = []
+    for (nombre, grupo, unidade, contenedor, validez_min, validez_max), (tipo, concepto, _), servicio in zip(productos, tipos, servicios):
+        fecha_dia = inicio + timedelta(days=rnd.randrange(_dias))
+        # Fines de semana con menos actividad: la mitad se sortea de nuevo
+        if fecha_dia.weekday() >= 5 and rnd.random() < 0.5:
+            fecha_dia = inicio + timedelta(days=rnd.randrange(_dias))
+
+        if concepto == 'servicio':
+            concepto = servicio
+            _, hora_ini, hora_fin = SERVICIOS[servicio]
+        elif concepto == 'fornecedor':
+            hora_ini, hora_fin = 6, 11
+        else:
+            hora_ini, hora_fin = 7, 22
+        fecha_movimiento = fecha_dia + timedelta(
+            hours=rnd.randint(hora_ini, hora_fin - 1),
+            minutes=rnd.randrange(60),
+            seconds=rnd.randrange(60)
+        )
+
+        validez = rnd.randint(validez_min, validez_max)
+        if concepto == 'fornecedor':
+            cantidad = rnd.randint(20, 200)
+            dias_validez = validez
+        else:
+            # Lo que sale ya lleva un tiempo en stock
+            dias_validez = validez - rnd.randint(0, max(validez // 2, 1))
+            if tipo == 'saida':
+                cantidad = max(1, int(rnd.expovariate(1 / 8)))
+            elif tipo == 'entrada':
+                cantidad = max(1, int(rnd.expovariate(1 / 2)))
+            elif tipo == 'descarte':
+                cantidad = rnd.randint(1, 5)
+                dias_validez = -rnd.randint(0, 3)
+            else:
+                cantidad = rnd.choice((-1, 1)) * rnd.randint(1, 10)
+
+        filas.append((
+            nombre,
+            cantidad,
+            tipo,
+            fecha_movimiento.date() + timedelta(days=dias_validez),
+            unidade,
+            grupo,
+            concepto,
+            fecha_movimiento,
+            contenedor,
+        ))
+    return filas
+
+
+def _bloques(total, tamano):
+    for indice, desde in enumerate(range(0, total, tamano)):
+        yield indice, min(tamano, total - desde)
+
+
+def populate_db(movimientos=100000, productos=2000, dias=180, seed=42, workers=None, chunk_size=50000):
+    """Poblar base de datos con datos sintéticos reproducibles"""
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+    workers = workers or os.cpu_count() or 1
+    rnd = random.Random(seed)
+    hoy = date.today()
 
-def populate_db():
-    """Poblar base de datos con datos de ejemplo"""
-    app = create_app('development')
-    
     with app.app_context():
         # Limpiar tablas existentes (solo para desarrollo)
         print('🗑️  Limpiando tablas existentes...')
         db.drop_all()
-        db.create_all()
-        
-        # Crear productos
+        migrate(db.engine)
+
+        # Productos de ejemplo del CRUD
         print('🛍️  Creando productos...')
-        productos = [
+        db.session.add_all([
             Product(name='Laptop', description='Laptop gaming', quantity=10, price=1500.00),
             Product(name='Mouse', description='Mouse inalámbrico', quantity=50, price=25.00),
             Product(name='Teclado', description='Teclado mecánico', quantity=30, price=80.00),
             Product(name='Monitor', description='Monitor 27 pulgadas', quantity=15, price=300.00),
             Product(name='Cable USB', description='Cable USB tipo C', quantity=100, price=5.00),
-        ]
-        db.session.add_all(productos)
-        db.session.commit()
-        print(f'✅ {len(productos)} productos creados')
-        
-        # Crear stock actual
-        print('📦 Creando stock actual...')
-        grupos = ['Electrónica', 'Accesorios', 'Periféricos']
-        productos_nombres = [p.name for p in productos]
-        contenedores = ['Almacén A', 'Almacén B', 'Vitrina 1', 'Vitrina 2']
-        
-        stock_items = []
-        for _ in range(15):
-            item = StockActual(
-                grupo=random.choice(grupos),
-                producto=random.choice(productos_nombres),
-                contenedor=random.choice(contenedores),
-                cantidad=random.randint(1, 100),
-                fecha_producto=datetime.utcnow() - timedelta(days=random.randint(0, 30))
-            )
-            stock_items.append(item)
-        
-        db.session.add_all(stock_items)
+        ])
         db.session.commit()
-        print(f'✅ {len(stock_items)} registros de stock creados')
-        
-        # Crear movimientos
-        print('📝 Creando movimientos...')
-        tipos_movimiento = ['entrada', 'salida', 'ajuste']
-        
-        movimientos = []
-        for _ in range(20):
-            mov = Movimiento(
-                tipo=random.choice(tipos_movimiento),
-                grupo=random.choice(grupos),
-                producto=random.choice(productos_nombres),
-                cantidad=random.randint(1, 50),
-                descripcion=f'Movimiento de ejemplo',
-                fecha=datetime.utcnow() - timedelta(days=random.randint(0, 60)),
-                usuario='admin',
-                referencia=f'REF{random.randint(1000, 9999)}'
-            )
-            movimientos.append(mov)
-        
-        db.session.add_all(movimientos)
-        db.session.commit()
-        print(f'✅ {len(movimientos)} movimientos creados')
-        
+
+        catalogo, pesos = construir_catalogo(productos, rnd)
+
+        print(f'📦 Creando stock actual ({len(catalogo)} productos)...')
+        with db.engine.begin() as connection:
+            bulk_insert(connection, 'stock_actual', STOCK_COLUMNS, generar_stock(catalogo, pesos, hoy, rnd))
+
+        print(f'📝 Creando {movimientos} movimientos en bloques de {chunk_size} ({workers} workers)...')
+        # Los índices se crean al final: construirlos una vez es mucho más barato que mantenerlos fila a fila
+        indices = list(Movimiento.__table__.indexes)
+        with db.engine.begin() as connection:
+            for index in indices:
+                index.drop(connection, checkfirst=True)
+
+        tareas = [(seed, indice, tamano) for indice, tamano in _bloques(movimientos, chunk_size)]
+        initargs = (catalogo, list(accumulate(pesos)), hoy, dias)
+        inicio = time.perf_counter()
+        insertados = 0
+
+        if workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs)
+            bloques = executor.map(generar_bloque, tareas)
+        else:
+            executor = None
+            _init_worker(*initargs)
+            bloques = map(generar_bloque, tareas)
+
+        try:
+            for filas in bloques:
+                with db.engine.begin() as connection:
+                    bulk_insert(connection, 'movimientos', INGEST_COLUMNS, filas)
+                insertados += len(filas)
+                elapsed = time.perf_counter() - inicio
+                print(f'   {insertados}/{movimientos} ({int(insertados / elapsed)} filas/s)')
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        print('🗂️  Creando índices y rollups...')
+        with db.engine.begin() as connection:
+            for index in indices:
+                index.create(connection)
+            rebuild_movimientos_daily(connection)
+
         print('\n✨ Base de datos poblada exitosamente!')
         print(f'\nTotal de registros:')
         print(f'  - Productos: {Product.query.count()}')
         print(f'  - Stock Actual: {StockActual.query.count()}')
         print(f'  - Movimientos: {Movimiento.query.count()}')
+        print(f'  - Tiempo total: {time.perf_counter() - inicio:.1f}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Poblar la base de datos con datos sintéticos')
+    parser.add_argument('--movimientos', type=int, default=100000, help='Movimientos a generar (default: 100000)')
+    parser.add_argument('--productos', type=int, default=2000, help='Productos en stock_actual (default: 2000)')
+    parser.add_argument('--dias', type=int, default=180, help='Días de historia hasta hoy (default: 180)')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla para resultados reproducibles (default: 42)')
+    parser.add_argument('--workers', type=int, default=None, help='Procesos generadores (default: núcleos de CPU)')
+    parser.add_argument('--chunk-size', type=int, default=50000, help='Movimientos por bloque (default: 50000)')
+    args = parser.parse_args()
+
+    populate_db(
+        movimientos=args.movimientos,
+        productos=args.productos,
+        dias=args.dias,
+        seed=args.seed,
+        workers=args.workers,
+        chunk_size=args.chunk_size
+    )
 
 
 if __name__ == '__main__':
     try:
-        populate_db()
+        main()
     except Exception as e:
         print(f'❌ Error: {str(e)}')
         sys.exit(1)